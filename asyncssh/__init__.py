@@ -35,6 +35,7 @@ from .logging import logger
 
 from .misc import Error, DisconnectError, ChannelOpenError
 from .misc import BreakReceived, SignalReceived, TerminalSizeChanged
+from .misc import LimitOverrunError
 
 from .pbe import KeyEncryptionError
 
@@ -47,7 +48,8 @@ from .public_key import read_certificate_list
 
 from .session import SSHClientSession, SSHServerSession, SSHTCPSession
 
-from .sftp import SFTPClient, SFTPServer, SFTPFile, SFTPError
+from .sftp import SFTPClient, SFTPServer, SFTPThreadedServer
+from .sftp import SFTPFile, SFTPError
 from .sftp import SFTPAttrs, SFTPVFSAttrs, SFTPName
 from .sftp import SEEK_SET, SEEK_CUR, SEEK_END
 
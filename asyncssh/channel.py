@@ -14,6 +14,8 @@
 
 import asyncio
 
+from collections import deque
+
 from .constants import DEFAULT_LANG, DISC_PROTOCOL_ERROR, EXTENDED_DATA_STDERR
 from .constants import MSG_CHANNEL_OPEN, MSG_CHANNEL_WINDOW_ADJUST
 from .constants import MSG_CHANNEL_DATA, MSG_CHANNEL_EXTENDED_DATA
@@ -60,7 +62,7 @@ class SSHChannel(SSHPacketHandler):
         self._send_window = None
         self._send_pktsize = None
         self._send_paused = False
-        self._send_buf = []
+        self._send_buf = deque()
         self._send_buf_len = 0
 
         self._recv_state = 'closed'
@@ -125,12 +127,14 @@ class SSHChannel(SSHPacketHandler):
             self._session = None
 
         if self._conn:
-            if self._recv_chan:
+            if self._recv_chan is not None:
                 self._conn.remove_channel(self._recv_chan)
                 self._recv_chan = None
 
             self._conn = None
 
+        self._recv_buf = []
+
         self._send_state = 'closed'
         self._recv_state = 'closed'
 
@@ -147,27 +151,45 @@ class SSHChannel(SSHPacketHandler):
                 self._session.pause_writing()
 
     def _flush_send_buf(self):
-        """Flush as much data in send buffer as the send window allows"""
+        """Flush as much data in send buffer as the send window allows
+
+           Each packet is assembled from as many consecutive buffers of
+           the same data type as will fit, slicing buffers at packet
+           boundaries without copying them.
+
+        """
 
         while self._send_buf and self._send_window:
             pktsize = min(self._send_window, self._send_pktsize)
-            buf, datatype = self._send_buf[0]
+            datatype = self._send_buf[0][1]
+            data = []
+            datalen = 0
 
-            if len(buf) > pktsize:
-                data = buf[:pktsize]
-                del buf[:pktsize]
-            else:
-                data = buf
-                del self._send_buf[0]
+            while self._send_buf and datalen < pktsize:
+                buf, buf_datatype = self._send_buf[0]
 
-            self._send_buf_len -= len(data)
-            self._send_window -= len(data)
+                if buf_datatype != datatype:
+                    break
+
+                remaining = pktsize - datalen
+
+                if len(buf) > remaining:
+                    data.append(buf[:remaining])
+                    self._send_buf[0] = (buf[remaining:], datatype)
+                    datalen += remaining
+                else:
+                    data.append(buf)
+                    self._send_buf.popleft()
+                    datalen += len(buf)
+
+            self._send_buf_len -= datalen
+            self._send_window -= datalen
 
             if datatype is None:
-                self._send_packet(MSG_CHANNEL_DATA, String(data))
+                self._send_packet(MSG_CHANNEL_DATA, UInt32(datalen), *data)
             else:
-                self._send_packet(MSG_CHANNEL_EXTENDED_DATA,
-                                  UInt32(datatype), String(data))
+                self._send_packet(MSG_CHANNEL_EXTENDED_DATA, UInt32(datatype),
+                                  UInt32(datalen), *data)
 
         self._pause_resume_writing()
 
@@ -192,7 +214,8 @@ class SSHChannel(SSHPacketHandler):
         else:
             self._recv_window -= len(data)
 
-            if self._recv_window < self._init_recv_window / 2:
+            if (self._recv_state != 'close_pending' and
+                    self._recv_window < self._init_recv_window / 2):
                 self._send_packet(MSG_CHANNEL_WINDOW_ADJUST,
                                   UInt32(self._init_recv_window -
                                          self._recv_window))
@@ -395,14 +418,20 @@ class SSHChannel(SSHPacketHandler):
         packet.check_end()
 
         # Flush any unsent data
-        self._send_buf = []
+        self._send_buf.clear()
         self._send_buf_len = 0
 
         # If we haven't yet sent a close, send one now
         if self._send_state not in {'close_sent', 'closed'}:
             self._send_packet(MSG_CHANNEL_CLOSE)
+            self._send_state = 'close_sent'
 
-        self._loop.call_soon(self._cleanup)
+        # If reading is paused, finish delivering buffered data before
+        # cleaning up, so that the tail of the data isn't lost
+        if self._recv_buf:
+            self._recv_state = 'close_pending'
+        else:
+            self._loop.call_soon(self._cleanup)
 
     def _process_request(self, pkttype, packet):
         """Process an incoming channel request"""
@@ -613,6 +642,40 @@ class SSHChannel(SSHPacketHandler):
         self._send_low_water = low
         self._pause_resume_writing()
 
+    def _check_write(self, datatype):
+        """Check that data of the specified type can be written"""
+
+        if self._send_state != 'open':
+            raise BrokenPipeError('Channel not open for sending')
+
+        if datatype is not None and datatype not in self._write_datatypes:
+            raise OSError('Invalid extended data type')
+
+    def _queue_data(self, data, datatype):
+        """Add data to the send buffer
+
+           Read-only buffers such as bytes are queued by reference.
+           Writable buffers are copied once, since the caller is free
+           to modify them as soon as the write call returns, as are
+           non-contiguous buffers. Either way, the buffer is queued as
+           a view of unsigned bytes, so its length is its size in bytes.
+
+        """
+
+        if self._encoding:
+            data = data.encode(self._encoding)
+
+        buf = memoryview(data)
+
+        if not buf.readonly or not buf.contiguous:
+            buf = memoryview(buf.tobytes())
+
+        buf = buf.cast('B')
+
+        if len(buf):
+            self._send_buf.append((buf, datatype))
+            self._send_buf_len += len(buf)
+
     def write(self, data, datatype=None):
         """Write data on the channel
 
@@ -639,20 +702,39 @@ class SSHChannel(SSHPacketHandler):
 
         """
 
-        if self._send_state != 'open':
-            raise BrokenPipeError('Channel not open for sending')
+        self._check_write(datatype)
+        self._queue_data(data, datatype)
+        self._flush_send_buf()
 
-        if datatype is not None and datatype not in self._write_datatypes:
-            raise OSError('Invalid extended data type')
+    def write_buffers(self, buffers, datatype=None):
+        """Write a collection of buffers on the channel
 
-        if len(data) == 0:
-            return
+           This method can be called to write an iterable of buffers
+           to the channel without first joining them together. Buffers
+           may be any bytes-like object, including ``memoryview``
+           objects, or strings if an encoding was specified when the
+           channel was created. Data from consecutive buffers is packed
+           together into SSH packets, and large buffers are split
+           across packets without being copied.
 
-        if self._encoding:
-            data = data.encode(self._encoding)
+           :param buffers:
+               The data to send on the channel
+           :param integer datatype: (optional)
+               The extended data type of the data, from :ref:`extended
+               data types <ExtendedDataTypes>`
+           :type buffers: iterable of ``string`` or bytes-like objects
+
+           :raises: :exc:`OSError` if the channel isn't open for sending
+                    or the extended data type is not valid for this type
+                    of channel
+
+        """
+
+        self._check_write(datatype)
+
+        for data in buffers:
+            self._queue_data(data, datatype)
 
-        self._send_buf.append((bytearray(data), datatype))
-        self._send_buf_len += len(data)
         self._flush_send_buf()
 
     def writelines(self, list_of_data, datatype=None):
@@ -660,7 +742,8 @@ class SSHChannel(SSHPacketHandler):
 
            This method can be called to write a list (or any iterable) of
            data bytes to the channel. It is functionality equivalent to
-           calling :meth:`write` on each element in the list.
+           calling :meth:`write` on each element in the list, and is
+           implemented using :meth:`write_buffers`.
 
            :param list_of_data:
                The data to send on the channel
@@ -675,8 +758,7 @@ class SSHChannel(SSHPacketHandler):
 
         """
 
-        sep = '' if self._encoding else b''
-        return self.write(sep.join(list_of_data), datatype)
+        return self.write_buffers(list_of_data, datatype)
 
     def write_eof(self):
         """Write EOF on the channel
@@ -706,10 +788,10 @@ class SSHChannel(SSHPacketHandler):
            but window updates will no longer be sent, eventually causing
            back pressure on the remote system.
 
-           .. note:: Channel close notifications are not suspended by this
-                     call. If the remote system closes the channel while
-                     delivery is suspended, the channel will be closed even
-                     though some buffered data may not have been delivered.
+           .. note:: If the remote system closes the channel while
+                     delivery is suspended, the close is deferred until
+                     :meth:`resume_reading` has delivered the remaining
+                     buffered data.
 
         """
 
@@ -732,6 +814,10 @@ class SSHChannel(SSHPacketHandler):
             while self._recv_buf and not self._recv_paused:
                 self._deliver_data(*self._recv_buf.pop(0))
 
+            if not self._recv_buf and self._recv_state == 'close_pending':
+                self._recv_state = 'closed'
+                self._loop.call_soon(self._cleanup)
+
 
 class SSHClientChannel(SSHChannel):
     """SSH client channel"""
@@ -1133,7 +1219,7 @@ class SSHServerChannel(SSHChannel):
 
         return self._session.break_received(msec)
 
-    def start_sftp_server(self, sftp_factory):
+    def start_sftp_server(self, sftp_factory, max_requests=None):
         """Start an SFTP server for this session
 
            This method can be used by an existing :class:`SSHServerSession`
@@ -1152,6 +1238,10 @@ class SSHServerChannel(SSHChannel):
                A callable which returns an :class:`SFTPServer` object
                that will be created to handle SFTP requests on this
                channel.
+           :param integer max_requests: (optional)
+               The maximum number of SFTP requests to process in parallel,
+               defaulting to 16. Requests beyond this are queued until
+               earlier ones complete.
 
         """
 
@@ -1159,7 +1249,8 @@ class SSHServerChannel(SSHChannel):
         self._encoding = None
 
         # Replace the session with an SFTPServerSession
-        self._session = SFTPServerSession(sftp_factory(self._conn))
+        self._session = SFTPServerSession(sftp_factory(self._conn),
+                                          max_requests)
         self._session.connection_made(self)
         self._session.session_started()
 
@@ -18,7 +18,7 @@ import os
 import socket
 import time
 
-from collections import OrderedDict
+from collections import OrderedDict, deque
 
 from .auth import lookup_client_auth
 from .auth import get_server_auth_methods, lookup_server_auth
@@ -52,7 +52,7 @@ from .constants import MSG_USERAUTH_FIRST, MSG_USERAUTH_LAST
 from .constants import MSG_GLOBAL_REQUEST, MSG_REQUEST_SUCCESS
 from .constants import MSG_REQUEST_FAILURE
 from .constants import OPEN_ADMINISTRATIVELY_PROHIBITED, OPEN_CONNECT_FAILED
-from .constants import OPEN_UNKNOWN_CHANNEL_TYPE
+from .constants import OPEN_RESOURCE_SHORTAGE, OPEN_UNKNOWN_CHANNEL_TYPE
 
 from .forward import SSHPortForwarder, SSHLocalPortForwarder
 from .forward import SSHRemotePortForwarder
@@ -105,6 +105,10 @@ _DEFAULT_REKEY_SECONDS = 3600       # 1 hour
 _DEFAULT_WINDOW = 2*1024*1024       # 2 MiB
 _DEFAULT_MAX_PKTSIZE = 32768        # 32 kiB
 
+# Channel number allocation parameters
+_MAX_CHANNEL = 0xffffffff           # Largest legal channel number
+_CHANNEL_QUARANTINE = 256           # Closed channels held before reuse
+
 
 def _load_private_key(key):
     """Load a private key
@@ -339,6 +343,7 @@ class SSHConnection(SSHPacketHandler):
 
         self._channels = {}
         self._next_recv_chan = 0
+        self._free_recv_chans = deque()
 
         self._global_request_queue = []
         self._global_request_waiters = []
@@ -493,13 +498,26 @@ class SSHConnection(SSHPacketHandler):
         pass
 
     def add_channel(self, chan):
-        """Add a new channel, returning its channel number"""
+        """Add a new channel, returning its channel number
 
-        while self._next_recv_chan in self._channels:
-            self._next_recv_chan = (self._next_recv_chan + 1) & 0xffffffff
+           Channel numbers are handed out sequentially until more than
+           a quarantine's worth of closed channel numbers has built up,
+           after which the oldest closed number is recycled. This keeps
+           allocation constant time and the numbers in use compact, while
+           making sure a number isn't reused right after it is released.
 
-        recv_chan = self._next_recv_chan
-        self._next_recv_chan = (self._next_recv_chan + 1) & 0xffffffff
+        """
+
+        if len(self._free_recv_chans) > _CHANNEL_QUARANTINE:
+            recv_chan = self._free_recv_chans.popleft()
+        elif self._next_recv_chan <= _MAX_CHANNEL:
+            recv_chan = self._next_recv_chan
+            self._next_recv_chan += 1
+        elif self._free_recv_chans:
+            recv_chan = self._free_recv_chans.popleft()
+        else:
+            raise ChannelOpenError(OPEN_RESOURCE_SHORTAGE,
+                                   'No free channel numbers')
 
         self._channels[recv_chan] = chan
         return recv_chan
@@ -508,6 +526,7 @@ class SSHConnection(SSHPacketHandler):
         """Remove the channel with the specified channel number"""
 
         del self._channels[recv_chan]
+        self._free_recv_chans.append(recv_chan)
 
     def _choose_alg(self, alg_type, local_algs, remote_algs):
         """Choose a common algorithm from the client & server lists
@@ -2344,7 +2363,8 @@ class SSHClientConnection(SSHConnection):
         return self.create_server(session_factory, listen_host, listen_port)
 
     @asyncio.coroutine
-    def start_sftp_client(self, path_encoding='utf-8', path_errors='strict'):
+    def start_sftp_client(self, path_encoding='utf-8', path_errors='strict',
+                          *, attr_cache_ttl=None, attr_cache_size=1024):
         """Start an SFTP client
 
            This method is a coroutine which attempts to start a secure
@@ -2358,11 +2378,26 @@ class SSHClientConnection(SSHConnection):
            will be left as bytes rather than being converted to & from
            strings.
 
+           If attr_cache_ttl is set, remote file attributes returned by
+           stat, lstat, and readdir are cached for that many seconds,
+           letting checks like :meth:`isdir() <SFTPClient.isdir>` on
+           recently seen paths avoid a round trip to the server. Up to
+           attr_cache_size entries are kept, with the least recently
+           used ones being discarded first. Entries are discarded when
+           this client modifies the corresponding path, but changes
+           made by anyone else are only seen once entries expire.
+
            :param string path_encoding:
                The Unicode encoding to apply when sending and receiving
                remote pathnames
            :param string path_errors:
                The error handling strategy to apply on encode/decode errors
+           :param attr_cache_ttl: (optional)
+               The number of seconds to cache remote file attributes for,
+               or ``None`` to disable caching
+           :param integer attr_cache_size: (optional)
+               The maximum number of cached file attributes to keep
+           :type attr_cache_ttl: integer or float
 
            :returns: :class:`SFTPClient`
 
@@ -2382,8 +2417,10 @@ class SSHClientConnection(SSHConnection):
                                                     encoding=None)
 
         yield from version_waiter
+        yield from session.request_limits()
 
-        return SFTPClient(session, path_encoding, path_errors)
+        return SFTPClient(session, path_encoding, path_errors,
+                          attr_cache_ttl, attr_cache_size)
 
 
 class SSHServerConnection(SSHConnection):
@@ -2415,8 +2452,8 @@ class SSHServerConnection(SSHConnection):
     def __init__(self, server_factory, loop, server_host_keys,
                  authorized_client_keys, kex_algs, encryption_algs, mac_algs,
                  compression_algs, allow_pty, session_factory,
-                 session_encoding, sftp_factory, window, max_pktsize,
-                 rekey_bytes, rekey_seconds):
+                 session_encoding, sftp_factory, sftp_max_requests,
+                 window, max_pktsize, rekey_bytes, rekey_seconds):
         super().__init__(server_factory, loop, kex_algs, encryption_algs,
                          mac_algs, compression_algs, rekey_bytes,
                          rekey_seconds, server=True)
@@ -2425,6 +2462,7 @@ class SSHServerConnection(SSHConnection):
         self._session_factory = session_factory
         self._session_encoding = session_encoding
         self._sftp_factory = sftp_factory
+        self._sftp_max_requests = sftp_max_requests
         self._window = window
         self._max_pktsize = max_pktsize
 
@@ -2627,7 +2665,8 @@ class SSHServerConnection(SSHConnection):
                                               self._window, self._max_pktsize)
             session = SSHServerStreamSession(self._allow_pty,
                                              self._session_factory,
-                                             self._sftp_factory)
+                                             self._sftp_factory,
+                                             self._sftp_max_requests)
         else:
             result = self._owner.session_requested()
 
@@ -3962,7 +4001,8 @@ def create_server(server_factory, host=None, port=_DEFAULT_PORT, *,
                   encryption_algs=(), mac_algs=(), compression_algs=(),
                   allow_pty=True, session_factory=None,
                   session_encoding='utf-8', sftp_factory=None,
-                  window=_DEFAULT_WINDOW, max_pktsize=_DEFAULT_MAX_PKTSIZE,
+                  sftp_max_requests=None, window=_DEFAULT_WINDOW,
+                  max_pktsize=_DEFAULT_MAX_PKTSIZE,
                   rekey_bytes=_DEFAULT_REKEY_BYTES,
                   rekey_seconds=_DEFAULT_REKEY_SECONDS):
     """Create an SSH server
@@ -4036,7 +4076,13 @@ def create_server(server_factory, host=None, port=_DEFAULT_PORT, *,
            will be created each time an SFTP session is requested by the
            client, or ``True`` to use the base :class:`SFTPServer` class
            to handle SFTP requests. If not specified, SFTP sessions are
-           rejected by default.
+           rejected by default. Passing :class:`SFTPThreadedServer`
+           serves local files without blocking the event loop.
+       :param integer sftp_max_requests: (optional)
+           The maximum number of requests to process in parallel on each
+           SFTP session on this server, defaulting to 16. Responses are
+           sent as each request completes, while requests on the same
+           file handle which depend on one another are kept in order.
        :param integer window: (optional)
            The receive window size for sessions on this server
        :param integer max_pktsize: (optional)
@@ -4077,8 +4123,9 @@ def create_server(server_factory, host=None, port=_DEFAULT_PORT, *,
                                    authorized_client_keys, kex_algs,
                                    encryption_algs, mac_algs, compression_algs,
                                    allow_pty, session_factory,
-                                   session_encoding, sftp_factory, window,
-                                   max_pktsize, rekey_bytes, rekey_seconds)
+                                   session_encoding, sftp_factory,
+                                   sftp_max_requests, window, max_pktsize,
+                                   rekey_bytes, rekey_seconds)
 
     return (yield from loop.create_server(conn_factory, host, port,
                                           family=family, flags=flags,
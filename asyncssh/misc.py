@@ -12,6 +12,7 @@
 
 """Miscellaneous utility classes and functions"""
 
+import asyncio
 import ipaddress
 import socket
 
@@ -193,3 +194,24 @@ class TerminalSizeChanged(Exception):
         self.height = height
         self.pixwidth = pixwidth
         self.pixheight = pixheight
+
+
+if hasattr(asyncio, 'LimitOverrunError'):
+    LimitOverrunError = asyncio.LimitOverrunError
+else: # pragma: no cover
+    class LimitOverrunError(Exception):
+        """Read limit reached before finding a separator
+
+           This is a stand-in for the :exc:`asyncio.LimitOverrunError`
+           exception on versions of Python which don't provide it.
+
+           :param string message:
+               A human-readable description of the error
+           :param integer consumed:
+               The number of bytes or characters to be consumed
+
+        """
+
+        def __init__(self, message, consumed):
+            super().__init__(message)
+            self.consumed = consumed
@@ -14,14 +14,20 @@
 
 import asyncio
 import grp
+import hashlib
+import inspect
+import io
 import os
 import posixpath
 import pwd
 import stat
+import threading
 import time
 
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from fnmatch import fnmatch
+from itertools import islice
 from os import SEEK_SET, SEEK_CUR, SEEK_END
 
 from .constants import DEFAULT_LANG
@@ -46,11 +52,46 @@ from .constants import FX_FAILURE, FX_BAD_MESSAGE, FX_NO_CONNECTION
 from .constants import FX_CONNECTION_LOST, FX_OP_UNSUPPORTED
 
 from .misc import Error, DisconnectError
-from .packet import Byte, String, UInt32, UInt64, SSHPacket
+from .packet import Byte, String, UInt32, UInt64, NameList, SSHPacket
 from .session import SSHClientSession, SSHServerSession
 
 _SFTP_VERSION = 3
 _SFTP_BLOCK_SIZE = 8192
+_MAX_SFTP_REQUESTS = 16
+
+# Largest block size to pick automatically when a server reports its limits
+_MAX_SFTP_BLOCK_SIZE = 256*1024
+
+# Limits reported by the SFTP server, and the space to leave in each
+# packet for request headers when only the packet length is limited
+_SFTP_MAX_PACKET_LEN = 256*1024
+_SFTP_PACKET_OVERHEAD = 1024
+_SFTP_MAX_READ_LEN = _SFTP_MAX_PACKET_LEN - _SFTP_PACKET_OVERHEAD
+_SFTP_MAX_WRITE_LEN = _SFTP_MAX_PACKET_LEN - _SFTP_PACKET_OVERHEAD
+
+# Amount of data to read and write at a time when serving copy-data
+_COPY_DATA_BLOCK_SIZE = 256*1024
+
+# Hash algorithms supported by check-file, in order of preference
+_CHECK_FILE_ALGS = (b'sha256', b'sha512', b'sha384', b'sha224',
+                    b'sha1', b'md5')
+
+# Smallest block size which can be requested in a check-file request
+_MIN_CHECK_FILE_BLOCK_SIZE = 256
+
+# Amount of data at the start of a range covered by an md5-hash quick check
+_MD5_QUICK_CHECK_SIZE = 2048
+
+# Hash algorithms requested by default when checking a remote file
+_DEFAULT_HASH_ALGS = ('sha256', 'sha1', 'md5')
+
+# Largest number of names to return in response to each readdir request
+_MAX_READDIR_NAMES = 100
+
+# Number of threads shared by all threaded SFTP server sessions, and
+# the number of them each session can use at a time
+_SFTP_SERVER_THREADS = 32
+_SFTP_SESSION_THREADS = 4
 
 
 def _setstat(path, attrs):
@@ -69,6 +110,55 @@ def _setstat(path, attrs):
         os.utime(path, times=(attrs.atime, attrs.mtime))
 
 
+def _supports_pio(file_obj):
+    """Return whether positional I/O can be used on a file object
+
+       This is the case for unbuffered local files on platforms which
+       provide os.pread() and os.pwrite(). Reads and writes on these
+       files don't depend on the current file position, so several of
+       them can safely run at once.
+
+       Files opened for append are excluded, since some platforms
+       ignore the offset passed to os.pwrite() on them and others
+       don't, so these are written using seek and write instead.
+
+    """
+
+    return (hasattr(os, 'pread') and isinstance(file_obj, io.FileIO) and
+            'a' not in file_obj.mode)
+
+
+@asyncio.coroutine
+def _wait_result(result):
+    """Return a result, waiting for it first if it's a coroutine
+
+       This allows SFTPServer methods to be either regular methods or
+       coroutines.
+
+    """
+
+    if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+        result = yield from result
+
+    return result
+
+
+def _split_hashes(alg, hashes):
+    """Split the digests returned by a check-file request into blocks"""
+
+    try:
+        alg = alg.decode('ascii')
+        digest_size = hashlib.new(alg).digest_size
+    except (UnicodeDecodeError, ValueError):
+        raise SFTPError(FX_BAD_MESSAGE, 'Unknown hash algorithm') from None
+
+    if len(hashes) % digest_size:
+        raise SFTPError(FX_BAD_MESSAGE, 'Invalid hash length')
+
+    return alg, [hashes[i:i+digest_size]
+                 for i in range(0, len(hashes), digest_size)]
+
+
 class _Record:
     """General-purpose record type with fixed set of fields"""
 
@@ -90,17 +180,22 @@ class _Record:
                                      for k in self.__slots__))
 
 
-class _LocalFile:
-    """A coroutine wrapper around local file I/O"""
+class _LocalFS:
+    """A coroutine wrapper around local filesystem operations
 
-    def __init__(self, f):
-        self._file = f
+       Blocking calls are run in the default executor of the event
+       loop, so that slow local storage doesn't stall other activity
+       on the loop while files are being transferred.
 
-    def __enter__(self):
-        return self
+    """
 
-    def __exit__(self, *excinfo):
-        self._file.close()
+    def __init__(self, loop):
+        self._loop = loop
+
+    def _run(self, func, *args):
+        """Run a blocking call in the default executor"""
+
+        return self._loop.run_in_executor(None, func, *args)
 
     @classmethod
     def encode(cls, path):
@@ -140,247 +235,414 @@ class _LocalFile:
 
         return os.path.join(parent, path) if parent else path
 
-    @classmethod
     @asyncio.coroutine
-    def open(cls, *args):
+    def open(self, path, mode='r'):
         """Open a local file"""
 
-        return cls(open(*args))
+        if 'b' in mode:
+            # Binary files are left unbuffered so that positional reads
+            # and writes from multiple threads see a consistent file
+            f = yield from self._run(open, path, mode, 0)
+        else:
+            f = yield from self._run(open, path, mode)
+
+        return _LocalFile(self._loop, f)
 
-    @classmethod
     @asyncio.coroutine
-    def stat(cls, path):
+    def stat(self, path):
         """Get attributes of a local file or directory, following symlinks"""
 
-        return SFTPAttrs.from_local(os.stat(path))
+        return SFTPAttrs.from_local((yield from self._run(os.stat, path)))
 
-    @classmethod
     @asyncio.coroutine
-    def lstat(cls, path):
+    def lstat(self, path):
         """Get attributes of a local file, directory, or symlink"""
 
-        return SFTPAttrs.from_local(os.lstat(path))
+        return SFTPAttrs.from_local((yield from self._run(os.lstat, path)))
 
-    @classmethod
     @asyncio.coroutine
-    def setstat(cls, path, attrs):
+    def setstat(self, path, attrs):
         """Set attributes of a local file or directory"""
 
-        _setstat(path, attrs)
+        yield from self._run(_setstat, path, attrs)
 
-    @classmethod
     @asyncio.coroutine
-    def truncate(cls, path):
+    def truncate(self, path):
         """Truncate a local file to the specified size"""
 
-        os.truncate(path)
+        yield from self._run(os.truncate, path)
 
-    @classmethod
     @asyncio.coroutine
-    def chown(cls, path, uid, gid):
+    def chown(self, path, uid, gid):
         """Change the owner user and group id of a local file or directory"""
 
-        os.chown(path, uid, gid)
+        yield from self._run(os.chown, path, uid, gid)
 
-    @classmethod
     @asyncio.coroutine
-    def chmod(cls, path, mode):
+    def chmod(self, path, mode):
         """Change the file permissions of a local file or directory"""
 
-        os.chmod(path, mode)
+        yield from self._run(os.chmod, path, mode)
 
-    @classmethod
     @asyncio.coroutine
-    def utime(cls, path, times=None):
+    def utime(self, path, times=None):
         """Change the access and modify times of a local file or directory"""
 
-        os.utime(path, times)
+        yield from self._run(os.utime, path, times)
 
-    @classmethod
     @asyncio.coroutine
-    def exists(cls, path):
+    def exists(self, path):
         """Return if the local path exists and isn't a broken symbolic link"""
 
-        return os.path.exists(path)
+        return (yield from self._run(os.path.exists, path))
 
-    @classmethod
     @asyncio.coroutine
-    def lexists(cls, path):
+    def lexists(self, path):
         """Return if the local path exists, without following symbolic links"""
 
-        return os.path.lexists(path)
+        return (yield from self._run(os.path.lexists, path))
 
-    @classmethod
     @asyncio.coroutine
-    def getatime(cls, path):
+    def getatime(self, path):
         """Return the last access time of a local file or directory"""
 
-        return os.path.getatime(path)
+        return (yield from self._run(os.path.getatime, path))
 
-    @classmethod
     @asyncio.coroutine
-    def getmtime(cls, path):
+    def getmtime(self, path):
         """Return the last modification time of a local file or directory"""
 
-        return os.path.getmtime(path)
+        return (yield from self._run(os.path.getmtime, path))
 
-    @classmethod
     @asyncio.coroutine
-    def getsize(cls, path):
+    def getsize(self, path):
         """Return the size of a local file or directory"""
 
-        return os.path.getsize(path)
+        return (yield from self._run(os.path.getsize, path))
 
-    @classmethod
     @asyncio.coroutine
-    def isdir(cls, path):
+    def isdir(self, path):
         """Return if the local path refers to a directory"""
 
-        return os.path.isdir(path)
+        return (yield from self._run(os.path.isdir, path))
 
-    @classmethod
     @asyncio.coroutine
-    def isfile(cls, path):
+    def isfile(self, path):
         """Return if the local path refers to a regular file"""
 
-        return os.path.isfile(path)
+        return (yield from self._run(os.path.isfile, path))
 
-    @classmethod
     @asyncio.coroutine
-    def islink(cls, path):
+    def islink(self, path):
         """Return if the local path refers to a symbolic link"""
 
-        return os.path.islink(path)
+        return (yield from self._run(os.path.islink, path))
 
-    @classmethod
     @asyncio.coroutine
-    def remove(cls, path):
+    def remove(self, path):
         """Remove a local file"""
 
-        os.remove(path)
+        yield from self._run(os.remove, path)
 
-    @classmethod
     @asyncio.coroutine
-    def unlink(cls, path):
+    def unlink(self, path):
         """Remove a local file (see :meth:`remove`)"""
 
-        os.unlink(path)
+        yield from self._run(os.unlink, path)
 
-    @classmethod
     @asyncio.coroutine
-    def rename(cls, oldpath, newpath):
+    def rename(self, oldpath, newpath):
         """Rename a local file, directory, or link"""
 
-        os.rename(oldpath, newpath)
+        yield from self._run(os.rename, oldpath, newpath)
 
-    @classmethod
     @asyncio.coroutine
-    def readdir(cls, path):
+    def readdir(self, path):
         """Read the contents of a local directory"""
 
-        names = os.listdir(path)
+        def _readdir():
+            """Read the names and attributes of the directory entries"""
+
+            names = []
 
-        return [SFTPName(filename=name, attrs=(yield from cls.stat(name)))
-                for name in names]
+            for name in os.listdir(path):
+                attrs = os.lstat(os.path.join(path, name))
+                names.append(SFTPName(filename=name,
+                                      attrs=SFTPAttrs.from_local(attrs)))
+
+            return names
+
+        return (yield from self._run(_readdir))
 
-    @classmethod
     @asyncio.coroutine
-    def listdir(cls, path):
+    def listdir(self, path):
         """Read the names of the files in a local directory"""
 
-        return os.listdir(path)
+        return (yield from self._run(os.listdir, path))
 
-    @classmethod
     @asyncio.coroutine
-    def mkdir(cls, path):
+    def mkdir(self, path):
         """Create a local directory with the specified attributes"""
 
-        os.mkdir(path)
+        yield from self._run(os.mkdir, path)
 
-    @classmethod
     @asyncio.coroutine
-    def rmdir(cls, path):
+    def rmdir(self, path):
         """Remove a local directory"""
 
-        os.rmdir(path)
+        yield from self._run(os.rmdir, path)
 
-    @classmethod
     @asyncio.coroutine
-    def realpath(cls, path):
+    def realpath(self, path):
         """Return the canonical version of a local path"""
 
-        return os.path.realpath(path)
+        return (yield from self._run(os.path.realpath, path))
 
-    @classmethod
     @asyncio.coroutine
-    def getcwd(cls):
+    def getcwd(self):
         """Return the local current working directory"""
 
-        return os.getcwd()
+        return (yield from self._run(os.getcwd))
 
-    @classmethod
     @asyncio.coroutine
-    def chdir(cls, path):
+    def chdir(self, path):
         """Change the local current working directory"""
 
-        os.chdir(path)
+        yield from self._run(os.chdir, path)
 
-    @classmethod
     @asyncio.coroutine
-    def readlink(cls, path):
+    def readlink(self, path):
         """Return the target of a local symbolic link"""
 
-        return os.readlink(path)
+        return (yield from self._run(os.readlink, path))
 
-    @classmethod
     @asyncio.coroutine
-    def symlink(cls, oldpath, newpath):
+    def symlink(self, oldpath, newpath):
         """Create a local symbolic link"""
 
-        os.symlink(oldpath, newpath)
+        yield from self._run(os.symlink, oldpath, newpath)
 
-    @classmethod
     @asyncio.coroutine
-    def link(cls, oldpath, newpath):
+    def link(self, oldpath, newpath):
         """Create a local hard link"""
 
-        os.link(oldpath, newpath)
+        yield from self._run(os.link, oldpath, newpath)
+
+    @asyncio.coroutine
+    def check_file(self, path, hash_algs=_DEFAULT_HASH_ALGS, offset=0,
+                   length=0, block_size=0):
+        """Return hashes of the data in a local file
+
+           This hashes a range of a local file in the same way as
+           :meth:`SFTPClient.check_file` does for a remote one, so
+           that the results can be compared.
+
+        """
+
+        for alg in hash_algs:
+            if alg in hashlib.algorithms_available:
+                break
+        else:
+            raise SFTPError(FX_OP_UNSUPPORTED, 'No matching hash algorithm')
+
+        def _check_file():
+            """Read and hash the requested range of the file"""
+
+            end = offset + length if length else None
+            digests = []
+
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                pos = offset
+
+                while True:
+                    block_end = pos + block_size if block_size else end
+
+                    if end is not None and (block_end is None or
+                                            end < block_end):
+                        block_end = end
+
+                    hash_obj = hashlib.new(alg)
+                    start = pos
+
+                    while block_end is None or pos < block_end:
+                        size = _COPY_DATA_BLOCK_SIZE
+
+                        if block_end is not None:
+                            size = min(size, block_end - pos)
+
+                        data = f.read(size)
+                        if not data:
+                            break
+
+                        hash_obj.update(data)
+                        pos += len(data)
+
+                    if pos == start and digests:
+                        break
+
+                    digests.append(hash_obj.digest())
+
+                    if block_end is None or pos < block_end or \
+                            (end is not None and pos >= end):
+                        break
+
+            return alg, digests
+
+        return (yield from self._run(_check_file))
+
+
+class _LocalFile:
+    """A coroutine wrapper around local file I/O
+
+       Blocking calls are run in the default executor of the event
+       loop. Reads and writes at an explicit offset use positional I/O
+       where the platform supports it and the file isn't open for
+       append, so several can be outstanding at once. This lets the
+       transfer code read ahead from and write behind to local files
+       while waiting on the network. The file is only closed once all
+       outstanding calls have completed.
+
+    """
+
+    def __init__(self, loop, f):
+        self._loop = loop
+        self._file = f
+        self._fd = f.fileno() if _supports_pio(f) else None
+        self._unbuffered = isinstance(f, io.FileIO)
+        self._lock = threading.Lock()
+        self._seek_lock = threading.Lock()
+        self._pending = 0
+        self._closing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excinfo):
+        self._close()
+
+    def _close(self):
+        """Close the file once all outstanding calls complete"""
+
+        with self._lock:
+            self._closing = True
+
+            if not self._pending:
+                self._file.close()
+
+    def _call(self, func, *args):
+        """Make a blocking call, closing the file after if requested"""
+
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+                if self._closing and not self._pending:
+                    self._file.close()
+
+    def _run(self, func, *args):
+        """Run a blocking call on the file in the default executor"""
+
+        with self._lock:
+            if self._closing:
+                raise ValueError('I/O operation on closed file')
+
+            self._pending += 1
+
+        return self._loop.run_in_executor(None, self._call, func, *args)
+
+    def _read(self, size, offset):
+        """Read data, at the requested offset if one is specified"""
+
+        if offset is not None and size >= 0 and self._fd is not None:
+            return os.pread(self._fd, size, offset)
+
+        with self._seek_lock:
+            if offset is not None:
+                self._file.seek(offset)
+
+            return self._file.read(size)
+
+    def _write(self, data, offset):
+        """Write data, at the requested offset if one is specified"""
+
+        if offset is not None and self._fd is not None:
+            return os.pwrite(self._fd, data, offset)
+
+        with self._seek_lock:
+            if offset is not None:
+                self._file.seek(offset)
+
+            return self._file.write(data)
+
+    def _seek(self, offset, from_what):
+        """Seek to a new position in the file"""
+
+        with self._seek_lock:
+            return self._file.seek(offset, from_what)
 
     @asyncio.coroutine
-    def read(self, size=-1, offset=None):
-        """Read data from the local file"""
+    def read(self, size=-1, offset=None, *, block_size=None,
+             max_requests=None):
+        """Read data from the local file
+
+           The block_size and max_requests arguments are accepted for
+           compatibility with :meth:`SFTPFile.read` and are ignored.
+
+        """
 
-        if offset is not None:
-            self._file.seek(offset)
+        # pylint: disable=unused-argument
 
-        return self._file.read(size)
+        return (yield from self._run(self._read, size, offset))
 
     @asyncio.coroutine
-    def write(self, data, offset=None):
-        """Write data to the local file"""
+    def write(self, data, offset=None, *, block_size=None,
+              max_requests=None):
+        """Write data to the local file
+
+           The block_size and max_requests arguments are accepted for
+           compatibility with :meth:`SFTPFile.write` and are ignored.
+
+        """
+
+        # pylint: disable=unused-argument
+
+        if not self._unbuffered:
+            return (yield from self._run(self._write, data, offset))
 
-        if offset is not None:
-            self._file.seek(offset)
+        # Unbuffered writes can be partial, so keep writing until all
+        # of the data has been written
+        data = memoryview(data)
+        result = len(data)
 
-        return self._file.write(data)
+        while data:
+            written = yield from self._run(self._write, data, offset)
+            data = data[written:]
+
+            if offset is not None:
+                offset += written
+
+        return result
 
     @asyncio.coroutine
     def seek(self, offset, from_what=SEEK_SET):
         """Seek to a new position in the local file"""
 
-        return self._file.seek(offset, from_what)
+        return (yield from self._run(self._seek, offset, from_what))
 
     @asyncio.coroutine
     def tell(self):
         """Return the current position in the local file"""
 
-        return self._file.tell()
+        return (yield from self._run(self._seek, 0, SEEK_CUR))
 
     @asyncio.coroutine
     def close(self):
         """Close the local file"""
 
-        self._file.close()
+        self._close()
 
 
 class SFTPError(Error):
@@ -647,35 +909,34 @@ class SFTPSession:
         FXP_STAT:                 FXP_ATTRS,
         FXP_READLINK:             FXP_NAME,
         b'statvfs@openssh.com':   FXP_EXTENDED_REPLY,
-        b'fstatvfs@openssh.com':  FXP_EXTENDED_REPLY
+        b'fstatvfs@openssh.com':  FXP_EXTENDED_REPLY,
+        b'check-file-name':       FXP_EXTENDED_REPLY,
+        b'check-file-handle':     FXP_EXTENDED_REPLY,
+        b'md5-hash':              FXP_EXTENDED_REPLY,
+        b'md5-hash-handle':       FXP_EXTENDED_REPLY,
+        b'limits@openssh.com':    FXP_EXTENDED_REPLY
     }
 
     def __init__(self):
         self._chan = None
-        self._inpbuf = b''
-        self._pktlen = 0
-        self._recv_handler = self._recv_pkthdr
-
-    def _recv_pkthdr(self):
-        """Receive and parse an SFTP packet header"""
+        self._inpbuf = bytearray()
+        self._inplen = 4
 
-        if len(self._inpbuf) < 4:
-            return False
-
-        self._pktlen = int.from_bytes(self._inpbuf[:4], 'big')
-        self._inpbuf = self._inpbuf[4:]
-
-        self._recv_handler = self._recv_packet
-        return True
+    def _recv_packet(self, data):
+        """Process a complete SFTP packet
 
-    def _recv_packet(self):
-        """Receive the rest of an SFTP packet and process it"""
+           The data passed in is a view of the data received. Only
+           FXP_DATA packets are decoded from the view directly, so that
+           the file data they carry reaches the caller without being
+           copied. Other packets are copied so that the values decoded
+           from them are bytes.
 
-        if len(self._inpbuf) < self._pktlen:
-            return False
+        """
 
-        packet = SSHPacket(self._inpbuf[:self._pktlen])
-        self._inpbuf = self._inpbuf[self._pktlen:]
+        if data and data[0] == FXP_DATA:
+            packet = SSHPacket(data)
+        else:
+            packet = SSHPacket(bytes(data))
 
         pkttype = packet.get_byte()
 
@@ -687,9 +948,6 @@ class SFTPSession:
             pktid = packet.get_uint32()
             self._process_packet(pkttype, pktid, packet)
 
-        self._recv_handler = self._recv_pkthdr
-        return True
-
     def _process_init(self, packet):
         """Abstract method for processing an init packet"""
 
@@ -727,15 +985,54 @@ class SFTPSession:
         self._process_connection_close(exc)
 
     def data_received(self, data, datatype):
-        """Handle incoming data"""
+        """Handle incoming data
+
+           Complete packets are processed directly from the data
+           received, walking an offset through it rather than slicing
+           off each packet. Only a partial packet at the end is kept,
+           and it is appended to until enough data arrives to complete
+           it, so large packets split across many deliveries are only
+           copied once.
+
+        """
 
         # pylint: disable=unused-argument
 
-        if data:
-            self._inpbuf += data
+        if not data:
+            return
+
+        if self._inpbuf:
+            self._inpbuf.extend(data)
+
+            if len(self._inpbuf) < self._inplen:
+                return
+
+            # Views of the old buffer may outlive this call, so start a
+            # new buffer rather than resizing this one
+            data = self._inpbuf
+            self._inpbuf = bytearray()
+
+        view = memoryview(data)
+        idx = 0
+        end = len(view)
+
+        while end - idx >= 4:
+            pktlen = int.from_bytes(view[idx:idx+4], 'big')
+
+            if end - idx - 4 < pktlen:
+                break
 
-            while self._inpbuf and self._recv_handler():
-                pass
+            idx += 4
+            self._recv_packet(view[idx:idx+pktlen])
+            idx += pktlen
+
+        if idx < end:
+            self._inpbuf.extend(view[idx:])
+
+            if end - idx >= 4:
+                self._inplen = 4 + int.from_bytes(view[idx:idx+4], 'big')
+            else:
+                self._inplen = 4
 
     def eof_received(self):
         """Handle an incoming end of file"""
@@ -775,6 +1072,65 @@ class SFTPClientSession(SFTPSession, SSHClientSession):
         self._supports_fstatvfs = False
         self._supports_hardlink = False
         self._supports_fsync = False
+        self._supports_copy_data = False
+        self._supports_check_file = False
+        self._supports_md5_hash = False
+        self._supports_md5_hash_handle = False
+        self._supports_limits = False
+        self._max_read_len = 0
+        self._max_write_len = 0
+        self._max_open_handles = 0
+
+    def get_loop(self):
+        """Return the event loop used by this session"""
+
+        return self._loop
+
+    @staticmethod
+    def _limit_block_size(block_size, limit):
+        """Apply a server limit to a requested block size"""
+
+        if block_size is None:
+            if limit:
+                block_size = min(limit, _MAX_SFTP_BLOCK_SIZE)
+            else:
+                block_size = _SFTP_BLOCK_SIZE
+        elif limit:
+            block_size = min(block_size, limit)
+
+        return block_size
+
+    def get_read_size(self, block_size=None):
+        """Return the number of bytes to request in each read
+
+           If no block size is requested, the largest one the server
+           accepts is chosen. Otherwise, the requested size is reduced
+           if needed to fit within the server's limits.
+
+        """
+
+        return self._limit_block_size(block_size, self._max_read_len)
+
+    def get_write_size(self, block_size=None):
+        """Return the number of bytes to send in each write"""
+
+        return self._limit_block_size(block_size, self._max_write_len)
+
+    def get_block_size(self, block_size=None):
+        """Return the number of bytes to both read and write at a time"""
+
+        return min(self.get_read_size(block_size),
+                   self.get_write_size(block_size))
+
+    def get_max_open_handles(self):
+        """Return the number of open handles allowed, or 0 if unlimited"""
+
+        return self._max_open_handles
+
+    def supports_check_file(self):
+        """Return whether the server can hash file data for us"""
+
+        return self._supports_check_file or self._supports_md5_hash
 
     def _fail(self, code, reason, lang=DEFAULT_LANG):
         """Handle a connection failure"""
@@ -877,6 +1233,16 @@ class SFTPClientSession(SFTPSession, SSHClientSession):
                 self._supports_hardlink = True
             elif name == b'fsync@openssh.com' and data == b'1':
                 self._supports_fsync = True
+            elif name == b'copy-data' and data == b'1':
+                self._supports_copy_data = True
+            elif name == b'check-file':
+                self._supports_check_file = True
+            elif name == b'md5-hash' and data == b'1':
+                self._supports_md5_hash = True
+            elif name == b'md5-hash-handle' and data == b'1':
+                self._supports_md5_hash_handle = True
+            elif name == b'limits@openssh.com' and data == b'1':
+                self._supports_limits = True
 
         if version == 3:
             # Check if the server has a buggy SYMLINK implementation
@@ -1010,7 +1376,12 @@ class SFTPClientSession(SFTPSession, SSHClientSession):
         self._send_request(FXP_CLOSE, String(handle))
 
     def read(self, handle, offset, length):
-        """Make an SFTP read request"""
+        """Make an SFTP read request
+
+           The data is returned as a view of the response received,
+           so that callers can copy it directly to where it's needed.
+
+        """
 
         return self._make_request(FXP_READ, String(handle),
                                   UInt64(offset), UInt32(length))
@@ -1150,57 +1521,450 @@ class SFTPClientSession(SFTPSession, SSHClientSession):
         else:
             raise SFTPError(FX_OP_UNSUPPORTED, 'fsync not supported')
 
+    def copy_data(self, read_handle, read_offset, length,
+                  write_handle, write_offset):
+        """Make an SFTP copy-data request"""
 
-class SFTPFile:
-    """SFTP client remote file object
+        if self._supports_copy_data:
+            return self._make_request(b'copy-data', String(read_handle),
+                                      UInt64(read_offset), UInt64(length),
+                                      String(write_handle),
+                                      UInt64(write_offset))
+        else:
+            raise SFTPError(FX_OP_UNSUPPORTED, 'copy-data not supported')
 
-       This class represents an open file on a remote SFTP server. It
-       is opened with the :meth:`open() <SFTPClient.open>` method on the
-       :class:`SFTPClient` class and provides methods to read and write
-       data and get and set attributes on the open file.
+    @asyncio.coroutine
+    def request_limits(self):
+        """Make an SFTP limits request, if the server supports it
 
-    """
+           The limits returned are used to choose default block sizes
+           for reads and writes. If the server doesn't report limits,
+           or fails to return them, no limits are applied.
 
-    def __init__(self, session, handle, appending, encoding, errors):
-        self._session = session
-        self._handle = handle
-        self._appending = appending
-        self._encoding = encoding
-        self._errors = errors
-        self._offset = None if appending else 0
+        """
 
-    def __enter__(self):
-        """Allow SFTPFile to be used as a context manager"""
+        if not self._supports_limits:
+            return
 
-        return self
+        try:
+            packet = yield from self._make_request(b'limits@openssh.com')
+        except SFTPError:
+            return
 
-    def __exit__(self, *exc_info):
-        """Automatically close the file when used as a context manager"""
+        max_packet_len = packet.get_uint64()
+        max_read_len = packet.get_uint64()
+        max_write_len = packet.get_uint64()
+        max_open_handles = packet.get_uint64()
+        packet.check_end()
 
-        if self._handle:
-            self._session.nonblocking_close(self._handle)
-            self._handle = None
+        if max_packet_len > _SFTP_PACKET_OVERHEAD:
+            max_data_len = max_packet_len - _SFTP_PACKET_OVERHEAD
 
-    @asyncio.coroutine
-    def _end(self):
-        """Return the offset of the end of the file"""
+            max_read_len = min(max_read_len or max_data_len, max_data_len)
+            max_write_len = min(max_write_len or max_data_len, max_data_len)
 
-        attrs = yield from self.stat()
-        return attrs.size
+        self._max_read_len = min(max_read_len, 0xffffffff)
+        self._max_write_len = min(max_write_len, 0xffffffff)
+        self._max_open_handles = max_open_handles
 
     @asyncio.coroutine
-    def read(self, size=-1, offset=None):
-        """Read data from the remote file
+    def _check_file(self, request, md5_request, target, get_size, algs,
+                    offset, length, block_size):
+        """Make an SFTP check-file request, falling back to md5-hash
 
-           This method reads and returns up to ``size`` bytes of data
-           from the remote file. If size is negative, all data up to
-           the end of the file is returned.
+           This returns the hash algorithm the server chose along with
+           the concatenated digests of each block. If the server only
+           supports md5-hash, an md5-hash request is made for each
+           block instead, using get_size to find the end of the range
+           if no length was specified.
 
-           If offset is specified, the read will be performed starting
-           at that offset rather than the current file position. This
-           argument should be provided if you want to issue parallel
-           reads on the same file, since the file position is not
-           predictable in that case.
+        """
+
+        if self._supports_check_file:
+            packet = yield from self._make_request(request, String(target),
+                                                   NameList(algs),
+                                                   UInt64(offset),
+                                                   UInt64(length),
+                                                   UInt32(block_size))
+
+            if packet.get_string() != b'check-file':
+                raise SFTPError(FX_BAD_MESSAGE, 'Invalid check-file reply')
+
+            alg = packet.get_string()
+            return alg, packet.get_remaining_payload()
+        elif md5_request and b'md5' in algs:
+            if block_size:
+                if not length:
+                    length = max((yield from get_size()) - offset, 0)
+
+                blocks = [(block_offset,
+                           min(block_size, offset + length - block_offset))
+                          for block_offset in range(offset, offset + length,
+                                                    block_size)]
+
+                if not blocks:
+                    blocks = [(offset, 0)]
+            else:
+                blocks = [(offset, length)]
+
+            digests = []
+
+            for i in range(0, len(blocks), _MAX_SFTP_REQUESTS):
+                digests.extend((yield from asyncio.gather(
+                    *(self._md5_hash(md5_request, target, *block)
+                      for block in blocks[i:i+_MAX_SFTP_REQUESTS]),
+                    loop=self._loop)))
+
+            return b'md5', b''.join(digests)
+        else:
+            raise SFTPError(FX_OP_UNSUPPORTED, 'check-file not supported')
+
+    @asyncio.coroutine
+    def _md5_hash(self, request, target, offset, length):
+        """Make an SFTP md5-hash request"""
+
+        packet = yield from self._make_request(request, String(target),
+                                               UInt64(offset), UInt64(length),
+                                               String(b''))
+
+        if packet.get_string() != b'md5-hash':
+            raise SFTPError(FX_BAD_MESSAGE, 'Invalid md5-hash reply')
+
+        digest = packet.get_string()
+        packet.check_end()
+
+        return digest
+
+    def check_file_name(self, path, algs, offset, length, block_size):
+        """Make an SFTP check-file-name request"""
+
+        md5_request = b'md5-hash' if self._supports_md5_hash else None
+
+        @asyncio.coroutine
+        def get_size():
+            """Return the size of the file being hashed"""
+
+            return (yield from self.stat(path)).size
+
+        return self._check_file(b'check-file-name', md5_request, path,
+                                get_size, algs, offset, length, block_size)
+
+    def check_file_handle(self, handle, algs, offset, length, block_size):
+        """Make an SFTP check-file-handle request"""
+
+        if self._supports_md5_hash_handle:
+            md5_request = b'md5-hash-handle'
+        else:
+            md5_request = None
+
+        @asyncio.coroutine
+        def get_size():
+            """Return the size of the file being hashed"""
+
+            return (yield from self.fstat(handle)).size
+
+        return self._check_file(b'check-file-handle', md5_request, handle,
+                                get_size, algs, offset, length, block_size)
+
+
+class _SFTPFileReader:
+    """Pipelined reader for a remote SFTP file
+
+       This class keeps up to max_requests read requests outstanding
+       at increasing offsets in the file, returning the data received
+       in file order. Short reads are completed by requesting the rest
+       of the block before any later data is returned, and reading
+       stops when the server reports EOF or size bytes have been read.
+
+    """
+
+    def __init__(self, session, handle, offset, size,
+                 block_size, max_requests):
+        self._session = session
+        self._handle = handle
+        self._offset = offset
+        self._end = offset + size if size is not None and size >= 0 else None
+        self._block_size = block_size
+        self._max_requests = max_requests
+        self._pending = deque()
+
+    def _start_request(self, offset, length):
+        """Start a read request and return a task for its result"""
+
+        return asyncio.async(self._session.read(self._handle, offset, length),
+                             loop=self._session.get_loop())
+
+    def _start_requests(self):
+        """Fill the window of outstanding read requests"""
+
+        while (len(self._pending) < self._max_requests and
+               (self._end is None or self._offset < self._end)):
+            length = self._block_size
+
+            if self._end is not None:
+                length = min(length, self._end - self._offset)
+
+            self._pending.append((self._offset, length,
+                                  self._start_request(self._offset, length)))
+            self._offset += length
+
+    def cancel(self):
+        """Cancel any outstanding read requests"""
+
+        for _, _, task in self._pending:
+            task.cancel()
+
+        self._pending.clear()
+        self._end = self._offset
+
+    @asyncio.coroutine
+    def read_block(self):
+        """Return the next block of data, or an empty block at the end"""
+
+        self._start_requests()
+
+        if not self._pending:
+            return b''
+
+        offset, length, task = self._pending.popleft()
+
+        try:
+            data = yield from task
+        except SFTPError as exc:
+            if exc.code == FX_EOF:
+                data = b''
+            else:
+                self.cancel()
+                raise
+
+        if not data:
+            self.cancel()
+        elif len(data) < length:
+            offset += len(data)
+            length -= len(data)
+            self._pending.appendleft((offset, length,
+                                      self._start_request(offset, length)))
+
+        return data
+
+
+class _SFTPFileWriter:
+    """Pipelined writer for a remote SFTP file
+
+       This class splits data into blocks and sends each block as a
+       separate write request, keeping up to max_requests of them
+       outstanding at once. Acknowledgements are collected in offset
+       order, so the first error reported is the one for the lowest
+       offset which failed. Only the data in outstanding requests is
+       held in memory.
+
+    """
+
+    def __init__(self, session, handle, offset, block_size, max_requests):
+        self._session = session
+        self._handle = handle
+        self._offset = offset
+        self._block_size = block_size
+        self._max_requests = max_requests
+        self._pending = deque()
+
+    @asyncio.coroutine
+    def _wait_oldest(self):
+        """Wait for the oldest outstanding write request to complete"""
+
+        task = self._pending.popleft()
+
+        try:
+            yield from task
+        except SFTPError:
+            self.cancel()
+            raise
+
+    def cancel(self):
+        """Cancel any outstanding write requests"""
+
+        for task in self._pending:
+            if task.done():
+                if not task.cancelled():
+                    task.exception()
+            else:
+                task.cancel()
+
+        self._pending.clear()
+
+    @asyncio.coroutine
+    def write(self, data):
+        """Write data, waiting if too many requests are outstanding"""
+
+        data = memoryview(data)
+
+        for start in range(0, len(data), self._block_size):
+            while len(self._pending) >= self._max_requests:
+                yield from self._wait_oldest()
+
+            block = data[start:start+self._block_size]
+
+            self._pending.append(asyncio.async(
+                self._session.write(self._handle, self._offset, block),
+                loop=self._session.get_loop()))
+
+            self._offset += len(block)
+
+    @asyncio.coroutine
+    def flush(self):
+        """Wait for all outstanding write requests to complete"""
+
+        while self._pending:
+            yield from self._wait_oldest()
+
+
+class _SFTPAttrCache:
+    """Cache of remote file attributes
+
+       Entries are keyed by the encoded path and whether symbolic links
+       were followed. They expire ttl seconds after being added, and
+       once there are more than max_entries of them, the least recently
+       used entries are evicted.
+
+    """
+
+    def __init__(self, ttl, max_entries):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, path, follow_symlinks):
+        """Return cached attributes for a path, or None if there are none"""
+
+        key = (path, follow_symlinks)
+        entry = self._entries.get(key)
+
+        if entry:
+            attrs, expires = entry
+
+            if time.monotonic() < expires:
+                self._entries.move_to_end(key)
+                return attrs
+            else:
+                del self._entries[key]
+
+        return None
+
+    def add(self, path, follow_symlinks, attrs):
+        """Add attributes for a path to the cache"""
+
+        key = (path, follow_symlinks)
+
+        self._entries[key] = (attrs, time.monotonic() + self._ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def add_names(self, dirpath, names):
+        """Add attributes returned when reading a directory to the cache"""
+
+        for name in names:
+            permissions = name.attrs.permissions
+
+            if permissions is None or name.filename in (b'.', b'..'):
+                continue
+
+            path = posixpath.join(dirpath, name.filename)
+
+            # Directory entries aren't followed, but the attributes are
+            # the same either way for anything other than a symlink
+            self.add(path, False, name.attrs)
+
+            if not stat.S_ISLNK(permissions):
+                self.add(path, True, name.attrs)
+
+    def invalidate(self, path, subtree=False):
+        """Remove cached attributes for a path
+
+           If subtree is set, attributes of any paths under it are
+           also removed.
+
+        """
+
+        self._entries.pop((path, False), None)
+        self._entries.pop((path, True), None)
+
+        if subtree:
+            prefix = path.rstrip(b'/') + b'/'
+
+            for key in [key for key in self._entries
+                        if key[0].startswith(prefix)]:
+                del self._entries[key]
+
+
+class SFTPFile:
+    """SFTP client remote file object
+
+       This class represents an open file on a remote SFTP server. It
+       is opened with the :meth:`open() <SFTPClient.open>` method on the
+       :class:`SFTPClient` class and provides methods to read and write
+       data and get and set attributes on the open file.
+
+    """
+
+    def __init__(self, session, handle, appending, encoding, errors,
+                 attr_cache=None, path=None):
+        self._session = session
+        self._handle = handle
+        self._appending = appending
+        self._encoding = encoding
+        self._errors = errors
+        self._attr_cache = attr_cache
+        self._path = path
+        self._offset = None if appending else 0
+
+    def _invalidate(self):
+        """Remove any cached attributes for this file"""
+
+        if self._attr_cache:
+            self._attr_cache.invalidate(self._path)
+
+    def __enter__(self):
+        """Allow SFTPFile to be used as a context manager"""
+
+        return self
+
+    def __exit__(self, *exc_info):
+        """Automatically close the file when used as a context manager"""
+
+        if self._handle:
+            self._session.nonblocking_close(self._handle)
+            self._handle = None
+
+    @asyncio.coroutine
+    def _end(self):
+        """Return the offset of the end of the file"""
+
+        attrs = yield from self.stat()
+        return attrs.size
+
+    @asyncio.coroutine
+    def read(self, size=-1, offset=None, *, block_size=None,
+             max_requests=_MAX_SFTP_REQUESTS):
+        """Read data from the remote file
+
+           This method reads and returns up to ``size`` bytes of data
+           from the remote file. If size is negative, all data up to
+           the end of the file is returned.
+
+           If offset is specified, the read will be performed starting
+           at that offset rather than the current file position. This
+           argument should be provided if you want to issue parallel
+           reads on the same file, since the file position is not
+           predictable in that case.
+
+           Reads larger than ``block_size`` are split into multiple
+           requests of that size, with up to ``max_requests`` of them
+           outstanding at once. The data is returned in file order,
+           and is only shorter than requested if EOF is reached.
+           By default, the block size is the largest read the server
+           reports that it accepts, or 8 KB if it doesn't report one.
 
            Data will be returned as a string if an encoding was set when
            the file was opened. Otherwise, data is returned as bytes.
@@ -1211,6 +1975,10 @@ class SFTPFile:
                The number of bytes to read
            :param integer offset: (optional)
                The offset from the beginning of the file to begin reading
+           :param integer block_size: (optional)
+               The number of bytes to request in each read request
+           :param integer max_requests: (optional)
+               The maximum number of read requests to have outstanding
 
            :returns: data read from the file, as a string or bytes
 
@@ -1224,6 +1992,8 @@ class SFTPFile:
         if self._handle is None:
             raise ValueError('I/O operation on closed file')
 
+        block_size = self._session.get_read_size(block_size)
+
         if offset is None:
             offset = self._offset
 
@@ -1231,28 +2001,30 @@ class SFTPFile:
             # We're appending and haven't seeked backward in the file
             # since the last write, so there's no data to return
             data = b''
-        elif size is None or size < 0:
+        elif size is None or size < 0 or size > block_size:
+            reader = _SFTPFileReader(self._session, self._handle, offset,
+                                     size, block_size, max_requests)
             data = []
 
             try:
                 while True:
-                    result = yield from self._session.read(self._handle,
-                                                           offset,
-                                                           _SFTP_BLOCK_SIZE)
+                    result = yield from reader.read_block()
+                    if not result:
+                        break
+
                     data.append(result)
                     offset += len(result)
                     self._offset = offset
-            except SFTPError as exc:
-                if exc.code != FX_EOF:
-                    raise
+            finally:
+                reader.cancel()
 
             data = b''.join(data)
         else:
             data = b''
 
             try:
-                data = yield from self._session.read(self._handle,
-                                                     offset, size)
+                data = bytes((yield from self._session.read(self._handle,
+                                                            offset, size)))
                 self._offset = offset + len(data)
             except SFTPError as exc:
                 if exc.code != FX_EOF:
@@ -1264,7 +2036,128 @@ class SFTPFile:
         return data
 
     @asyncio.coroutine
-    def write(self, data, offset=None):
+    def readinto(self, buffer, offset=None, *, block_size=None,
+                 max_requests=_MAX_SFTP_REQUESTS):
+        """Read data from the remote file into a buffer
+
+           This method reads up to ``len(buffer)`` bytes from the
+           remote file into buffer, which can be any writable object
+           supporting the buffer protocol, such as a bytearray or
+           mmap. It is equivalent to calling :meth:`read_to` with a
+           buffer and no size.
+
+           :param buffer:
+               The buffer to read data into
+           :param integer offset: (optional)
+               The offset from the beginning of the file to begin reading
+           :param integer block_size: (optional)
+               The number of bytes to request in each read request
+           :param integer max_requests: (optional)
+               The maximum number of read requests to have outstanding
+
+           :returns: number of bytes read, which is less than the
+                     length of the buffer only when EOF is reached
+
+           :raises: | :exc:`ValueError` if the file has been closed
+                    | :exc:`TypeError` if buffer isn't a writable buffer
+                    | :exc:`SFTPError` if the server returns an error
+
+        """
+
+        # Fail here rather than treating buffer as a file in read_to()
+        memoryview(buffer)
+
+        return (yield from self.read_to(buffer, -1, offset,
+                                        block_size=block_size,
+                                        max_requests=max_requests))
+
+    @asyncio.coroutine
+    def read_to(self, dest, size=-1, offset=None, *, block_size=None,
+                max_requests=_MAX_SFTP_REQUESTS):
+        """Read data from the remote file into a buffer or file
+
+           This method reads up to ``size`` bytes of data from the
+           remote file and copies it directly into dest, without
+           building up the data read as a bytes object first. If size
+           is negative, all data up to the end of the file is read.
+
+           If dest supports the buffer protocol, such as a bytearray,
+           memoryview, or mmap, data is stored starting at the
+           beginning of it, and no more than its length is read.
+           Otherwise, dest should be a file object opened in binary
+           mode, and data is written to it at its current position.
+
+           Like :meth:`read`, reads are split into requests of
+           ``block_size`` bytes, with up to ``max_requests`` of them
+           outstanding at once, and data is stored in file order as
+           it arrives. Data is never decoded, even if an encoding was
+           set when the file was opened.
+
+           :param dest:
+               The buffer or file to read data into
+           :param integer size: (optional)
+               The maximum number of bytes to read
+           :param integer offset: (optional)
+               The offset from the beginning of the file to begin reading
+           :param integer block_size: (optional)
+               The number of bytes to request in each read request
+           :param integer max_requests: (optional)
+               The maximum number of read requests to have outstanding
+
+           :returns: number of bytes read
+
+           :raises: | :exc:`ValueError` if the file has been closed
+                    | :exc:`SFTPError` if the server returns an error
+
+        """
+
+        if self._handle is None:
+            raise ValueError('I/O operation on closed file')
+
+        block_size = self._session.get_read_size(block_size)
+
+        if offset is None:
+            offset = self._offset
+
+        if offset is None:
+            # We're appending and haven't seeked backward in the file
+            # since the last write, so there's no data to read
+            return 0
+
+        try:
+            buf = memoryview(dest).cast('B')
+        except TypeError:
+            buf = None
+        else:
+            if size is None or size < 0 or size > len(buf):
+                size = len(buf)
+
+        start = offset
+        reader = _SFTPFileReader(self._session, self._handle, offset,
+                                 size, block_size, max_requests)
+
+        try:
+            while True:
+                data = yield from reader.read_block()
+                if not data:
+                    break
+
+                if buf is None:
+                    dest.write(data)
+                else:
+                    pos = offset - start
+                    buf[pos:pos+len(data)] = data
+
+                offset += len(data)
+                self._offset = offset
+        finally:
+            reader.cancel()
+
+        return offset - start
+
+    @asyncio.coroutine
+    def write(self, data, offset=None, *, block_size=None,
+              max_requests=_MAX_SFTP_REQUESTS):
         """Write data to the remote file
 
            This method writes the specified data at the current
@@ -1274,6 +2167,10 @@ class SFTPFile:
                The data to write to the file
            :param integer offset: (optional)
                The offset from the beginning of the file to begin writing
+           :param integer block_size: (optional)
+               The maximum number of bytes to send in each write request
+           :param integer max_requests: (optional)
+               The maximum number of write requests to have outstanding
            :type data: string or bytes
 
            If offset is specified, the write will be performed starting
@@ -1282,6 +2179,13 @@ class SFTPFile:
            writes on the same file, since the file position is not
            predictable in that case.
 
+           Writes larger than ``block_size`` are split into multiple
+           requests of that size, with up to ``max_requests`` of them
+           outstanding at once. If any of them fail, the error for the
+           lowest offset is raised once the earlier requests complete.
+           By default, the block size is the largest write the server
+           reports that it accepts, or 8 KB if it doesn't report one.
+
            :returns: number of bytes written
 
            :raises: | :exc:`ValueError` if the file has been closed
@@ -1294,6 +2198,8 @@ class SFTPFile:
         if self._handle is None:
             raise ValueError('I/O operation on closed file')
 
+        block_size = self._session.get_write_size(block_size)
+
         if offset is None:
             # Offset is ignored when appending, so fill in an offset of 0
             # if we don't have a current file position
@@ -1302,7 +2208,21 @@ class SFTPFile:
         if self._encoding:
             data = data.encode(self._encoding, self._errors)
 
-        yield from self._session.write(self._handle, offset, data)
+        try:
+            if len(data) > block_size:
+                writer = _SFTPFileWriter(self._session, self._handle, offset,
+                                         block_size, max_requests)
+
+                try:
+                    yield from writer.write(data)
+                    yield from writer.flush()
+                finally:
+                    writer.cancel()
+            else:
+                yield from self._session.write(self._handle, offset, data)
+        finally:
+            self._invalidate()
+
         self._offset = None if self._appending else offset + len(data)
         return len(data)
 
@@ -1390,7 +2310,10 @@ class SFTPFile:
         if self._handle is None:
             raise ValueError('I/O operation on closed file')
 
-        yield from self._session.fsetstat(self._handle, attrs)
+        try:
+            yield from self._session.fsetstat(self._handle, attrs)
+        finally:
+            self._invalidate()
 
     @asyncio.coroutine
     def statvfs(self):
@@ -1412,6 +2335,57 @@ class SFTPFile:
 
         return (yield from self._session.fstatvfs(self._handle))
 
+    @asyncio.coroutine
+    def check_file(self, hash_algs=_DEFAULT_HASH_ALGS, offset=0, length=0,
+                   block_size=0):
+        """Return hashes of the data in the remote file
+
+           This method asks the server to hash a range of the file's
+           data, allowing it to be compared against a local copy
+           without downloading it. The server picks the first
+           algorithm it supports from hash_algs.
+
+           If block_size is non-zero, the range is split into blocks
+           of that many bytes and a separate hash is returned for
+           each block, so that only the blocks which differ need to be
+           transferred. Otherwise, a single hash of the whole range is
+           returned.
+
+           If the server doesn't support the check-file extension but
+           does support md5-hash, that is used instead when ``'md5'``
+           is one of the algorithms requested.
+
+           :param hash_algs: (optional)
+               The names of the hash algorithms to accept, in order
+               of preference
+           :param integer offset: (optional)
+               The offset from the beginning of the file to start hashing
+           :param integer length: (optional)
+               The number of bytes to hash, or 0 to hash to the end of
+               the file
+           :param integer block_size: (optional)
+               The number of bytes covered by each hash, or 0 to return
+               a single hash of the whole range
+           :type hash_algs: list of strings
+
+           :returns: A tuple of the name of the hash algorithm used and
+                     a list of the digests of each block, as bytes
+
+           :raises: | :exc:`ValueError` if the file has been closed
+                    | :exc:`SFTPError` if the server doesn't support these
+                      extensions or returns an error
+
+        """
+
+        if self._handle is None:
+            raise ValueError('I/O operation on closed file')
+
+        algs = [alg.encode('ascii') for alg in hash_algs]
+        alg, hashes = yield from self._session.check_file_handle(
+            self._handle, algs, offset, length, block_size)
+
+        return _split_hashes(alg, hashes)
+
     @asyncio.coroutine
     def truncate(self, size=None):
         """Truncate the remote file to the specified size
@@ -1500,6 +2474,37 @@ class SFTPFile:
 
         yield from self._session.fsync(self._handle)
 
+    @asyncio.coroutine
+    def _copy_to(self, dst, offset):
+        """Copy data to another file on the same server
+
+           This asks the server to copy everything from offset to the
+           end of this file into the same offset in dst, returning
+           ``True`` if it did so. If dst is on a different server or
+           the server doesn't support copy-data, ``False`` is returned
+           and the data needs to be copied by the client instead.
+
+        """
+
+        if self._handle is None or dst._handle is None:
+            raise ValueError('I/O operation on closed file')
+
+        if dst._session is not self._session:
+            return False
+
+        try:
+            yield from self._session.copy_data(self._handle, offset, 0,
+                                               dst._handle, offset)
+        except SFTPError as exc:
+            if exc.code == FX_OP_UNSUPPORTED:
+                return False
+            else:
+                raise
+        finally:
+            dst._invalidate()
+
+        return True
+
     @asyncio.coroutine
     def close(self):
         """Close the remote file"""
@@ -1509,13 +2514,186 @@ class SFTPFile:
             self._handle = None
 
 
-class SFTPClient:
-    """SFTP client
+class _SFTPFileCopier:
+    """Pipelined copy of data between two open files
 
-       This class represents the client side of an SFTP session. It is
-       started by calling the :meth:`start_sftp_client()
-       <SSHClientConnection.start_sftp_client>` method on the
-       :class:`SSHClientConnection` class.
+       This class copies the bytes of a file between offset and size
+       by splitting them into blocks, each of which is read and then
+       written back at the same offset. Up to max_requests blocks are
+       in flight at once, so reads of later blocks overlap with writes
+       of earlier ones. Any data beyond size is copied sequentially
+       afterward, in case the file grew after its size was checked.
+
+       When both files are open on the same SFTP server and it
+       supports the copy-data extension, the server is asked to copy
+       the data itself, so that none of it crosses the network.
+
+    """
+
+    def __init__(self, src, dst, offset, size, block_size, max_requests,
+                 loop):
+        self._src = src
+        self._dst = dst
+        self._offset = offset
+        self._size = size or 0
+        self._block_size = block_size
+        self._max_requests = max_requests
+        self._loop = loop
+
+    @asyncio.coroutine
+    def _copy_block(self, offset, length):
+        """Copy a single block, completing any short reads"""
+
+        while length > 0:
+            data = yield from self._src.read(length, offset,
+                                             block_size=length)
+            if not data:
+                break
+
+            yield from self._dst.write(data, offset, block_size=length)
+            offset += len(data)
+            length -= len(data)
+
+    @asyncio.coroutine
+    def run(self):
+        """Copy the file data"""
+
+        if isinstance(self._src, SFTPFile) and \
+                isinstance(self._dst, SFTPFile) and \
+                (yield from self._src._copy_to(self._dst, self._offset)):
+            return
+
+        pending = deque()
+        offset = self._offset
+
+        try:
+            while offset < self._size:
+                while len(pending) >= self._max_requests:
+                    yield from pending.popleft()
+
+                length = min(self._block_size, self._size - offset)
+                pending.append(asyncio.async(self._copy_block(offset, length),
+                                             loop=self._loop))
+                offset += length
+
+            while pending:
+                yield from pending.popleft()
+        finally:
+            for task in pending:
+                if task.done():
+                    if not task.cancelled():
+                        task.exception()
+                else:
+                    task.cancel()
+
+        while True:
+            data = yield from self._src.read(self._block_size, offset,
+                                             block_size=self._block_size)
+            if not data:
+                break
+
+            yield from self._dst.write(data, offset,
+                                       block_size=self._block_size)
+            offset += len(data)
+
+
+class _SFTPDirIterator:
+    """Asynchronous iterator over the entries in a remote directory
+
+       The directory is read one READDIR response at a time. The
+       request for the next batch of names is sent as soon as the
+       previous batch arrives, so names can be consumed while later
+       ones are still being fetched, and only a couple of batches are
+       held in memory at once. The directory handle is closed when
+       the end of the directory is reached or :meth:`close` is called.
+
+    """
+
+    def __init__(self, session, dirpath, decode, attr_cache):
+        self._session = session
+        self._dirpath = dirpath
+        self._decode = decode
+        self._attr_cache = attr_cache
+        self._handle = None
+        self._pending = None
+        self._names = deque()
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        if not self._names:
+            self._names.extend((yield from self.read_batch()))
+
+            if not self._names:
+                raise StopAsyncIteration # pylint: disable=undefined-variable
+
+        return self._names.popleft()
+
+    def _start_readdir(self):
+        """Send the request for the next batch of names"""
+
+        self._pending = asyncio.async(self._session.readdir(self._handle),
+                                      loop=self._session.get_loop())
+
+    @asyncio.coroutine
+    def read_batch(self):
+        """Return the next batch of names, or an empty list when done"""
+
+        names = []
+
+        while not names and not self._done:
+            if self._handle is None:
+                self._handle = yield from self._session.opendir(self._dirpath)
+                self._start_readdir()
+
+            try:
+                names = yield from self._pending
+            except SFTPError as exc:
+                self._pending = None
+                yield from self.close()
+
+                if exc.code == FX_EOF:
+                    break
+                else:
+                    raise
+
+            self._start_readdir()
+
+        if self._attr_cache:
+            self._attr_cache.add_names(self._dirpath, names)
+
+        if self._decode:
+            for name in names:
+                name.filename = self._decode(name.filename)
+                name.longname = self._decode(name.longname)
+
+        return names
+
+    @asyncio.coroutine
+    def close(self):
+        """Stop reading the directory and close its handle"""
+
+        self._done = True
+
+        if self._pending:
+            self._pending.cancel()
+            self._pending = None
+
+        if self._handle is not None:
+            handle, self._handle = self._handle, None
+            yield from self._session.close(handle)
+
+
+class SFTPClient:
+    """SFTP client
+
+       This class represents the client side of an SFTP session. It is
+       started by calling the :meth:`start_sftp_client()
+       <SSHClientConnection.start_sftp_client>` method on the
+       :class:`SSHClientConnection` class.
 
     """
 
@@ -1531,12 +2709,20 @@ class SFTPClient:
         'x+': FXF_READ | FXF_WRITE | FXF_CREAT | FXF_EXCL
     }
 
-    def __init__(self, session, path_encoding, path_errors):
+    def __init__(self, session, path_encoding, path_errors,
+                 attr_cache_ttl, attr_cache_size):
         self._session = session
+        self._local_fs = _LocalFS(session.get_loop())
         self._path_encoding = path_encoding
         self._path_errors = path_errors
         self._cwd = None
 
+        if attr_cache_ttl:
+            self._attr_cache = _SFTPAttrCache(attr_cache_ttl,
+                                              attr_cache_size)
+        else:
+            self._attr_cache = None
+
     def __enter__(self):
         """Allow SFTPClient to be used as a context manager"""
 
@@ -1592,6 +2778,33 @@ class SFTPClient:
 
         return posixpath.join(parent, path) if parent else path
 
+    def _invalidate(self, path, subtree=False):
+        """Remove any cached attributes for an encoded remote path"""
+
+        if self._attr_cache:
+            self._attr_cache.invalidate(path, subtree)
+
+    @asyncio.coroutine
+    def _stat(self, path, follow_symlinks):
+        """Get attributes of a remote path, using the cache if enabled"""
+
+        path = self.compose_path(path)
+
+        if self._attr_cache:
+            attrs = self._attr_cache.get(path, follow_symlinks)
+            if attrs:
+                return attrs
+
+        if follow_symlinks:
+            attrs = yield from self._session.stat(path)
+        else:
+            attrs = yield from self._session.lstat(path)
+
+        if self._attr_cache:
+            self._attr_cache.add(path, follow_symlinks, attrs)
+
+        return attrs
+
     @asyncio.coroutine
     def _mode(self, path, statfunc=None):
         """Return the mode of a remote path, or 0 if it can't be accessed"""
@@ -1608,25 +2821,94 @@ class SFTPClient:
                 raise
 
     @asyncio.coroutine
-    def _glob(self, fs, basedir, patlist, decode, result):
-        """Match a glob pattern"""
+    def _glob_dir(self, fs, basedir, pattern, want_dirs):
+        """Match a single glob pattern component against a directory
+
+           This method returns the paths in basedir which match pattern.
+           If want_dirs is set, only paths which refer to a directory
+           are returned. For remote directories, the attributes returned
+           by readdir are used to decide this, except for symbolic links,
+           which need a separate stat to determine what they point at.
+           Local directories are only listed, and just the names which
+           match are checked.
+
+        """
 
-        pattern, patlist = patlist[0], patlist[1:]
+        if fs is self:
+            names = yield from fs.readdir(basedir or b'.')
+            names = [(name.filename, name.attrs.permissions)
+                     for name in names]
+        else:
+            names = yield from fs.listdir(basedir or b'.')
+            names = [(filename, None) for filename in names]
+
+        matches = []
 
-        for name in (yield from fs.listdir(basedir or b'.')):
-            if pattern != name and name in (b'.', b'..'):
+        for filename, mode in names:
+            if pattern != filename and filename in (b'.', b'..'):
                 continue
 
-            if name[:1] == b'.' and not pattern[:1] == b'.':
+            if filename[:1] == b'.' and not pattern[:1] == b'.':
                 continue
 
-            if fnmatch(name, pattern):
-                newbase = fs.compose_path(name, parent=basedir)
+            if fnmatch(filename, pattern):
+                newbase = fs.compose_path(filename, parent=basedir)
+
+                if want_dirs:
+                    if mode is None or stat.S_ISLNK(mode):
+                        if not (yield from fs.isdir(newbase)):
+                            continue
+                    elif not stat.S_ISDIR(mode):
+                        continue
+
+                matches.append(newbase)
+
+        return matches
+
+    @asyncio.coroutine
+    def _glob(self, fs, basedir, patlist, decode, result):
+        """Match a glob pattern
+
+           Each component of the pattern is matched against all of the
+           directories which matched the previous component, reading
+           several directories at once. Matches are returned in the
+           same order as a depth-first search.
+
+        """
+
+        basedirs = [basedir]
+        loop = self._session.get_loop()
+
+        # Each remote directory being read holds a handle open on the
+        # server, so stay within any limit the server has on those
+        max_dirs = _MAX_SFTP_REQUESTS
+
+        if fs is self:
+            max_dirs = self._session.get_max_open_handles() or max_dirs
+
+        for i, pattern in enumerate(patlist):
+            want_dirs = i < len(patlist) - 1
+            matches = []
+            pending = deque()
 
-                if not patlist:
-                    result.append(fs.decode(newbase, decode))
-                elif (yield from fs.isdir(newbase)):
-                    yield from self._glob(fs, newbase, patlist, decode, result)
+            try:
+                for basedir in basedirs:
+                    if len(pending) >= max_dirs:
+                        matches.extend((yield from pending.popleft()))
+
+                    pending.append(asyncio.async(
+                        self._glob_dir(fs, basedir, pattern, want_dirs),
+                        loop=loop))
+
+                while pending:
+                    matches.extend((yield from pending.popleft()))
+            finally:
+                for task in pending:
+                    task.cancel()
+
+            basedirs = matches
+
+        result.extend(fs.decode(path, decode) for path in basedirs)
 
     @asyncio.coroutine
     def _begin_glob(self, fs, patterns, error_handler):
@@ -1671,9 +2953,29 @@ class SFTPClient:
         return result
 
     @asyncio.coroutine
-    def _copy(self, srcfs, dstfs, srcpath, dstpath, preserve,
-              recurse, follow_symlinks, error_handler):
-        """Copy a file, directory, or symbolic link"""
+    def _copy(self, srcfs, dstfs, srcpath, dstpath, preserve, recurse,
+              follow_symlinks, block_size, max_requests, resume, sync,
+              checksum, delete, error_handler, subdirs):
+        """Copy a file, directory, or symbolic link
+
+           Directories are created here, but the source and destination
+           paths of their entries are returned rather than copied, so
+           that the caller can schedule them. When preserving
+           attributes, directories are also added to subdirs so that
+           their attributes can be set once their contents are copied.
+
+           If resume is set, data already present in destination files
+           isn't copied again. If sync is set, files and links which
+           are unchanged at the destination are skipped, comparing the
+           data of files with the same size if checksum is also set,
+           and destination entries of a different type than their
+           source are replaced. If delete is also set, entries in
+           destination directories which aren't in the source are
+           removed.
+
+        """
+
+        entries = []
 
         if follow_symlinks:
             srcattrs = yield from srcfs.stat(srcpath)
@@ -1686,52 +2988,270 @@ class SFTPClient:
                     raise SFTPError(FX_FAILURE, '%s is a directory' %
                                     srcpath.decode('utf-8', errors='replace'))
 
-                if not (yield from dstfs.isdir(dstpath)):
+                if (yield from dstfs.isdir(dstpath)):
+                    created = False
+                else:
+                    if sync and (yield from dstfs.lexists(dstpath)):
+                        yield from self._remove_tree(dstfs, dstpath)
+
                     yield from dstfs.mkdir(dstpath)
+                    created = True
 
                 names = yield from srcfs.listdir(srcpath)
 
+                if sync and delete and not created:
+                    yield from self._sync_delete(srcfs, dstfs, srcpath,
+                                                 dstpath, names,
+                                                 error_handler)
+
                 for name in names:
                     if name in (b'.', b'..'):
                         continue
 
                     srcfile = srcfs.compose_path(name, parent=srcpath)
                     dstfile = dstfs.compose_path(name, parent=dstpath)
+                    entries.append((srcfile, dstfile))
 
-                    yield from self._copy(srcfs, dstfs, srcfile,
-                                          dstfile, preserve, recurse,
-                                          follow_symlinks, error_handler)
-            elif stat.S_ISLNK(srcattrs.permissions):
-                targetpath = yield from srcfs.readlink(srcpath)
-                yield from dstfs.symlink(targetpath, dstpath)
+                if preserve:
+                    subdirs.append((srcpath, dstpath, srcattrs))
             else:
-                with (yield from srcfs.open(srcpath, 'rb')) as src:
-                    with (yield from dstfs.open(dstpath, 'wb')) as dst:
-                        while True:
-                            data = yield from src.read(_SFTP_BLOCK_SIZE)
-                            if not data:
-                                break
-
-                            yield from dst.write(data)
-
-            if preserve:
-                yield from dstfs.setstat(
-                    dstpath, SFTPAttrs(permissions=srcattrs.permissions,
-                                       atime=srcattrs.atime,
-                                       mtime=srcattrs.mtime))
+                if sync:
+                    if (yield from self._sync_file(srcfs, dstfs, srcpath,
+                                                   dstpath, srcattrs,
+                                                   checksum)):
+                        return entries
+
+                if stat.S_ISLNK(srcattrs.permissions):
+                    targetpath = yield from srcfs.readlink(srcpath)
+                    yield from dstfs.symlink(targetpath, dstpath)
+                else:
+                    with (yield from srcfs.open(srcpath, 'rb')) as src:
+                        if resume:
+                            offset = yield from self._resume_offset(
+                                srcfs, srcpath, src, dstfs, dstpath,
+                                srcattrs.size, block_size)
+                        else:
+                            offset = 0
+
+                        mode = 'r+b' if offset else 'wb'
+
+                        with (yield from dstfs.open(dstpath, mode)) as dst:
+                            copier = _SFTPFileCopier(src, dst, offset,
+                                                     srcattrs.size,
+                                                     block_size, max_requests,
+                                                     self._session.get_loop())
+                            yield from copier.run()
+
+                # Setting attributes on a link would change its target
+                if preserve and not stat.S_ISLNK(srcattrs.permissions):
+                    yield from self._copy_attrs(dstfs, dstpath, srcattrs)
         except (OSError, SFTPError) as exc:
-            # pylint: disable=attribute-defined-outside-init
-            exc.srcpath = srcpath
-            exc.dstpath = dstpath
+            self._copy_error(exc, srcpath, dstpath, error_handler)
 
-            if error_handler:
-                error_handler(exc)
-            else:
-                raise
+        return entries
+
+    @asyncio.coroutine
+    def _resume_offset(self, srcfs, srcpath, src, dstfs, dstpath, size,
+                       window):
+        """Return the offset to resume copying a partial file at
+
+           If the destination is a regular file no larger than the
+           source and its data matches the start of the source, copying
+           can resume at the end of the destination. Otherwise, the file
+           needs to be copied from the start.
+
+           When the server can hash file data, the whole of the existing
+           destination is compared against the source that way. If not,
+           only the last window bytes of it are read and compared.
+
+        """
+
+        try:
+            dstattrs = yield from dstfs.stat(dstpath)
+        except (OSError, SFTPError):
+            return 0
+
+        offset = dstattrs.size
+
+        if not offset or size is None or offset > size or \
+                not stat.S_ISREG(dstattrs.permissions or 0):
+            return 0
+
+        match = yield from self._compare_hashes(srcfs, srcpath, dstfs,
+                                                dstpath, offset)
+
+        if match is not None:
+            return offset if match else 0
+
+        window = min(window, offset)
+
+        with (yield from dstfs.open(dstpath, 'rb')) as dst:
+            dstdata = yield from dst.read(window, offset - window,
+                                          block_size=window)
+
+        srcdata = yield from src.read(window, offset - window,
+                                      block_size=window)
+
+        return offset if srcdata == dstdata else 0
+
+    @asyncio.coroutine
+    def _compare_hashes(self, srcfs, srcpath, dstfs, dstpath, length=0):
+        """Return whether the data in two files matches
+
+           The first length bytes of each file, or all of their data if
+           length is zero, are compared by hashing them in place. For
+           remote files, this requires the server to support check-file
+           or md5-hash. If it doesn't, or hashing fails, ``None`` is
+           returned to indicate that the files couldn't be compared.
+
+        """
+
+        if not self._session.supports_check_file():
+            return None
+
+        # Hash the remote file first, since the server picks the
+        # algorithm which is then used to hash the other file
+        if srcfs is self:
+            first, second = (srcfs, srcpath), (dstfs, dstpath)
+        else:
+            first, second = (dstfs, dstpath), (srcfs, srcpath)
+
+        try:
+            alg, hashes = yield from first[0].check_file(first[1],
+                                                         length=length)
+            _, other_hashes = yield from second[0].check_file(
+                second[1], (alg,), length=length)
+        except (OSError, SFTPError):
+            return None
+
+        return hashes == other_hashes
+
+    @asyncio.coroutine
+    def _sync_file(self, srcfs, dstfs, srcpath, dstpath, srcattrs, checksum):
+        """Prepare to synchronize a file or link with its destination
+
+           This returns ``True`` if the destination is unchanged and
+           can be skipped. Otherwise, if the destination is a link or
+           is of a different type than the source, such as a directory
+           being replaced by a file, it is removed so that the source
+           can be copied in its place.
+
+        """
+
+        try:
+            dstattrs = yield from dstfs.lstat(dstpath)
+        except (OSError, SFTPError):
+            return False
+
+        if dstattrs.permissions is None:
+            return False
+
+        if stat.S_IFMT(srcattrs.permissions) == \
+                stat.S_IFMT(dstattrs.permissions):
+            if (yield from self._sync_unchanged(srcfs, dstfs, srcpath,
+                                                dstpath, srcattrs, dstattrs,
+                                                checksum)):
+                return True
+
+            if stat.S_ISREG(dstattrs.permissions):
+                return False
+
+        yield from self._remove_tree(dstfs, dstpath)
+        return False
+
+    @asyncio.coroutine
+    def _sync_unchanged(self, srcfs, dstfs, srcpath, dstpath, srcattrs,
+                        dstattrs, checksum):
+        """Return if a destination file or link matches its source
+
+           Links are considered unchanged if they have the same target.
+           Files are considered unchanged if they have the same size
+           and modification time. If checksum is set, files with the
+           same size are instead compared by hashing their data, when
+           the server is able to do so.
+
+        """
+
+        if stat.S_ISLNK(srcattrs.permissions):
+            return ((yield from srcfs.readlink(srcpath)) ==
+                    (yield from dstfs.readlink(dstpath)))
+
+        if srcattrs.size is None or srcattrs.size != dstattrs.size:
+            return False
+
+        if checksum:
+            match = yield from self._compare_hashes(srcfs, srcpath,
+                                                    dstfs, dstpath)
+
+            if match is not None:
+                return match
+
+        return (srcattrs.mtime is not None and dstattrs.mtime is not None and
+                int(srcattrs.mtime) == int(dstattrs.mtime))
+
+    @asyncio.coroutine
+    def _sync_delete(self, srcfs, dstfs, srcpath, dstpath, srcnames,
+                     error_handler):
+        """Remove destination directory entries not present in the source"""
+
+        srcnames = set(srcnames)
+
+        for name in (yield from dstfs.listdir(dstpath)):
+            if name in (b'.', b'..') or name in srcnames:
+                continue
+
+            srcfile = srcfs.compose_path(name, parent=srcpath)
+            dstfile = dstfs.compose_path(name, parent=dstpath)
+
+            try:
+                yield from self._remove_tree(dstfs, dstfile)
+            except (OSError, SFTPError) as exc:
+                self._copy_error(exc, srcfile, dstfile, error_handler)
+
+    @asyncio.coroutine
+    def _remove_tree(self, fs, path):
+        """Remove a file, link, or directory and everything under it"""
+
+        attrs = yield from fs.lstat(path)
+
+        if stat.S_ISDIR(attrs.permissions):
+            for name in (yield from fs.listdir(path)):
+                if name not in (b'.', b'..'):
+                    yield from self._remove_tree(
+                        fs, fs.compose_path(name, parent=path))
+
+            yield from fs.rmdir(path)
+        else:
+            yield from fs.remove(path)
+
+    @asyncio.coroutine
+    def _copy_attrs(self, dstfs, dstpath, srcattrs):
+        """Copy permissions and access and modification times"""
+
+        # pylint: disable=no-self-use
+
+        yield from dstfs.setstat(dstpath,
+                                 SFTPAttrs(permissions=srcattrs.permissions,
+                                           atime=srcattrs.atime,
+                                           mtime=srcattrs.mtime))
+
+    def _copy_error(self, exc, srcpath, dstpath, error_handler):
+        """Report an error which occurred while copying"""
+
+        # pylint: disable=attribute-defined-outside-init,no-self-use
+
+        exc.srcpath = srcpath
+        exc.dstpath = dstpath
+
+        if error_handler:
+            error_handler(exc)
+        else:
+            raise exc
 
     @asyncio.coroutine
     def _begin_copy(self, srcfs, dstfs, srcpaths, dstpath, preserve,
-                    recurse, follow_symlinks, error_handler):
+                    recurse, follow_symlinks, block_size, max_requests,
+                    max_parallel_files, resume, error_handler):
         """Begin a new file upload, download, or copy"""
 
         dst_isdir = dstpath is None or (yield from dstfs.isdir(dstpath))
@@ -1743,6 +3263,8 @@ class SFTPClient:
             raise SFTPError(FX_FAILURE, '%s must be a directory' %
                             dstpath.decode('utf-8', errors='replace'))
 
+        entries = []
+
         for srcfile in srcpaths:
             srcfile = self.encode(srcfile)
             filename = posixpath.basename(srcfile)
@@ -1754,12 +3276,75 @@ class SFTPClient:
             else:
                 dstfile = dstpath
 
-            yield from self._copy(srcfs, dstfs, srcfile, dstfile, preserve,
-                                  recurse, follow_symlinks, error_handler)
+            entries.append((srcfile, dstfile))
+
+        yield from self._run_copy(srcfs, dstfs, entries, preserve, recurse,
+                                  follow_symlinks, block_size, max_requests,
+                                  max_parallel_files, resume, False, False,
+                                  False, error_handler)
+
+    @asyncio.coroutine
+    def _run_copy(self, srcfs, dstfs, entries, preserve, recurse,
+                  follow_symlinks, block_size, max_requests,
+                  max_parallel_files, resume, sync, checksum, delete,
+                  error_handler):
+        """Copy a list of source and destination paths"""
+
+        block_size = self._session.get_block_size(block_size)
+
+        # Each file being copied holds a handle open on the server for
+        # each side of the copy which is remote, so leave room for those
+        # within any limit the server has on open handles
+        max_handles = self._session.get_max_open_handles()
+        remote_sides = (srcfs is self) + (dstfs is self)
+
+        if max_handles:
+            max_parallel_files = max(1, min(max_parallel_files,
+                                            max_handles // remote_sides))
+
+        # Entries are popped from the end of the list and the entries
+        # of each directory are pushed back in reverse, so files are
+        # started in the same depth-first order a recursive copy uses
+        entries.reverse()
+        subdirs = []
+        tasks = set()
+        loop = self._session.get_loop()
+
+        try:
+            while entries or tasks:
+                while entries and len(tasks) < max_parallel_files:
+                    srcfile, dstfile = entries.pop()
+
+                    tasks.add(asyncio.async(
+                        self._copy(srcfs, dstfs, srcfile, dstfile, preserve,
+                                   recurse, follow_symlinks, block_size,
+                                   max_requests, resume, sync, checksum,
+                                   delete, error_handler, subdirs),
+                        loop=loop))
+
+                done, tasks = yield from asyncio.wait(
+                    tasks, loop=loop, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    entries.extend(reversed(task.result()))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # Set directory attributes last, deepest first, since copying
+        # their contents would otherwise change their modification times
+        for srcpath, dstpath, srcattrs in reversed(subdirs):
+            try:
+                yield from self._copy_attrs(dstfs, dstpath, srcattrs)
+            except (OSError, SFTPError) as exc:
+                self._copy_error(exc, srcpath, dstpath, error_handler)
 
     @asyncio.coroutine
     def get(self, remotepaths, localpath=None, *, preserve=False,
-            recurse=False, follow_symlinks=False, error_handler=None):
+            recurse=False, follow_symlinks=False,
+            block_size=None,
+            max_requests=_MAX_SFTP_REQUESTS, max_parallel_files=1,
+            resume=False, error_handler=None):
         """Download remote files
 
            This method downloads one or more files or directories from
@@ -1792,6 +3377,29 @@ class SFTPClient:
            using this option during a recursive download, one needs to
            watch out for links that result in loops.
 
+           The block_size argument sets the number of bytes read or
+           written in each request, and max_requests sets how many
+           blocks of each file can be in flight at once. Raising these
+           can improve throughput on connections with a high latency.
+           By default, the block size is the largest the server reports
+           that it accepts, or 8 KB if it doesn't report one.
+
+           If max_parallel_files is greater than 1, up to that many
+           files are downloaded at once. This can speed up downloads of many
+           small files, but means the order in which files are downloaded
+           and errors are reported is no longer predictable. Fewer
+           files are transferred at once if needed to stay within the
+           number of open files the server reports that it allows.
+
+           If resume is ``True``, files which were partially downloaded
+           by an earlier download are completed rather than downloaded again
+           from the start. The data already in an existing destination
+           file is compared against the source first, and the file is
+           copied from the start if they don't match or if the
+           destination is larger than the source. This comparison hashes
+           the data in place when the server supports check-file or
+           md5-hash, and otherwise compares only the last block.
+
            If error_handler is specified and an error occurs during
            the download, this handler will be called with the exception
            instead of it being raised. This is intended to primarily be
@@ -1812,6 +3420,14 @@ class SFTPClient:
                Whether or not to recursively copy directories
            :param bool follow_symlinks: (optional)
                Whether or not to follow symbolic links
+           :param integer block_size: (optional)
+               The number of bytes to transfer in each request
+           :param integer max_requests: (optional)
+               The maximum number of requests to have outstanding
+           :param integer max_parallel_files: (optional)
+               The maximum number of files to transfer at once
+           :param bool resume: (optional)
+               Whether or not to resume partially transferred files
            :param callable error_handler: (optional)
                The function to call when an error occurs
            :type remotepaths: string or bytes, or a sequence of these
@@ -1821,13 +3437,17 @@ class SFTPClient:
 
         """
 
-        yield from self._begin_copy(self, _LocalFile, remotepaths, localpath,
-                                    preserve, recurse, follow_symlinks,
-                                    error_handler)
+        yield from self._begin_copy(self, self._local_fs, remotepaths,
+                                    localpath, preserve, recurse,
+                                    follow_symlinks, block_size, max_requests,
+                                    max_parallel_files, resume, error_handler)
 
     @asyncio.coroutine
     def put(self, localpaths, remotepath=None, *, preserve=False,
-            recurse=False, follow_symlinks=False, error_handler=None):
+            recurse=False, follow_symlinks=False,
+            block_size=None,
+            max_requests=_MAX_SFTP_REQUESTS, max_parallel_files=1,
+            resume=False, error_handler=None):
         """Upload local files
 
            This method uploads one or more files or directories to the
@@ -1860,6 +3480,29 @@ class SFTPClient:
            using this option during a recursive upload, one needs to
            watch out for links that result in loops.
 
+           The block_size argument sets the number of bytes read or
+           written in each request, and max_requests sets how many
+           blocks of each file can be in flight at once. Raising these
+           can improve throughput on connections with a high latency.
+           By default, the block size is the largest the server reports
+           that it accepts, or 8 KB if it doesn't report one.
+
+           If max_parallel_files is greater than 1, up to that many
+           files are uploaded at once. This can speed up uploads of many
+           small files, but means the order in which files are uploaded
+           and errors are reported is no longer predictable. Fewer
+           files are transferred at once if needed to stay within the
+           number of open files the server reports that it allows.
+
+           If resume is ``True``, files which were partially uploaded
+           by an earlier upload are completed rather than uploaded again
+           from the start. The data already in an existing destination
+           file is compared against the source first, and the file is
+           copied from the start if they don't match or if the
+           destination is larger than the source. This comparison hashes
+           the data in place when the server supports check-file or
+           md5-hash, and otherwise compares only the last block.
+
            If error_handler is specified and an error occurs during
            the upload, this handler will be called with the exception
            instead of it being raised. This is intended to primarily be
@@ -1880,6 +3523,14 @@ class SFTPClient:
                Whether or not to recursively copy directories
            :param bool follow_symlinks: (optional)
                Whether or not to follow symbolic links
+           :param integer block_size: (optional)
+               The number of bytes to transfer in each request
+           :param integer max_requests: (optional)
+               The maximum number of requests to have outstanding
+           :param integer max_parallel_files: (optional)
+               The maximum number of files to transfer at once
+           :param bool resume: (optional)
+               Whether or not to resume partially transferred files
            :param callable error_handler: (optional)
                The function to call when an error occurs
            :type localpaths: string or bytes, or a sequence of these
@@ -1890,13 +3541,17 @@ class SFTPClient:
 
         """
 
-        yield from self._begin_copy(_LocalFile, self, localpaths, remotepath,
-                                    preserve, recurse, follow_symlinks,
-                                    error_handler)
+        yield from self._begin_copy(self._local_fs, self, localpaths,
+                                    remotepath, preserve, recurse,
+                                    follow_symlinks, block_size, max_requests,
+                                    max_parallel_files, resume, error_handler)
 
     @asyncio.coroutine
     def copy(self, srcpaths, dstpath=None, *, preserve=False,
-             recurse=False, follow_symlinks=False, error_handler=None):
+             recurse=False, follow_symlinks=False,
+             block_size=None,
+             max_requests=_MAX_SFTP_REQUESTS, max_parallel_files=1,
+             resume=False, error_handler=None):
         """Copy remote files to a new location
 
            This method copies one or more files or directories on the
@@ -1929,6 +3584,34 @@ class SFTPClient:
            using this option during a recursive copy, one needs to
            watch out for links that result in loops.
 
+           The block_size argument sets the number of bytes read or
+           written in each request, and max_requests sets how many
+           blocks of each file can be in flight at once. Raising these
+           can improve throughput on connections with a high latency.
+           By default, the block size is the largest the server reports
+           that it accepts, or 8 KB if it doesn't report one.
+
+           If the server supports the copy-data extension, file data
+           is copied by the server itself without being sent to the
+           client and back, and block_size and max_requests only
+           apply if that isn't possible.
+
+           If max_parallel_files is greater than 1, up to that many
+           files are copied at once. This can speed up copys of many
+           small files, but means the order in which files are copied
+           and errors are reported is no longer predictable. Fewer
+           files are transferred at once if needed to stay within the
+           number of open files the server reports that it allows.
+
+           If resume is ``True``, files which were partially copied
+           by an earlier copy are completed rather than copied again
+           from the start. The data already in an existing destination
+           file is compared against the source first, and the file is
+           copied from the start if they don't match or if the
+           destination is larger than the source. This comparison hashes
+           the data in place when the server supports check-file or
+           md5-hash, and otherwise compares only the last block.
+
            If error_handler is specified and an error occurs during
            the copy, this handler will be called with the exception
            instead of it being raised. This is intended to primarily be
@@ -1949,6 +3632,14 @@ class SFTPClient:
                Whether or not to recursively copy directories
            :param bool follow_symlinks: (optional)
                Whether or not to follow symbolic links
+           :param integer block_size: (optional)
+               The number of bytes to transfer in each request
+           :param integer max_requests: (optional)
+               The maximum number of requests to have outstanding
+           :param integer max_parallel_files: (optional)
+               The maximum number of files to transfer at once
+           :param bool resume: (optional)
+               Whether or not to resume partially transferred files
            :param callable error_handler: (optional)
                The function to call when an error occurs
            :type srcpaths: string or bytes, or a sequence of these
@@ -1960,11 +3651,16 @@ class SFTPClient:
         """
 
         yield from self._begin_copy(self, self, srcpaths, dstpath, preserve,
-                                    recurse, follow_symlinks, error_handler)
+                                    recurse, follow_symlinks, block_size,
+                                    max_requests, max_parallel_files, resume,
+                                    error_handler)
 
     @asyncio.coroutine
     def mget(self, remotepaths, localpath=None, *, preserve=False,
-             recurse=False, follow_symlinks=False, error_handler=None):
+             recurse=False, follow_symlinks=False,
+             block_size=None,
+             max_requests=_MAX_SFTP_REQUESTS, max_parallel_files=1,
+             resume=False, error_handler=None):
         """Download remote files with glob pattern match
 
            This method downloads files and directories from the remote
@@ -1978,13 +3674,17 @@ class SFTPClient:
 
         matches = yield from self._begin_glob(self, remotepaths, error_handler)
 
-        yield from self._begin_copy(self, _LocalFile, matches, localpath,
+        yield from self._begin_copy(self, self._local_fs, matches, localpath,
                                     preserve, recurse, follow_symlinks,
-                                    error_handler)
+                                    block_size, max_requests,
+                                    max_parallel_files, resume, error_handler)
 
     @asyncio.coroutine
     def mput(self, localpaths, remotepath=None, *, preserve=False,
-             recurse=False, follow_symlinks=False, error_handler=None):
+             recurse=False, follow_symlinks=False,
+             block_size=None,
+             max_requests=_MAX_SFTP_REQUESTS, max_parallel_files=1,
+             resume=False, error_handler=None):
         """Upload local files with glob pattern match
 
            This method uploads files and directories to the remote
@@ -1996,16 +3696,20 @@ class SFTPClient:
 
         """
 
-        matches = yield from self._begin_glob(_LocalFile, localpaths,
+        matches = yield from self._begin_glob(self._local_fs, localpaths,
                                               error_handler)
 
-        yield from self._begin_copy(_LocalFile, self, matches, remotepath,
+        yield from self._begin_copy(self._local_fs, self, matches, remotepath,
                                     preserve, recurse, follow_symlinks,
-                                    error_handler)
+                                    block_size, max_requests,
+                                    max_parallel_files, resume, error_handler)
 
     @asyncio.coroutine
     def mcopy(self, srcpaths, dstpath=None, *, preserve=False,
-              recurse=False, follow_symlinks=False, error_handler=None):
+              recurse=False, follow_symlinks=False,
+              block_size=None,
+              max_requests=_MAX_SFTP_REQUESTS, max_parallel_files=1,
+              resume=False, error_handler=None):
         """Download remote files with glob pattern match
 
            This method copies files and directories on the remote
@@ -2020,7 +3724,105 @@ class SFTPClient:
         matches = yield from self._begin_glob(self, srcpaths, error_handler)
 
         yield from self._begin_copy(self, self, matches, dstpath, preserve,
-                                    recurse, follow_symlinks, error_handler)
+                                    recurse, follow_symlinks, block_size,
+                                    max_requests, max_parallel_files, resume,
+                                    error_handler)
+
+    @asyncio.coroutine
+    def sync(self, srcpath, dstpath, *, direction='get', delete=False,
+             checksum=False, follow_symlinks=False, block_size=None,
+             max_requests=_MAX_SFTP_REQUESTS, max_parallel_files=1,
+             error_handler=None):
+        """Synchronize a file or directory tree with a copy of it
+
+           This method updates the destination path to match the source
+           path, transferring only files which are new or have changed.
+           The direction argument selects where the source and
+           destination are:
+
+             ========= =============== ===============
+             Direction Source          Destination
+             ========= =============== ===============
+             get       Remote          Local
+             put       Local           Remote
+             copy      Remote          Remote
+             ========= =============== ===============
+
+           Unlike :meth:`get`, :meth:`put`, and :meth:`copy`, the
+           destination path always names the copy itself rather than a
+           directory to place it in, and directories are always copied
+           recursively.
+
+           Files whose destination already has the same size and
+           modification time as the source are skipped, as are symbolic
+           links which already point at the same target. The access and
+           modification times and permissions of the source are always
+           preserved, so that files copied now will be skipped next
+           time. Destination entries of a different type than their
+           source, such as a file where the source has a directory,
+           are removed and replaced.
+
+           If checksum is ``True``, files of the same size are instead
+           compared by having the server hash their data using the
+           check-file or md5-hash extensions, and are copied only if
+           their data differs. This reads all of the data on both
+           sides, so it is much slower than comparing modification
+           times. If the server supports neither extension, files are
+           compared by modification time as usual.
+
+           If delete is ``True``, files and directories at the
+           destination which are not present in the source are removed.
+
+           The follow_symlinks, block_size, max_requests,
+           max_parallel_files, and error_handler arguments behave the
+           same as in :meth:`get`.
+
+           :param srcpath:
+               The path of the file or directory to synchronize from
+           :param dstpath:
+               The path of the file or directory to synchronize to
+           :param string direction: (optional)
+               The direction to synchronize in, as described above
+           :param bool delete: (optional)
+               Whether or not to remove destination files not in the
+               source
+           :param bool checksum: (optional)
+               Whether or not to compare the data of files of the same
+               size rather than their modification times
+           :param bool follow_symlinks: (optional)
+               Whether or not to follow symbolic links
+           :param integer block_size: (optional)
+               The number of bytes to transfer in each request
+           :param integer max_requests: (optional)
+               The maximum number of requests to have outstanding
+           :param integer max_parallel_files: (optional)
+               The maximum number of files to transfer at once
+           :param callable error_handler: (optional)
+               The function to call when an error occurs
+           :type srcpath: string or bytes
+           :type dstpath: string or bytes
+
+           :raises: | :exc:`ValueError` if the direction is not valid
+                    | :exc:`OSError` if a local file I/O error occurs
+                    | :exc:`SFTPError` if the server returns an error
+
+        """
+
+        if direction == 'get':
+            srcfs, dstfs = self, self._local_fs
+        elif direction == 'put':
+            srcfs, dstfs = self._local_fs, self
+        elif direction == 'copy':
+            srcfs, dstfs = self, self
+        else:
+            raise ValueError('Invalid direction: %r' % direction)
+
+        entries = [(srcfs.encode(srcpath), dstfs.encode(dstpath))]
+
+        yield from self._run_copy(srcfs, dstfs, entries, True, True,
+                                  follow_symlinks, block_size, max_requests,
+                                  max_parallel_files, False, True, checksum,
+                                  delete, error_handler)
 
     @asyncio.coroutine
     def glob(self, patterns, error_handler=None):
@@ -2129,10 +3931,18 @@ class SFTPClient:
             raise ValueError('Invalid mode: %r' % mode)
 
         path = self.compose_path(path)
+
+        if pflags & FXF_WRITE:
+            self._invalidate(path)
+
         handle = yield from self._session.open(path, pflags, attrs)
 
-        return SFTPFile(self._session, handle, pflags & FXF_APPEND,
-                        encoding, errors)
+        if pflags & FXF_WRITE:
+            return SFTPFile(self._session, handle, pflags & FXF_APPEND,
+                            encoding, errors, self._attr_cache, path)
+        else:
+            return SFTPFile(self._session, handle, pflags & FXF_APPEND,
+                            encoding, errors)
 
     @asyncio.coroutine
     def stat(self, path):
@@ -2153,8 +3963,7 @@ class SFTPClient:
 
         """
 
-        path = self.compose_path(path)
-        return (yield from self._session.stat(path))
+        return (yield from self._stat(path, True))
 
     @asyncio.coroutine
     def lstat(self, path):
@@ -2176,8 +3985,7 @@ class SFTPClient:
 
         """
 
-        path = self.compose_path(path)
-        return (yield from self._session.lstat(path))
+        return (yield from self._stat(path, False))
 
     @asyncio.coroutine
     def setstat(self, path, attrs):
@@ -2201,7 +4009,11 @@ class SFTPClient:
         """
 
         path = self.compose_path(path)
-        yield from self._session.setstat(path, attrs)
+
+        try:
+            yield from self._session.setstat(path, attrs)
+        finally:
+            self._invalidate(path)
 
     @asyncio.coroutine
     def statvfs(self, path):
@@ -2225,6 +4037,47 @@ class SFTPClient:
         path = self.compose_path(path)
         return (yield from self._session.statvfs(path))
 
+    @asyncio.coroutine
+    def check_file(self, path, hash_algs=_DEFAULT_HASH_ALGS, offset=0,
+                   length=0, block_size=0):
+        """Return hashes of the data in a remote file
+
+           This method asks the server to hash a range of a remote
+           file's data, allowing it to be compared against a local
+           copy without downloading it. The arguments and return value
+           are the same as for :meth:`SFTPFile.check_file`.
+
+           :param path:
+               The path of the remote file to hash
+           :param hash_algs: (optional)
+               The names of the hash algorithms to accept, in order
+               of preference
+           :param integer offset: (optional)
+               The offset from the beginning of the file to start hashing
+           :param integer length: (optional)
+               The number of bytes to hash, or 0 to hash to the end of
+               the file
+           :param integer block_size: (optional)
+               The number of bytes covered by each hash, or 0 to return
+               a single hash of the whole range
+           :type path: string or bytes
+           :type hash_algs: list of strings
+
+           :returns: A tuple of the name of the hash algorithm used and
+                     a list of the digests of each block, as bytes
+
+           :raises: :exc:`SFTPError` if the server doesn't support these
+                    extensions or returns an error
+
+        """
+
+        path = self.compose_path(path)
+        algs = [alg.encode('ascii') for alg in hash_algs]
+        alg, hashes = yield from self._session.check_file_name(
+            path, algs, offset, length, block_size)
+
+        return _split_hashes(alg, hashes)
+
     @asyncio.coroutine
     def truncate(self, path, size):
         """Truncate a remote file to the specified size
@@ -2444,10 +4297,14 @@ class SFTPClient:
         """
 
         path = self.compose_path(path)
-        yield from self._session.remove(path)
 
-    @asyncio.coroutine
-    def unlink(self, path):
+        try:
+            yield from self._session.remove(path)
+        finally:
+            self._invalidate(path)
+
+    @asyncio.coroutine
+    def unlink(self, path):
         """Remove a remote file (see :meth:`remove`)"""
 
         yield from self.remove(path)
@@ -2477,7 +4334,12 @@ class SFTPClient:
 
         oldpath = self.compose_path(oldpath)
         newpath = self.compose_path(newpath)
-        yield from self._session.rename(oldpath, newpath)
+
+        try:
+            yield from self._session.rename(oldpath, newpath)
+        finally:
+            self._invalidate(oldpath, subtree=True)
+            self._invalidate(newpath, subtree=True)
 
     def posix_rename(self, oldpath, newpath):
         """Rename a remote file, directory, or link with POSIX semantics
@@ -2502,7 +4364,12 @@ class SFTPClient:
 
         oldpath = self.compose_path(oldpath)
         newpath = self.compose_path(newpath)
-        yield from self._session.posix_rename(oldpath, newpath)
+
+        try:
+            yield from self._session.posix_rename(oldpath, newpath)
+        finally:
+            self._invalidate(oldpath, subtree=True)
+            self._invalidate(newpath, subtree=True)
 
     @asyncio.coroutine
     def readdir(self, path='.'):
@@ -2525,26 +4392,57 @@ class SFTPClient:
         """
 
         names = []
-
-        dirpath = self.compose_path(path)
-        handle = yield from self._session.opendir(dirpath)
+        scanner = self.scandir(path)
 
         try:
             while True:
-                names.extend((yield from self._session.readdir(handle)))
-        except SFTPError as exc:
-            if exc.code != FX_EOF:
-                raise
-        finally:
-            yield from self._session.close(handle)
+                batch = yield from scanner.read_batch()
+                if not batch:
+                    break
 
-        if isinstance(path, str):
-            for name in names:
-                name.filename = self.decode(name.filename)
-                name.longname = self.decode(name.longname)
+                names.extend(batch)
+        finally:
+            yield from scanner.close()
 
         return names
 
+    def scandir(self, path='.'):
+        """Return an async iterator over the contents of a remote directory
+
+           This method returns an asynchronous iterator which returns
+           an :class:`SFTPName` for each entry in a directory, for use
+           with ``async for``. If no path is provided, it defaults to
+           the current remote working directory.
+
+           Unlike :meth:`readdir`, names are returned as each response
+           from the server arrives rather than after the entire
+           directory has been read, and the request for the next set
+           of names is sent while the current set is being consumed.
+           This makes the first names available sooner and keeps
+           memory use bounded when reading very large directories.
+
+           The remote directory is opened when iteration begins and
+           closed when the end of the directory is reached. If
+           iteration is stopped early, the iterator's ``close()``
+           coroutine should be called to close the directory.
+
+           :param path: (optional)
+               The path of the remote directory to read
+           :type path: string or bytes
+
+           :returns: An async iterator of :class:`SFTPName` entries, with
+                     path names matching the type used to pass in the path
+
+           :raises: :exc:`SFTPError` if the server returns an error
+
+        """
+
+        dirpath = self.compose_path(path)
+        decode = self.decode if isinstance(path, str) else None
+
+        return _SFTPDirIterator(self._session, dirpath, decode,
+                                self._attr_cache)
+
     @asyncio.coroutine
     def listdir(self, path='.'):
         """Read the names of the files in a remote directory
@@ -2586,7 +4484,11 @@ class SFTPClient:
         """
 
         path = self.compose_path(path)
-        yield from self._session.mkdir(path, attrs)
+
+        try:
+            yield from self._session.mkdir(path, attrs)
+        finally:
+            self._invalidate(path)
 
     @asyncio.coroutine
     def rmdir(self, path):
@@ -2604,7 +4506,11 @@ class SFTPClient:
         """
 
         path = self.compose_path(path)
-        yield from self._session.rmdir(path)
+
+        try:
+            yield from self._session.rmdir(path)
+        finally:
+            self._invalidate(path, subtree=True)
 
     @asyncio.coroutine
     def realpath(self, path):
@@ -2708,7 +4614,11 @@ class SFTPClient:
 
         oldpath = self.compose_path(oldpath)
         newpath = self.encode(newpath)
-        yield from self._session.symlink(oldpath, newpath)
+
+        try:
+            yield from self._session.symlink(oldpath, newpath)
+        finally:
+            self._invalidate(self.compose_path(newpath))
 
     @asyncio.coroutine
     def link(self, oldpath, newpath):
@@ -2733,7 +4643,11 @@ class SFTPClient:
 
         oldpath = self.compose_path(oldpath)
         newpath = self.compose_path(newpath)
-        yield from self._session.link(oldpath, newpath)
+
+        try:
+            yield from self._session.link(oldpath, newpath)
+        finally:
+            self._invalidate(newpath)
 
     def exit(self):
         """Exit the SFTP client session
@@ -2746,6 +4660,109 @@ class SFTPClient:
         self._session.exit()
 
 
+class _SFTPRequestClaim:
+    """Ranges of files claimed by an SFTP request
+
+       This is returned by :meth:`_SFTPRequestOrder.acquire` once the
+       ranges are available, and releases them when used as a context
+       manager and exited.
+
+    """
+
+    def __init__(self, order, ranges, waiter):
+        self._order = order
+        self._ranges = ranges
+        self._waiter = waiter
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def release(self):
+        """Release the claimed ranges, allowing later requests to run"""
+
+        if not self._waiter.done():
+            self._order.release(self._ranges, self._waiter)
+
+
+class _SFTPRequestOrder:
+    """Order conflicting SFTP requests handled in parallel
+
+       Requests register the ranges they access as they arrive, keyed
+       by file handle or path, and then wait for any earlier request on
+       the same key whose range overlaps theirs if either of them
+       modifies it. Requests which don't conflict are allowed to run in
+       parallel and to complete in any order.
+
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._claims = {}
+
+    @staticmethod
+    def _conflicts(start, end, modify, claim):
+        """Return whether a range conflicts with an existing claim"""
+
+        other_start, other_end, other_modify, _ = claim
+
+        return ((modify or other_modify) and
+                (end is None or other_start < end) and
+                (other_end is None or start < other_end))
+
+    @asyncio.coroutine
+    def acquire(self, *ranges):
+        """Claim ranges of files, waiting for earlier conflicting requests
+
+           Each range is a tuple of a key, a start and end offset, and
+           whether or not the range is modified. An end of ``None``
+           extends the range to the end of the file. The ranges are
+           registered before anything is waited on, so this must be
+           called before a request handler first yields.
+
+        """
+
+        waiter = asyncio.Future(loop=self._loop)
+        earlier = set()
+
+        for key, start, end, modify in ranges:
+            claims = self._claims.setdefault(key, [])
+
+            for claim in claims:
+                if claim[3] is not waiter and \
+                        self._conflicts(start, end, modify, claim):
+                    earlier.add(claim[3])
+
+            claims.append((start, end, modify, waiter))
+
+        result = _SFTPRequestClaim(self, ranges, waiter)
+
+        if earlier:
+            try:
+                yield from asyncio.wait(earlier, loop=self._loop)
+            except:
+                result.release()
+                raise
+
+        return result
+
+    def release(self, ranges, waiter):
+        """Release ranges of files claimed by a request"""
+
+        for key in set(key for key, _, _, _ in ranges):
+            claims = [claim for claim in self._claims[key]
+                      if claim[3] is not waiter]
+
+            if claims:
+                self._claims[key] = claims
+            else:
+                del self._claims[key]
+
+        waiter.set_result(None)
+
+
 class SFTPServerSession(SFTPSession, SSHServerSession):
     """An SFTP server session handler"""
 
@@ -2753,7 +4770,12 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
                    (b'statvfs@openssh.com', b'2'),
                    (b'fstatvfs@openssh.com', b'2'),
                    (b'hardlink@openssh.com', b'1'),
-                   (b'fsync@openssh.com', b'1')]
+                   (b'fsync@openssh.com', b'1'),
+                   (b'copy-data', b'1'),
+                   (b'check-file', b','.join(_CHECK_FILE_ALGS)),
+                   (b'md5-hash', b'1'),
+                   (b'md5-hash-handle', b'1'),
+                   (b'limits@openssh.com', b'1')]
 
     _open_modes = {
         FXF_READ:                                      'rb',
@@ -2767,15 +4789,22 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         FXF_READ | FXF_WRITE | FXF_CREAT | FXF_EXCL:   'xb+'
     }
 
-    def __init__(self, server):
+    def __init__(self, server, max_requests=None):
         super().__init__()
 
         self._server = server
+        self._max_requests = max_requests or _MAX_SFTP_REQUESTS
+        self._loop = None
         self._version = None
         self._nonstandard_symlink = False
         self._next_handle = 0
         self._file_handles = {}
         self._dir_handles = {}
+        self._append_handles = set()
+        self._order = None
+        self._pending_requests = deque()
+        self._request_tasks = set()
+        self._reading_paused = False
 
     def _get_next_handle(self):
         """Get the next available unique file handle number"""
@@ -2791,16 +4820,82 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
     def _process_connection_open(self):
         """Process a newly opened SFTP client connection"""
 
-        pass
+        self._loop = self._chan.get_loop()
+        self._order = _SFTPRequestOrder(self._loop)
+
+    @staticmethod
+    def _file_range(handle, offset=0, length=0, modify=False):
+        """Return a range of an open file to claim for a request
+
+           A length of zero claims everything from offset to the end
+           of the file.
+
+        """
+
+        return (handle, offset, offset + length if length else None, modify)
+
+    @staticmethod
+    def _path_ranges(path, modify=False):
+        """Return the ranges to claim for a request by path
+
+           A request by path claims the normalized path itself, and
+           claims each of the directories above it without modifying
+           them. Requests which change a path are run in order with
+           respect to other requests on that path or anything below
+           it, while requests on unrelated paths and requests which
+           only look at the file system can run in parallel.
+
+           Paths are compared as sent by the client, so requests which
+           reach the same file through different paths, such as via a
+           symlink, aren't ordered with respect to one another.
+
+        """
+
+        path = posixpath.normpath(path)
+        ranges = [((b'path', path), 0, None, modify)]
+
+        while True:
+            parent = posixpath.dirname(path) or b'.'
+            if parent == path:
+                break
+
+            path = parent
+            ranges.append(((b'path', path), 0, None, False))
+
+        return ranges
+
+    def _run_cleanup(self, result):
+        """Finish an SFTPServer cleanup call in the background"""
+
+        if asyncio.iscoroutine(result) or isinstance(result, asyncio.Future):
+            asyncio.async(result, loop=self._loop)
+
+    @staticmethod
+    def _close_dir(dir_handle):
+        """Close the directory listing associated with a handle"""
+
+        _, entries = dir_handle
+
+        if hasattr(entries, 'close'):
+            entries.close()
 
     def _process_connection_close(self, exc):
         """Process an incoming connection close"""
 
+        for task in self._request_tasks:
+            task.cancel()
+
+        self._request_tasks.clear()
+        self._pending_requests.clear()
+
         if self._server:
-            for file_obj in self._file_handles:
-                self._server.close(file_obj)
+            for file_obj in self._file_handles.values():
+                self._run_cleanup(self._server.close(file_obj))
+
+            for dir_handle in self._dir_handles.values():
+                self._close_dir(dir_handle)
 
-            self._server.exit()
+            self._run_cleanup(self._server.exit())
             self._server = None
             self._file_handles = []
             self._dir_handles = []
@@ -2832,7 +4927,55 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         self.exit()
 
     def _process_packet(self, pkttype, pktid, packet):
-        """Process other incoming SFTP packets"""
+        """Process other incoming SFTP packets
+
+           Requests are started in the order they arrive, with up to
+           max_requests of them running at once, and the response to
+           each is sent as soon as it completes. Requests which conflict
+           with an earlier request on the same file handle or path wait
+           for it to finish before running. If too many requests are queued,
+           reading from the channel is paused until the queue drains.
+
+        """
+
+        self._pending_requests.append((pkttype, pktid, packet))
+        self._start_requests()
+
+    def _start_requests(self):
+        """Start queued SFTP requests, up to the limit on parallel requests"""
+
+        while (self._pending_requests and
+               len(self._request_tasks) < self._max_requests):
+            task = asyncio.async(
+                self._process_request(*self._pending_requests.popleft()),
+                loop=self._loop)
+
+            self._request_tasks.add(task)
+            task.add_done_callback(self._request_done)
+
+        pending = len(self._pending_requests)
+
+        if self._reading_paused:
+            if pending <= self._max_requests:
+                self._reading_paused = False
+                self._chan.resume_reading()
+        elif pending >= 2 * self._max_requests:
+            self._reading_paused = True
+            self._chan.pause_reading()
+
+    def _request_done(self, task):
+        """Start more queued SFTP requests when a request completes"""
+
+        self._request_tasks.discard(task)
+
+        if self._server:
+            self._start_requests()
+
+    @asyncio.coroutine
+    def _process_request(self, pkttype, pktid, packet):
+        """Process a single SFTP request and send its response"""
+
+        handler = None
 
         try:
             if pkttype == FXP_EXTENDED:
@@ -2844,11 +4987,11 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
                                 'Unsupported request type: %s' % pkttype)
 
             return_type = self._return_types.get(pkttype, FXP_STATUS)
-            result = handler(self, packet)
+            result = yield from handler(self, packet)
 
             if return_type == FXP_STATUS:
                 result = UInt32(FX_OK) + String('') + String('')
-            elif return_type in (FXP_HANDLE, FXP_DATA):
+            elif return_type == FXP_HANDLE:
                 result = String(result)
             elif return_type == FXP_NAME:
                 result = (UInt32(len(result)) +
@@ -2859,7 +5002,8 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
                 elif isinstance(result, os.statvfs_result):
                     result = SFTPVFSAttrs.from_local(result)
 
-                result = result.encode()
+                if not isinstance(result, bytes):
+                    result = result.encode()
         except NotImplementedError as exc:
             name = handler.__name__[9:]
             return_type = FXP_STATUS
@@ -2873,9 +5017,39 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         except SFTPError as exc:
             return_type = FXP_STATUS
             result = UInt32(exc.code) + String(exc.reason) + String(exc.lang)
+        except DisconnectError as exc:
+            return_type = FXP_STATUS
+            result = (UInt32(FX_BAD_MESSAGE) + String(exc.reason) +
+                      String(exc.lang))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            # pylint: disable=broad-except
+            return_type = FXP_STATUS
+            reason = str(exc) or exc.__class__.__name__
+            result = (UInt32(FX_FAILURE) + String(reason) +
+                      String(DEFAULT_LANG))
 
-        self.send_packet(Byte(return_type), UInt32(pktid), result)
+        if self._chan:
+            if return_type == FXP_DATA:
+                self._send_data(pktid, result)
+            else:
+                self.send_packet(Byte(return_type), UInt32(pktid), result)
+
+    def _send_data(self, pktid, data):
+        """Send an SFTP data response
+
+           The data read is passed to the channel as a separate buffer
+           rather than being joined with the packet header, so that it
+           is sent without being copied.
+
+        """
+
+        header = Byte(FXP_DATA) + UInt32(pktid) + UInt32(len(data))
+        self._chan.write_buffers((UInt32(len(header) + len(data)) + header,
+                                  data))
 
+    @asyncio.coroutine
     def _process_open(self, packet):
         """Process an incoming SFTP open request"""
 
@@ -2888,27 +5062,42 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         if mode is None:
             raise SFTPError(FX_FAILURE, 'Unsupported open flags')
 
-        f = self._server.open(path, mode, attrs)
+        with (yield from self._order.acquire(
+                *self._path_ranges(path, bool(pflags & FXF_CREAT)))):
+            f = yield from _wait_result(self._server.open(path, mode, attrs))
+
         handle = self._get_next_handle()
         self._file_handles[handle] = f
+
+        if pflags & FXF_APPEND:
+            self._append_handles.add(handle)
+
         return handle
 
+    @asyncio.coroutine
     def _process_close(self, packet):
         """Process an incoming SFTP close request"""
 
         handle = packet.get_string()
         packet.check_end()
 
-        file_obj = self._file_handles.pop(handle, None)
-        if file_obj:
-            self._server.close(file_obj)
-            return
+        with (yield from self._order.acquire(
+                self._file_range(handle, modify=True))):
+            self._append_handles.discard(handle)
 
-        if self._dir_handles.pop(handle, None) is not None:
-            return
+            file_obj = self._file_handles.pop(handle, None)
+            if file_obj:
+                yield from _wait_result(self._server.close(file_obj))
+                return
 
-        raise SFTPError(FX_FAILURE, 'Invalid file handle')
+            dir_handle = self._dir_handles.pop(handle, None)
+            if dir_handle is not None:
+                self._close_dir(dir_handle)
+                return
 
+            raise SFTPError(FX_FAILURE, 'Invalid file handle')
+
+    @asyncio.coroutine
     def _process_read(self, packet):
         """Process an incoming SFTP read request"""
 
@@ -2917,16 +5106,23 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         length = packet.get_uint32()
         packet.check_end()
 
-        file_obj = self._file_handles.get(handle)
-        if file_obj:
-            data = self._server.read(file_obj, offset, length)
-            if data:
-                return data
+        # Return a short read if more data is requested than our limit
+        length = min(length, _SFTP_MAX_READ_LEN)
+
+        with (yield from self._order.acquire(
+                self._file_range(handle, offset, length))):
+            file_obj = self._file_handles.get(handle)
+            if file_obj:
+                data = yield from _wait_result(
+                    self._server.read(file_obj, offset, length))
+                if data:
+                    return data
+                else:
+                    raise SFTPError(FX_EOF, '')
             else:
-                raise SFTPError(FX_EOF, '')
-        else:
-            raise SFTPError(FX_FAILURE, 'Invalid file handle')
+                raise SFTPError(FX_FAILURE, 'Invalid file handle')
 
+    @asyncio.coroutine
     def _process_write(self, packet):
         """Process an incoming SFTP write request"""
 
@@ -2935,32 +5131,46 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         data = packet.get_string()
         packet.check_end()
 
-        file_obj = self._file_handles.get(handle)
-        if file_obj:
-            return self._server.write(file_obj, offset, data)
+        # Writes in append mode ignore the offset, so they are ordered
+        # with respect to everything else on the file
+        if handle in self._append_handles:
+            file_range = self._file_range(handle, modify=True)
         else:
-            raise SFTPError(FX_FAILURE, 'Invalid file handle')
+            file_range = self._file_range(handle, offset, len(data), True)
+
+        with (yield from self._order.acquire(file_range)):
+            file_obj = self._file_handles.get(handle)
+            if file_obj:
+                return (yield from _wait_result(
+                    self._server.write(file_obj, offset, data)))
+            else:
+                raise SFTPError(FX_FAILURE, 'Invalid file handle')
 
+    @asyncio.coroutine
     def _process_lstat(self, packet):
         """Process an incoming SFTP lstat request"""
 
         path = packet.get_string()
         packet.check_end()
 
-        return self._server.lstat(path)
+        with (yield from self._order.acquire(*self._path_ranges(path))):
+            return (yield from _wait_result(self._server.lstat(path)))
 
+    @asyncio.coroutine
     def _process_fstat(self, packet):
         """Process an incoming SFTP fstat request"""
 
         handle = packet.get_string()
         packet.check_end()
 
-        file_obj = self._file_handles.get(handle)
-        if file_obj:
-            return self._server.fstat(file_obj)
-        else:
-            raise SFTPError(FX_FAILURE, 'Invalid file handle')
+        with (yield from self._order.acquire(self._file_range(handle))):
+            file_obj = self._file_handles.get(handle)
+            if file_obj:
+                return (yield from _wait_result(self._server.fstat(file_obj)))
+            else:
+                raise SFTPError(FX_FAILURE, 'Invalid file handle')
 
+    @asyncio.coroutine
     def _process_setstat(self, packet):
         """Process an incoming SFTP setstat request"""
 
@@ -2968,8 +5178,11 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         attrs = SFTPAttrs.decode(packet)
         packet.check_end()
 
-        return self._server.setstat(path, attrs)
+        with (yield from self._order.acquire(*self._path_ranges(path, True))):
+            return (yield from _wait_result(
+                self._server.setstat(path, attrs)))
 
+    @asyncio.coroutine
     def _process_fsetstat(self, packet):
         """Process an incoming SFTP fsetstat request"""
 
@@ -2977,63 +5190,111 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         attrs = SFTPAttrs.decode(packet)
         packet.check_end()
 
-        file_obj = self._file_handles.get(handle)
-        if file_obj:
-            return self._server.fsetstat(file_obj, attrs)
-        else:
-            raise SFTPError(FX_FAILURE, 'Invalid file handle')
+        with (yield from self._order.acquire(
+                self._file_range(handle, modify=True))):
+            file_obj = self._file_handles.get(handle)
+            if file_obj:
+                return (yield from _wait_result(
+                    self._server.fsetstat(file_obj, attrs)))
+            else:
+                raise SFTPError(FX_FAILURE, 'Invalid file handle')
 
+    @asyncio.coroutine
     def _process_opendir(self, packet):
         """Process an incoming SFTP opendir request"""
 
         path = packet.get_string()
         packet.check_end()
 
-        names = self._server.listdir(path)
-
-        for i, name in enumerate(names):
-            # pylint: disable=no-member
-
-            if isinstance(name, bytes):
-                name = SFTPName(name)
-                names[i] = name
-
-                # pylint: disable=attribute-defined-outside-init
-
-                filename = os.path.join(path, name.filename)
-                name.attrs = self._server.lstat(filename)
-
-                if isinstance(name.attrs, os.stat_result):
-                    name.attrs = SFTPAttrs.from_local(name.attrs)
-
-            if not name.longname:
-                self._server.format_longname(name)
+        with (yield from self._order.acquire(*self._path_ranges(path))):
+            names = yield from _wait_result(self._server.scandir(path))
 
         handle = self._get_next_handle()
-        self._dir_handles[handle] = names
+        self._dir_handles[handle] = (path, iter(names))
         return handle
 
+    @asyncio.coroutine
     def _process_readdir(self, packet):
         """Process an incoming SFTP readdir request"""
 
         handle = packet.get_string()
         packet.check_end()
 
-        names = self._dir_handles.get(handle)
-        if names:
-            self._dir_handles[handle] = []
+        with (yield from self._order.acquire(
+                self._file_range(handle, modify=True))):
+            dir_handle = self._dir_handles.get(handle)
+            if not dir_handle:
+                raise SFTPError(FX_FAILURE, 'Invalid file handle')
+
+            path, entries = dir_handle
+            names = []
+
+            # Attributes and long names are only looked up for the names
+            # being returned, so large directories are listed a batch at
+            # a time rather than all at once when they are opened
+            while not names:
+                if hasattr(entries, 'read_batch'):
+                    batch = yield from _wait_result(
+                        entries.read_batch(_MAX_READDIR_NAMES))
+                else:
+                    batch = list(islice(entries, _MAX_READDIR_NAMES))
+
+                if not batch:
+                    raise SFTPError(FX_EOF, '')
+
+                for name in batch:
+                    # pylint: disable=no-member
+
+                    if isinstance(name, bytes):
+                        name = yield from self._lstat_name(path, name)
+
+                        if name is None:
+                            continue
+
+                    if not name.longname:
+                        yield from _wait_result(
+                            self._server.format_longname(name))
+
+                    names.append(name)
+
             return names
-        else:
-            raise SFTPError(FX_EOF, '')
 
+    @asyncio.coroutine
+    def _lstat_name(self, path, filename):
+        """Look up the attributes of a name returned by listdir
+
+           This returns ``None`` if the file was removed after the
+           directory was listed, so that it can be skipped.
+
+        """
+
+        try:
+            attrs = yield from _wait_result(
+                self._server.lstat(os.path.join(path, filename)))
+        except FileNotFoundError:
+            return None
+        except SFTPError as exc:
+            if exc.code == FX_NO_SUCH_FILE:
+                return None
+            else:
+                raise
+
+        if isinstance(attrs, os.stat_result):
+            attrs = SFTPAttrs.from_local(attrs)
+
+        return SFTPName(filename, attrs=attrs)
+
+    @asyncio.coroutine
     def _process_remove(self, packet):
         """Process an incoming SFTP remove request"""
 
         path = packet.get_string()
         packet.check_end()
 
-        return self._server.remove(path)
+        with (yield from self._order.acquire(*self._path_ranges(path, True))):
+            return (yield from _wait_result(self._server.remove(path)))
 
+    @asyncio.coroutine
     def _process_mkdir(self, packet):
         """Process an incoming SFTP mkdir request"""
 
@@ -3041,32 +5302,42 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         attrs = SFTPAttrs.decode(packet)
         packet.check_end()
 
-        return self._server.mkdir(path, attrs)
+        with (yield from self._order.acquire(*self._path_ranges(path, True))):
+            return (yield from _wait_result(self._server.mkdir(path, attrs)))
 
+    @asyncio.coroutine
     def _process_rmdir(self, packet):
         """Process an incoming SFTP rmdir request"""
 
         path = packet.get_string()
         packet.check_end()
 
-        return self._server.rmdir(path)
+        with (yield from self._order.acquire(*self._path_ranges(path, True))):
+            return (yield from _wait_result(self._server.rmdir(path)))
 
+    @asyncio.coroutine
     def _process_realpath(self, packet):
         """Process an incoming SFTP realpath request"""
 
         path = packet.get_string()
         packet.check_end()
 
-        return [SFTPName(self._server.realpath(path))]
+        with (yield from self._order.acquire(*self._path_ranges(path))):
+            path = yield from _wait_result(self._server.realpath(path))
 
+        return [SFTPName(path)]
+
+    @asyncio.coroutine
     def _process_stat(self, packet):
         """Process an incoming SFTP stat request"""
 
         path = packet.get_string()
         packet.check_end()
 
-        return self._server.stat(path)
+        with (yield from self._order.acquire(*self._path_ranges(path))):
+            return (yield from _wait_result(self._server.stat(path)))
 
+    @asyncio.coroutine
     def _process_rename(self, packet):
         """Process an incoming SFTP rename request"""
 
@@ -3074,79 +5345,355 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         newpath = packet.get_string()
         packet.check_end()
 
-        return self._server.rename(oldpath, newpath)
+        ranges = (self._path_ranges(oldpath, True) +
+                  self._path_ranges(newpath, True))
+
+        with (yield from self._order.acquire(*ranges)):
+            return (yield from _wait_result(
+                self._server.rename(oldpath, newpath)))
+
+    @asyncio.coroutine
+    def _process_readlink(self, packet):
+        """Process an incoming SFTP readlink request"""
+
+        path = packet.get_string()
+        packet.check_end()
+
+        with (yield from self._order.acquire(*self._path_ranges(path))):
+            path = yield from _wait_result(self._server.readlink(path))
+
+        return [SFTPName(path)]
+
+    @asyncio.coroutine
+    def _process_symlink(self, packet):
+        """Process an incoming SFTP symlink request"""
+
+        if self._nonstandard_symlink:
+            oldpath = packet.get_string()
+            newpath = packet.get_string()
+        else:
+            newpath = packet.get_string()
+            oldpath = packet.get_string()
+
+        packet.check_end()
+
+        with (yield from self._order.acquire(
+                *self._path_ranges(newpath, True))):
+            return (yield from _wait_result(
+                self._server.symlink(oldpath, newpath)))
+
+    @asyncio.coroutine
+    def _process_posix_rename(self, packet):
+        """Process an incoming SFTP POSIX rename request"""
+
+        oldpath = packet.get_string()
+        newpath = packet.get_string()
+        packet.check_end()
+
+        ranges = (self._path_ranges(oldpath, True) +
+                  self._path_ranges(newpath, True))
+
+        with (yield from self._order.acquire(*ranges)):
+            return (yield from _wait_result(
+                self._server.posix_rename(oldpath, newpath)))
+
+    @asyncio.coroutine
+    def _process_statvfs(self, packet):
+        """Process an incoming SFTP statvfs request"""
+
+        path = packet.get_string()
+        packet.check_end()
+
+        with (yield from self._order.acquire(*self._path_ranges(path))):
+            return (yield from _wait_result(self._server.statvfs(path)))
+
+    @asyncio.coroutine
+    def _process_fstatvfs(self, packet):
+        """Process an incoming SFTP fstatvfs request"""
+
+        handle = packet.get_string()
+        packet.check_end()
+
+        with (yield from self._order.acquire(self._file_range(handle))):
+            file_obj = self._file_handles.get(handle)
+            if file_obj:
+                return (yield from _wait_result(
+                    self._server.fstatvfs(file_obj)))
+            else:
+                raise SFTPError(FX_FAILURE, 'Invalid file handle')
+
+    @asyncio.coroutine
+    def _process_link(self, packet):
+        """Process an incoming SFTP hard link request"""
+
+        oldpath = packet.get_string()
+        newpath = packet.get_string()
+        packet.check_end()
+
+        ranges = (self._path_ranges(oldpath) +
+                  self._path_ranges(newpath, True))
+
+        with (yield from self._order.acquire(*ranges)):
+            return (yield from _wait_result(
+                self._server.link(oldpath, newpath)))
+
+    @asyncio.coroutine
+    def _process_fsync(self, packet):
+        """Process an incoming SFTP fsync request"""
+
+        handle = packet.get_string()
+        packet.check_end()
+
+        with (yield from self._order.acquire(self._file_range(handle))):
+            file_obj = self._file_handles.get(handle)
+            if file_obj:
+                return (yield from _wait_result(self._server.fsync(file_obj)))
+            else:
+                raise SFTPError(FX_FAILURE, 'Invalid file handle')
+
+    @asyncio.coroutine
+    def _process_copy_data(self, packet):
+        """Process an incoming SFTP copy-data request"""
+
+        read_handle = packet.get_string()
+        read_offset = packet.get_uint64()
+        length = packet.get_uint64()
+        write_handle = packet.get_string()
+        write_offset = packet.get_uint64()
+        packet.check_end()
+
+        if read_handle == write_handle:
+            if length == 0 or \
+                    (read_offset < write_offset + length and
+                     write_offset < read_offset + length):
+                raise SFTPError(FX_FAILURE, 'Overlapping copy not allowed')
+
+        with (yield from self._order.acquire(
+                self._file_range(read_handle, read_offset, length),
+                self._file_range(write_handle, write_offset, length, True))):
+            src_obj = self._file_handles.get(read_handle)
+            dst_obj = self._file_handles.get(write_handle)
+
+            if not src_obj or not dst_obj:
+                raise SFTPError(FX_FAILURE, 'Invalid file handle')
+
+            yield from self._copy_data(src_obj, read_offset, length,
+                                       dst_obj, write_offset)
+
+    @asyncio.coroutine
+    def _copy_data(self, src_obj, read_offset, length, dst_obj, write_offset):
+        """Copy data between open files on behalf of a copy-data request"""
+
+        while True:
+            if length:
+                size = min(length, _COPY_DATA_BLOCK_SIZE)
+            else:
+                size = _COPY_DATA_BLOCK_SIZE
+
+            data = yield from _wait_result(
+                self._server.read(src_obj, read_offset, size))
+            if not data:
+                break
+
+            yield from _wait_result(
+                self._server.write(dst_obj, write_offset, data))
+
+            read_offset += len(data)
+            write_offset += len(data)
+
+            if length:
+                length -= len(data)
+
+                if not length:
+                    break
+
+    @asyncio.coroutine
+    def _process_limits(self, packet):
+        """Process an incoming SFTP limits request"""
+
+        # pylint: disable=no-self-use
+
+        packet.check_end()
+
+        return (UInt64(_SFTP_MAX_PACKET_LEN) + UInt64(_SFTP_MAX_READ_LEN) +
+                UInt64(_SFTP_MAX_WRITE_LEN) + UInt64(0))
+
+    def _get_check_file_args(self, packet):
+        """Decode the arguments of an SFTP check-file request"""
+
+        # pylint: disable=no-self-use
+
+        algs = packet.get_namelist()
+        offset = packet.get_uint64()
+        length = packet.get_uint64()
+        block_size = packet.get_uint32()
+        packet.check_end()
+
+        for alg in algs:
+            if alg in _CHECK_FILE_ALGS:
+                break
+        else:
+            raise SFTPError(FX_FAILURE, 'No matching hash algorithm')
+
+        if block_size and block_size < _MIN_CHECK_FILE_BLOCK_SIZE:
+            raise SFTPError(FX_FAILURE, 'Invalid block size')
+
+        return alg, offset, length, block_size
+
+    @asyncio.coroutine
+    def _hash_range(self, file_obj, alg, offset, length, block_size):
+        """Return the hashes of a range of an open file
+
+           The range starting at offset is split into blocks of
+           block_size bytes and the digests of each block are returned
+           concatenated together. A length of zero covers the rest of
+           the file and a block size of zero hashes the whole range as
+           a single block. Data is read through the SFTPServer, but
+           the hashing itself is run in a thread pool so that large
+           files can be hashed without blocking the event loop.
+
+        """
+
+        end = offset + length if length else None
+        digests = []
+
+        try:
+            while end is None or offset < end:
+                block_end = offset + block_size if block_size else end
+
+                if block_end is None or (end is not None and end < block_end):
+                    block_end = end
+
+                hash_obj = hashlib.new(alg.decode('ascii'))
+                start = offset
+
+                while block_end is None or offset < block_end:
+                    size = _COPY_DATA_BLOCK_SIZE
+
+                    if block_end is not None:
+                        size = min(size, block_end - offset)
+
+                    data = yield from _wait_result(
+                        self._server.read(file_obj, offset, size))
+                    if not data:
+                        break
+
+                    yield from self._loop.run_in_executor(
+                        None, hash_obj.update, data)
+                    offset += len(data)
+
+                if offset == start and digests:
+                    break
+
+                digests.append(hash_obj.digest())
+
+                if block_end is None or offset < block_end:
+                    break
+        except ValueError:
+            # The file was closed while it was being hashed
+            raise SFTPError(FX_FAILURE, 'Invalid file handle') from None
+
+        return b''.join(digests)
+
+    @asyncio.coroutine
+    def _check_file(self, file_obj, alg, offset, length, block_size):
+        """Return the response to an SFTP check-file request"""
 
-    def _process_readlink(self, packet):
-        """Process an incoming SFTP readlink request"""
+        hashes = yield from self._hash_range(file_obj, alg, offset,
+                                             length, block_size)
+        return String(b'check-file') + String(alg) + hashes
 
-        path = packet.get_string()
-        packet.check_end()
+    @asyncio.coroutine
+    def _md5_hash(self, file_obj, offset, length, quick_check_hash):
+        """Return the response to an SFTP md5-hash request"""
 
-        return [SFTPName(self._server.readlink(path))]
+        if quick_check_hash:
+            quick_check_len = _MD5_QUICK_CHECK_SIZE
 
-    def _process_symlink(self, packet):
-        """Process an incoming SFTP symlink request"""
+            if length:
+                quick_check_len = min(quick_check_len, length)
 
-        if self._nonstandard_symlink:
-            oldpath = packet.get_string()
-            newpath = packet.get_string()
-        else:
-            newpath = packet.get_string()
-            oldpath = packet.get_string()
+            quick_hash = yield from self._hash_range(file_obj, b'md5', offset,
+                                                     quick_check_len, 0)
 
-        packet.check_end()
+            if quick_hash != quick_check_hash:
+                return String(b'md5-hash') + String(b'')
 
-        return self._server.symlink(oldpath, newpath)
+        hashes = yield from self._hash_range(file_obj, b'md5', offset,
+                                             length, 0)
+        return String(b'md5-hash') + String(hashes)
 
-    def _process_posix_rename(self, packet):
-        """Process an incoming SFTP POSIX rename request"""
+    @asyncio.coroutine
+    def _hash_path(self, path, hash_func, *args):
+        """Open a file by name and return hashes of it"""
 
-        oldpath = packet.get_string()
-        newpath = packet.get_string()
-        packet.check_end()
+        file_obj = yield from _wait_result(
+            self._server.open(path, 'rb', SFTPAttrs()))
 
-        return self._server.posix_rename(oldpath, newpath)
+        try:
+            return (yield from hash_func(file_obj, *args))
+        finally:
+            yield from _wait_result(self._server.close(file_obj))
 
-    def _process_statvfs(self, packet):
-        """Process an incoming SFTP statvfs request"""
+    @asyncio.coroutine
+    def _process_check_file_name(self, packet):
+        """Process an incoming SFTP check-file-name request"""
 
         path = packet.get_string()
-        packet.check_end()
+        alg, offset, length, block_size = self._get_check_file_args(packet)
 
-        return self._server.statvfs(path)
+        with (yield from self._order.acquire(*self._path_ranges(path))):
+            return (yield from self._hash_path(path, self._check_file, alg,
+                                               offset, length, block_size))
 
-    def _process_fstatvfs(self, packet):
-        """Process an incoming SFTP fstatvfs request"""
+    @asyncio.coroutine
+    def _process_check_file_handle(self, packet):
+        """Process an incoming SFTP check-file-handle request"""
 
         handle = packet.get_string()
-        packet.check_end()
-
-        file_obj = self._file_handles.get(handle)
-        if file_obj:
-            return self._server.fstatvfs(file_obj)
-        else:
-            raise SFTPError(FX_FAILURE, 'Invalid file handle')
+        alg, offset, length, block_size = self._get_check_file_args(packet)
+
+        with (yield from self._order.acquire(
+                self._file_range(handle, offset, length))):
+            file_obj = self._file_handles.get(handle)
+            if file_obj:
+                return (yield from self._check_file(file_obj, alg, offset,
+                                                    length, block_size))
+            else:
+                raise SFTPError(FX_FAILURE, 'Invalid file handle')
 
-    def _process_link(self, packet):
-        """Process an incoming SFTP hard link request"""
+    @asyncio.coroutine
+    def _process_md5_hash(self, packet):
+        """Process an incoming SFTP md5-hash request"""
 
-        oldpath = packet.get_string()
-        newpath = packet.get_string()
+        path = packet.get_string()
+        offset = packet.get_uint64()
+        length = packet.get_uint64()
+        quick_check_hash = packet.get_string()
         packet.check_end()
 
-        return self._server.link(oldpath, newpath)
+        with (yield from self._order.acquire(*self._path_ranges(path))):
+            return (yield from self._hash_path(path, self._md5_hash, offset,
+                                               length, quick_check_hash))
 
-    def _process_fsync(self, packet):
-        """Process an incoming SFTP fsync request"""
+    @asyncio.coroutine
+    def _process_md5_hash_handle(self, packet):
+        """Process an incoming SFTP md5-hash-handle request"""
 
         handle = packet.get_string()
+        offset = packet.get_uint64()
+        length = packet.get_uint64()
+        quick_check_hash = packet.get_string()
         packet.check_end()
 
-        file_obj = self._file_handles.get(handle)
-        if file_obj:
-            return self._server.fsync(file_obj)
-        else:
-            raise SFTPError(FX_FAILURE, 'Invalid file handle')
+        with (yield from self._order.acquire(
+                self._file_range(handle, offset, length))):
+            file_obj = self._file_handles.get(handle)
+            if file_obj:
+                return (yield from self._md5_hash(file_obj, offset, length,
+                                                  quick_check_hash))
+            else:
+                raise SFTPError(FX_FAILURE, 'Invalid file handle')
 
     _packet_handlers = {
         FXP_OPEN:                     _process_open,
@@ -3171,10 +5718,111 @@ class SFTPServerSession(SFTPSession, SSHServerSession):
         b'statvfs@openssh.com':       _process_statvfs,
         b'fstatvfs@openssh.com':      _process_fstatvfs,
         b'hardlink@openssh.com':      _process_link,
-        b'fsync@openssh.com':         _process_fsync
+        b'fsync@openssh.com':         _process_fsync,
+        b'copy-data':                 _process_copy_data,
+        b'check-file-name':           _process_check_file_name,
+        b'check-file-handle':         _process_check_file_handle,
+        b'md5-hash':                  _process_md5_hash,
+        b'md5-hash-handle':           _process_md5_hash_handle,
+        b'limits@openssh.com':        _process_limits
     }
 
 
+class _SFTPDirScanner:
+    """Iterator over the names and attributes in a directory
+
+       This wraps ``os.scandir()``, returning :class:`SFTPName` objects
+       with attributes filled in from the cached directory entries and
+       skipping entries which are removed while the directory is being
+       scanned. It is an iterator rather than a generator so that it
+       isn't mistaken for a coroutine to wait on.
+
+    """
+
+    def __init__(self, path):
+        self._scanner = os.scandir(path)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        for entry in self._scanner:
+            try:
+                attrs = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+
+            return SFTPName(entry.name, attrs=SFTPAttrs.from_local(attrs))
+
+        raise StopIteration
+
+    def close(self):
+        """Close the directory being scanned"""
+
+        if hasattr(self._scanner, 'close'):
+            self._scanner.close()
+
+
+class _SFTPThreadedDirScanner:
+    """Directory scanner which reads its entries in a thread pool
+
+       The SFTP server session calls :meth:`read_batch` to get each
+       batch of names to return to the client, which scans that part
+       of the directory in the thread pool of an SFTPThreadedServer.
+
+       If the scanner is closed while a batch is being read, such as
+       when the client disconnects, the directory is closed by the
+       thread reading it once that batch is complete.
+
+    """
+
+    def __init__(self, scanner, run):
+        self._scanner = scanner
+        self._run = run
+        self._lock = threading.Lock()
+        self._reading = False
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._scanner)
+
+    def _read(self, count):
+        """Read up to count names, unless the scanner has been closed"""
+
+        with self._lock:
+            if self._closed:
+                return []
+
+            self._reading = True
+
+        try:
+            return list(islice(self._scanner, count))
+        finally:
+            with self._lock:
+                self._reading = False
+
+                if self._closed:
+                    self._scanner.close()
+
+    @asyncio.coroutine
+    def read_batch(self, count):
+        """Read the next batch of up to count names in the thread pool"""
+
+        return (yield from self._run(self._read, count))
+
+    def close(self):
+        """Close the directory being scanned"""
+
+        with self._lock:
+            self._closed = True
+
+            if not self._reading:
+                self._scanner.close()
+
+
 class SFTPServer:
     """SFTP server
 
@@ -3195,6 +5843,21 @@ class SFTPServer:
        tree. This will also affect path names returned by the
        :meth:`realpath` and :meth:`readlink` methods.
 
+       Any of the methods which access files, such as :meth:`open`,
+       :meth:`read`, and :meth:`stat`, can be implemented as coroutines
+       rather than regular methods. The session waits for them to
+       complete before sending a response, without blocking the event
+       loop, which allows servers to be built on top of storage which
+       is only accessible asynchronously.
+
+       When these methods are coroutines, several requests from a client
+       may be in progress at once and they may complete in any order.
+       Requests on the same file handle are only run in parallel when
+       neither of them changes data the other accesses, and requests
+       which change the file system by path, such as :meth:`rename`
+       and :meth:`remove`, wait for earlier requests on that path or
+       on anything below it to finish.
+
     """
 
     # The default implementation of a number of these methods don't need self
@@ -3339,6 +6002,11 @@ class SFTPServer:
            file if it needs to be created. Otherwise, this argument is
            ignored.
 
+           By default, files are opened unbuffered, which allows the
+           default :meth:`read` and :meth:`write` methods to use
+           positional I/O on the underlying file descriptor rather than
+           seeking before each request.
+
            :param bytes path:
                The name of the file to open
            :param string mode:
@@ -3354,7 +6022,7 @@ class SFTPServer:
         """
 
         perms = 0o666 if attrs.permissions is None else attrs.permissions
-        return open(self.map_path(path), mode,
+        return open(self.map_path(path), mode, buffering=0,
                     opener=lambda path, flags: os.open(path, flags, perms))
 
     def close(self, file_obj):
@@ -3385,6 +6053,9 @@ class SFTPServer:
 
         """
 
+        if _supports_pio(file_obj):
+            return os.pread(file_obj.fileno(), size, offset)
+
         file_obj.seek(offset)
         return file_obj.read(size)
 
@@ -3404,8 +6075,26 @@ class SFTPServer:
 
         """
 
+        if _supports_pio(file_obj):
+            fd = file_obj.fileno()
+            buf = memoryview(data)
+
+            while buf:
+                count = os.pwrite(fd, buf, offset)
+                buf = buf[count:]
+                offset += count
+
+            return len(data)
+
+        # Unbuffered files, such as those opened for append, can
+        # accept only part of the data in a single write
         file_obj.seek(offset)
-        return file_obj.write(data)
+        buf = memoryview(data)
+
+        while buf:
+            buf = buf[file_obj.write(buf):]
+
+        return len(data)
 
     def lstat(self, path):
         """Get attributes of a file, directory, or symlink
@@ -3492,6 +6181,46 @@ class SFTPServer:
 
         return os.listdir(self.map_path(path))
 
+    def scandir(self, path):
+        """Scan the contents of a directory
+
+           This is called when a client opens a directory. It returns
+           an iterator over the directory's contents, which is only
+           advanced as the client reads from the directory, a batch of
+           names at a time. The names returned can be either byte
+           strings, whose attributes are looked up with :meth:`lstat`,
+           or :class:`SFTPName` objects with their attributes filled
+           in. If the iterator has a ``close`` method, it is called
+           when the client closes the directory.
+
+           By default, when ``os.scandir()`` is available and
+           :meth:`listdir` hasn't been overridden, the directory is
+           scanned with it, returning names with attributes cached
+           while scanning the directory. Otherwise, the names returned
+           by :meth:`listdir` are used.
+
+           :param bytes path:
+               The path of the directory to open
+
+           :returns: An iterator over the names of files in the directory
+
+           :raises: :exc:`SFTPError` to return an error to the client
+
+        """
+
+        if hasattr(os, 'scandir') and type(self).listdir is SFTPServer.listdir:
+            return _SFTPDirScanner(self.map_path(path))
+
+        names = self.listdir(path)
+
+        # A listdir() written as a plain generator isn't a coroutine to
+        # wait on, so its names are collected here
+        if inspect.isgenerator(names) and \
+                not asyncio.iscoroutinefunction(self.listdir):
+            names = list(names)
+
+        return names
+
     def remove(self, path):
         """Remove a file or symbolic link
 
@@ -3719,3 +6448,295 @@ class SFTPServer:
         """Shut down this SFTP server"""
 
         pass
+
+
+class SFTPThreadedServer(SFTPServer):
+    """SFTP server which performs file I/O in a pool of threads
+
+       This is a version of :class:`SFTPServer` which runs its blocking
+       file system calls in a pool of threads rather than on the event
+       loop, so that a client accessing slow storage doesn't stall SSH
+       traffic on other connections. It can be passed as the
+       ``sftp_factory`` argument to :func:`create_server` or subclassed
+       in the same way as :class:`SFTPServer`, but subclasses should
+       keep in mind that :meth:`map_path <SFTPServer.map_path>` and
+       :meth:`reverse_map_path <SFTPServer.reverse_map_path>` may be
+       called from these threads.
+
+       By default, a pool of 32 threads is shared by all sessions using
+       this class, and each session can use at most 4 of them at a time,
+       so that a single busy client can't starve the others. A different
+       executor or per-session limit can be chosen by passing ``executor``
+       or ``max_threads`` when this object is created.
+
+    """
+
+    _shared_executor = None
+
+    def __init__(self, conn, chroot=None, *, executor=None,
+                 max_threads=_SFTP_SESSION_THREADS):
+        super().__init__(conn, chroot)
+
+        # pylint: disable=protected-access
+        self._loop = conn._loop
+
+        self._executor = executor or self._get_shared_executor()
+        self._semaphore = asyncio.Semaphore(max_threads, loop=self._loop)
+        self._file_locks = {}
+        self._file_calls = {}
+
+    @staticmethod
+    def _get_shared_executor():
+        """Return the thread pool shared by all threaded SFTP sessions"""
+
+        if not SFTPThreadedServer._shared_executor:
+            SFTPThreadedServer._shared_executor = \
+                ThreadPoolExecutor(_SFTP_SERVER_THREADS)
+
+        return SFTPThreadedServer._shared_executor
+
+    @asyncio.coroutine
+    def _run(self, func, *args):
+        """Run a blocking call in the thread pool"""
+
+        with (yield from self._semaphore):
+            return (yield from self._loop.run_in_executor(self._executor,
+                                                          func, *args))
+
+    @asyncio.coroutine
+    def _run_file(self, file_obj, func, *args):
+        """Run a blocking call which uses an open file
+
+           The call is tracked until it finishes running in the thread
+           pool, even if the request which made it is cancelled, so
+           that :meth:`close` can wait for it rather than closing the
+           file while it may still be in use.
+
+        """
+
+        calls = self._file_calls.setdefault(file_obj, set())
+
+        with (yield from self._semaphore):
+            future = self._executor.submit(func, *args)
+            calls.add(future)
+
+            try:
+                result = asyncio.wrap_future(future, loop=self._loop)
+                return (yield from result)
+            finally:
+                if future.done():
+                    calls.discard(future)
+
+    @asyncio.coroutine
+    def _run_locked(self, file_obj, func, *args):
+        """Run a blocking call which uses the position of an open file
+
+           Calls on the same file are serialized, since requests on a
+           file handle may otherwise be run in parallel. Reads and writes
+           on files which support positional I/O don't need this.
+
+        """
+
+        lock = self._file_locks.setdefault(file_obj, threading.Lock())
+
+        def call_locked():
+            """Make the call while holding the lock for the file"""
+
+            with lock:
+                return func(*args)
+
+        return (yield from self._run_file(file_obj, call_locked))
+
+    def _close_abandoned(self, future):
+        """Close a file whose open finished after its request was cancelled"""
+
+        if not future.cancelled() and not future.exception():
+            super().close(future.result())
+
+    @asyncio.coroutine
+    def open(self, path, mode, attrs):
+        """Open a file to serve to a remote client"""
+
+        with (yield from self._semaphore):
+            future = self._executor.submit(super().open, path, mode, attrs)
+
+            try:
+                result = asyncio.wrap_future(future, loop=self._loop)
+                return (yield from result)
+            except asyncio.CancelledError:
+                future.add_done_callback(self._close_abandoned)
+                raise
+
+    @asyncio.coroutine
+    def close(self, file_obj):
+        """Close an open file or directory
+
+           Calls on the file still running in the thread pool, such as
+           those left behind by requests cancelled when the client
+           disconnects, are waited for before the file is closed.
+
+        """
+
+        calls = [asyncio.wrap_future(future, loop=self._loop)
+                 for future in self._file_calls.pop(file_obj, ())
+                 if not future.done()]
+
+        if calls:
+            yield from asyncio.wait(calls, loop=self._loop)
+
+        self._file_locks.pop(file_obj, None)
+        yield from self._run(super().close, file_obj)
+
+    @asyncio.coroutine
+    def read(self, file_obj, offset, size):
+        """Read data from an open file"""
+
+        if _supports_pio(file_obj):
+            return (yield from self._run_file(file_obj, super().read,
+                                              file_obj, offset, size))
+        else:
+            return (yield from self._run_locked(file_obj, super().read,
+                                                file_obj, offset, size))
+
+    @asyncio.coroutine
+    def write(self, file_obj, offset, data):
+        """Write data to an open file"""
+
+        if _supports_pio(file_obj):
+            return (yield from self._run_file(file_obj, super().write,
+                                              file_obj, offset, data))
+        else:
+            return (yield from self._run_locked(file_obj, super().write,
+                                                file_obj, offset, data))
+
+    @asyncio.coroutine
+    def lstat(self, path):
+        """Get attributes of a file, directory, or symlink"""
+
+        return (yield from self._run(super().lstat, path))
+
+    @asyncio.coroutine
+    def fstat(self, file_obj):
+        """Get attributes of an open file"""
+
+        return (yield from self._run_locked(file_obj, super().fstat,
+                                            file_obj))
+
+    @asyncio.coroutine
+    def setstat(self, path, attrs):
+        """Set attributes of a file or directory"""
+
+        return (yield from self._run(super().setstat, path, attrs))
+
+    @asyncio.coroutine
+    def fsetstat(self, file_obj, attrs):
+        """Set attributes of an open file"""
+
+        return (yield from self._run_locked(file_obj, super().fsetstat,
+                                            file_obj, attrs))
+
+    @asyncio.coroutine
+    def listdir(self, path):
+        """List the contents of a directory"""
+
+        return (yield from self._run(super().listdir, path))
+
+    @asyncio.coroutine
+    def scandir(self, path):
+        """Scan the contents of a directory
+
+           When ``os.scandir()`` is available and :meth:`listdir` hasn't
+           been overridden, the directory is opened here and each batch
+           of entries the client reads is scanned in the thread pool.
+           Otherwise, the names returned by :meth:`listdir` are used,
+           and their attributes are looked up in the thread pool with
+           :meth:`lstat` as the client reads from the directory.
+
+        """
+
+        if hasattr(os, 'scandir') and \
+                type(self).listdir is SFTPThreadedServer.listdir:
+            scanner = yield from self._run(_SFTPDirScanner,
+                                           self.map_path(path))
+            return _SFTPThreadedDirScanner(scanner, self._run)
+        else:
+            return (yield from _wait_result(super().scandir(path)))
+
+    @asyncio.coroutine
+    def remove(self, path):
+        """Remove a file or symbolic link"""
+
+        return (yield from self._run(super().remove, path))
+
+    @asyncio.coroutine
+    def mkdir(self, path, attrs):
+        """Create a directory with the specified attributes"""
+
+        return (yield from self._run(super().mkdir, path, attrs))
+
+    @asyncio.coroutine
+    def rmdir(self, path):
+        """Remove a directory"""
+
+        return (yield from self._run(super().rmdir, path))
+
+    @asyncio.coroutine
+    def realpath(self, path):
+        """Return the canonical version of a path"""
+
+        return (yield from self._run(super().realpath, path))
+
+    @asyncio.coroutine
+    def stat(self, path):
+        """Get attributes of a file or directory, following symlinks"""
+
+        return (yield from self._run(super().stat, path))
+
+    @asyncio.coroutine
+    def rename(self, oldpath, newpath):
+        """Rename a file, directory, or link"""
+
+        return (yield from self._run(super().rename, oldpath, newpath))
+
+    @asyncio.coroutine
+    def readlink(self, path):
+        """Return the target of a symbolic link"""
+
+        return (yield from self._run(super().readlink, path))
+
+    @asyncio.coroutine
+    def symlink(self, oldpath, newpath):
+        """Create a symbolic link"""
+
+        return (yield from self._run(super().symlink, oldpath, newpath))
+
+    @asyncio.coroutine
+    def posix_rename(self, oldpath, newpath):
+        """Rename a file, directory, or link with POSIX semantics"""
+
+        return (yield from self._run(super().posix_rename, oldpath, newpath))
+
+    @asyncio.coroutine
+    def statvfs(self, path):
+        """Get attributes of the file system containing a file"""
+
+        return (yield from self._run(super().statvfs, path))
+
+    @asyncio.coroutine
+    def fstatvfs(self, file_obj):
+        """Return attributes of the file system containing an open file"""
+
+        return (yield from self._run_file(file_obj, super().fstatvfs,
+                                          file_obj))
+
+    @asyncio.coroutine
+    def link(self, oldpath, newpath):
+        """Create a hard link"""
+
+        return (yield from self._run(super().link, oldpath, newpath))
+
+    @asyncio.coroutine
+    def fsync(self, file_obj):
+        """Force file data to be written to disk"""
+
+        return (yield from self._run_file(file_obj, super().fsync, file_obj))
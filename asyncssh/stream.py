@@ -14,19 +14,57 @@
 
 import asyncio
 
+from collections import deque
+
 from .constants import EXTENDED_DATA_STDERR
 from .misc import BreakReceived, SignalReceived, TerminalSizeChanged
+from .misc import LimitOverrunError
 from .session import SSHClientSession, SSHServerSession, SSHTCPSession
 
 
+class _SSHReaderIterator:
+    """Asynchronous iterator over data read from an SSH stream
+
+       This class repeatedly calls a read coroutine on the stream,
+       returning each result until an empty result signals EOF.
+
+    """
+
+    def __init__(self, read, *args):
+        self._read = read
+        self._args = args
+
+    def __aiter__(self):
+        return self
+
+    @asyncio.coroutine
+    def __anext__(self):
+        data = yield from self._read(*self._args)
+
+        if not data:
+            raise StopAsyncIteration # pylint: disable=undefined-variable
+
+        return data
+
+
 class SSHReader:
-    """SSH read stream handler"""
+    """SSH read stream handler
+
+       On versions of Python which support it, an SSHReader can be
+       used with ``async for`` to iterate over the lines in the stream.
+
+    """
 
     def __init__(self, session, chan, datatype=None):
         self._session = session
         self._chan = chan
         self._datatype = datatype
 
+    def __aiter__(self):
+        """Allow SSHReader to be used as an async iterator over lines"""
+
+        return _SSHReaderIterator(self.readline)
+
     @property
     def channel(self):
         """The SSH channel associated with this stream"""
@@ -79,6 +117,40 @@ class SSHReader:
 
         return self._session.readline(self._datatype)
 
+    def readuntil(self, separator, limit=None):
+        """Read data from the stream until a separator is found
+
+           This method is a coroutine which reads data from the stream
+           until ``separator`` is found, returning the data including
+           the separator. The separator can be any non-empty bytes or
+           string, matching the type of data on the stream.
+
+           Each byte or character of input is only searched once, even
+           when the data arrives in many small pieces.
+
+           If EOF is received before the separator is found, an
+           :exc:`IncompleteReadError <asyncio.IncompleteReadError>` is
+           raised and its ``partial`` attribute contains the data which
+           was read.
+
+           If a limit is specified and the separator is not found within
+           ``limit`` bytes or characters, a :exc:`LimitOverrunError
+           <asyncio.LimitOverrunError>` is raised and the data is left
+           in the stream, where it can be consumed with :meth:`read`.
+           Since unread data is held in the stream, limits larger than
+           the stream's receive window can't be reached and act as if
+           they were the window size. By default, there is no limit.
+
+           :param separator:
+               The separator to read up to
+           :param integer limit: (optional)
+               The maximum amount of data to search for the separator
+           :type separator: bytes or string
+
+        """
+
+        return self._session.readuntil(separator, self._datatype, limit)
+
     def readexactly(self, n):
         """Read an exact amount of data from the stream
 
@@ -94,6 +166,44 @@ class SSHReader:
 
         return self._session.read(n, self._datatype, exact=True)
 
+    def readinto(self, buf):
+        """Read data from the stream into a buffer
+
+           This method is a coroutine which reads up to ``len(buf)``
+           bytes from the stream directly into ``buf``, which can be
+           any writable bytes-like object such as a ``bytearray`` or
+           ``memoryview``. It returns the number of bytes read, which
+           will be ``0`` once EOF is reached.
+
+           This method can only be used on channels which were opened
+           without an encoding.
+
+        """
+
+        return self._session.readinto(buf, self._datatype)
+
+    def iter_chunked(self, size):
+        """Return an async iterator over chunks of data in the stream
+
+           This method returns an asynchronous iterator which reads
+           the stream in chunks of up to ``size`` bytes or characters,
+           for use with ``async for``. Iteration stops at EOF.
+
+           Each chunk is removed from the stream's receive buffer as
+           it is returned, which reopens the channel's receive window.
+           As a result, only a bounded amount of data is held in memory
+           no matter how much data is sent on the stream.
+
+           :param integer size:
+               The maximum size of each chunk
+
+        """
+
+        if size <= 0:
+            raise ValueError('Chunk size must be positive')
+
+        return _SSHReaderIterator(self.read, size)
+
     def at_eof(self):
         """Return whether the stream is at EOF
 
@@ -179,6 +289,19 @@ class SSHWriter:
 
         return self._chan.writelines(list_of_data, self._datatype)
 
+    def write_buffers(self, buffers):
+        """Write a collection of buffers to the stream
+
+           This method writes an iterable of bytes-like objects, such
+           as ``bytes`` or ``memoryview`` objects, to the stream without
+           joining them together first. See :meth:`write_buffers()
+           <SSHClientChannel.write_buffers>` on :class:`SSHClientChannel`
+           for additional information.
+
+        """
+
+        return self._chan.write_buffers(buffers, self._datatype)
+
     def write_eof(self):
         """Write EOF on the channel
 
@@ -205,7 +328,8 @@ class SSHStreamSession:
         self._exception = None
         self._eof_received = False
         self._connection_lost = False
-        self._recv_buf = {None: []}
+        self._recv_buf = {None: deque()}
+        self._recv_buf_offset = {None: 0}
         self._recv_buf_len = 0
         self._read_waiter = {None: None}
         self._write_paused = False
@@ -249,7 +373,8 @@ class SSHStreamSession:
         self._limit = self._chan.get_recv_window()
 
         for datatype in chan.get_read_datatypes():
-            self._recv_buf[datatype] = []
+            self._recv_buf[datatype] = deque()
+            self._recv_buf_offset[datatype] = 0
             self._read_waiter[datatype] = None
 
     def connection_lost(self, exc):
@@ -303,12 +428,52 @@ class SSHStreamSession:
         self._write_paused = False
         self._unblock_drain()
 
+    def _consume(self, datatype, n):
+        """Remove up to n bytes or characters from the receive buffer
+
+           Data is taken from the first chunk in the receive buffer,
+           starting at the current read offset. Partially consumed
+           chunks are left in place and only the offset is advanced,
+           so the unread tail of a chunk is never copied. Binary data
+           is returned as a memoryview unless the whole chunk is taken.
+
+        """
+
+        recv_buf = self._recv_buf[datatype]
+        chunk = recv_buf[0]
+        start = self._recv_buf_offset[datatype]
+        end = len(chunk) if n < 0 else min(start + n, len(chunk))
+
+        if start == 0 and end == len(chunk):
+            data = chunk
+        elif isinstance(chunk, str):
+            data = chunk[start:end]
+        else:
+            data = memoryview(chunk)[start:end]
+
+        if end == len(chunk):
+            recv_buf.popleft()
+            self._recv_buf_offset[datatype] = 0
+        else:
+            self._recv_buf_offset[datatype] = end
+
+        self._recv_buf_len -= end - start
+        return data
+
+    def _join(self, data):
+        """Join data removed from the receive buffer into a single result"""
+
+        if len(data) == 1 and not isinstance(data[0], memoryview):
+            return data[0]
+        else:
+            sep = '' if self._chan.get_encoding() else b''
+            return sep.join(data)
+
     @asyncio.coroutine
     def read(self, n, datatype, exact):
         """Read data from the channel"""
 
         recv_buf = self._recv_buf[datatype]
-        buf = '' if self._chan.get_encoding() else b''
         data = []
 
         while True:
@@ -317,19 +482,13 @@ class SSHStreamSession:
                     if data:
                         break
                     else:
-                        raise recv_buf.pop(0)
+                        raise recv_buf.popleft()
 
-                l = len(recv_buf[0])
-                if n > 0 and l > n:
-                    data.append(recv_buf[0][:n])
-                    recv_buf[0] = recv_buf[0][n:]
-                    self._recv_buf_len -= n
-                    n = 0
-                    break
+                chunk = self._consume(datatype, n)
+                data.append(chunk)
 
-                data.append(recv_buf.pop(0))
-                self._recv_buf_len -= l
-                n -= l
+                if n > 0:
+                    n -= len(chunk)
 
             if self._recv_buf_len < self._limit:
                 self._chan.resume_reading()
@@ -339,51 +498,168 @@ class SSHStreamSession:
 
             yield from self._block_read(datatype)
 
-        buf = buf.join(data)
+        buf = self._join(data)
         if n > 0 and exact:
             raise asyncio.IncompleteReadError(buf, len(buf) + n)
 
         return buf
 
     @asyncio.coroutine
-    def readline(self, datatype):
-        """Read a line from the channel"""
+    def readinto(self, buf, datatype):
+        """Read data from the channel into a buffer"""
+
+        if self._chan.get_encoding():
+            raise TypeError('readinto requires a channel with no encoding')
 
         recv_buf = self._recv_buf[datatype]
-        buf, sep = ('', '\n') if self._chan.get_encoding() else (b'', b'\n')
-        data = []
+        buf = memoryview(buf).cast('B')
+        n = 0
 
         while True:
-            while recv_buf:
+            while recv_buf and n < len(buf):
                 if isinstance(recv_buf[0], Exception):
-                    if data:
-                        return buf.join(data)
+                    if n:
+                        break
                     else:
-                        raise recv_buf.pop(0)
+                        raise recv_buf.popleft()
+
+                chunk = self._consume(datatype, len(buf) - n)
+                buf[n:n+len(chunk)] = chunk
+                n += len(chunk)
+
+            if self._recv_buf_len < self._limit:
+                self._chan.resume_reading()
 
-                idx = recv_buf[0].find(sep) + 1
-                if idx > 0:
-                    data.append(recv_buf[0][:idx])
-                    recv_buf[0] = recv_buf[0][idx:]
-                    self._recv_buf_len -= idx
+            if n or not buf or self._eof_received:
+                return n
 
-                    if self._recv_buf_len < self._limit:
-                        self._chan.resume_reading()
+            yield from self._block_read(datatype)
 
-                    return buf.join(data)
+    def _read_buffered(self, datatype, n, data=None):
+        """Remove exactly n bytes or characters from the receive buffer
 
-                l = len(recv_buf[0])
-                data.append(recv_buf.pop(0))
-                self._recv_buf_len -= l
+           If a list of data already removed from the buffer is passed
+           in, the new data is appended to it before it is joined.
 
-            if self._recv_buf_len < self._limit:
-                self._chan.resume_reading()
+        """
+
+        if data is None:
+            data = []
+
+        while n:
+            chunk = self._consume(datatype, n)
+            data.append(chunk)
+            n -= len(chunk)
+
+        if self._recv_buf_len < self._limit:
+            self._chan.resume_reading()
+
+        return self._join(data)
+
+    @asyncio.coroutine
+    def readuntil(self, separator, datatype, limit):
+        """Read data from the channel until a separator is found"""
+
+        if not separator:
+            raise ValueError('Separator must not be empty')
+
+        recv_buf = self._recv_buf[datatype]
+        seplen = len(separator)
+
+        # Search state is kept across waits for more data, so that each
+        # chunk is only searched once. The tail holds the last few
+        # bytes or characters searched, to find separators which
+        # span a chunk boundary.
+        idx = 0
+        scanned = 0
+        tail = separator[:0]
+
+        # Without a limit, chunks which have been searched are removed
+        # from the receive buffer as we go, so that the receive window
+        # keeps opening no matter how much data arrives before the
+        # separator. With a limit, they are left in place so that they
+        # can still be read if the limit is exceeded.
+        data = []
+        consumed = 0
+
+        while True:
+            while idx < len(recv_buf):
+                chunk = recv_buf[idx]
+
+                if isinstance(chunk, Exception):
+                    if scanned:
+                        partial = self._read_buffered(
+                            datatype, scanned - consumed, data)
+                        raise asyncio.IncompleteReadError(partial, None)
+                    else:
+                        raise recv_buf.popleft()
+
+                start = self._recv_buf_offset[datatype] if idx == 0 else 0
+
+                # Positions are relative to the start of unscanned data
+                # in this chunk, and may be negative for a separator
+                # which began in the tail of earlier chunks
+                pos = None
+
+                if tail:
+                    window = tail + chunk[start:start+seplen-1]
+                    found = window.find(separator)
+                    if found >= 0:
+                        pos = found - len(tail)
+
+                if pos is None:
+                    found = chunk.find(separator, start)
+                    if found >= 0:
+                        pos = found - start
+
+                if pos is not None:
+                    n = scanned + pos + seplen
+
+                    if limit is not None and n - seplen > limit:
+                        raise LimitOverrunError('Separator is found, but '
+                                                'chunk is longer than limit',
+                                                n)
+
+                    return self._read_buffered(datatype, n - consumed, data)
+
+                if seplen > 1:
+                    tail = (tail + chunk[max(start, len(chunk) -
+                                             seplen + 1):])[1-seplen:]
+
+                scanned += len(chunk) - start
+
+                if limit is None:
+                    data.append(self._consume(datatype, len(chunk) - start))
+                    consumed = scanned
+                else:
+                    idx += 1
 
             if self._eof_received:
-                return buf.join(data)
+                partial = self._read_buffered(datatype, scanned - consumed,
+                                              data)
+                raise asyncio.IncompleteReadError(partial, None)
+
+            if limit is not None and (scanned > limit or
+                                      self._recv_buf_len >= self._limit):
+                raise LimitOverrunError('Separator is not found, and chunk '
+                                        'exceeds the limit', scanned)
+
+            if self._recv_buf_len < self._limit:
+                self._chan.resume_reading()
 
             yield from self._block_read(datatype)
 
+    @asyncio.coroutine
+    def readline(self, datatype):
+        """Read a line from the channel"""
+
+        sep = '\n' if self._chan.get_encoding() else b'\n'
+
+        try:
+            return (yield from self.readuntil(sep, datatype, None))
+        except asyncio.IncompleteReadError as exc:
+            return exc.partial
+
     @asyncio.coroutine
     def drain(self):
         """Wait for data written to the channel to drain"""
@@ -410,12 +686,14 @@ class SSHClientStreamSession(SSHStreamSession, SSHClientSession):
 class SSHServerStreamSession(SSHStreamSession, SSHServerSession):
     """SSH server stream session handler"""
 
-    def __init__(self, allow_pty, session_factory, sftp_factory):
+    def __init__(self, allow_pty, session_factory, sftp_factory,
+                 sftp_max_requests=None):
         super().__init__()
 
         self._allow_pty = allow_pty
         self._session_factory = session_factory
         self._sftp_factory = sftp_factory
+        self._sftp_max_requests = sftp_max_requests
 
     def pty_requested(self, term_type, term_size, term_modes):
         """Return whether a pseudo-tty can be requested"""
@@ -444,7 +722,8 @@ class SSHServerStreamSession(SSHStreamSession, SSHServerSession):
         """Start a session for this newly opened server channel"""
 
         if self._chan.get_subsystem() == 'sftp':
-            self._chan.start_sftp_server(self._sftp_factory)
+            self._chan.start_sftp_server(self._sftp_factory,
+                                         self._sftp_max_requests)
         else:
             handler = self._session_factory(SSHReader(self, self._chan),
                                             SSHWriter(self, self._chan),
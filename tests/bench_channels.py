@@ -0,0 +1,114 @@
+# Copyright (c) 2015 by Ron Frederick <ronf@timeheart.net>.
+# All rights reserved.
+#
+# This program and the accompanying materials are made available under
+# the terms of the Eclipse Public License v1.0 which accompanies this
+# distribution and is available at:
+#
+#     http://www.eclipse.org/legal/epl-v10.html
+#
+# Contributors:
+#     Ron Frederick - initial implementation, API, and documentation
+
+"""Benchmark of SSH channel number allocation
+
+   This times opening and closing channels on a connection while a set
+   of other channels are held open, comparing the channel number
+   allocator in SSHConnection against the linear probe it replaced.
+   It reports the time per open and close and the highest channel
+   number handed out, which shows how compact the numbers stay.
+
+   Usage: python -m tests.bench_channels [count] [held_open]
+
+"""
+
+import asyncio
+import sys
+import time
+
+from collections import deque
+
+from asyncssh import SSHClient, SSHClientConnection
+
+
+class _ProbeAllocator:
+    """The linear probe channel allocator SSHConnection used to use"""
+
+    def __init__(self):
+        self._channels = {}
+        self._next_recv_chan = 0
+
+    def add_channel(self, chan):
+        """Add a new channel, returning its channel number"""
+
+        while self._next_recv_chan in self._channels:
+            self._next_recv_chan = (self._next_recv_chan + 1) & 0xffffffff
+
+        recv_chan = self._next_recv_chan
+        self._next_recv_chan = (self._next_recv_chan + 1) & 0xffffffff
+
+        self._channels[recv_chan] = chan
+        return recv_chan
+
+    def remove_channel(self, recv_chan):
+        """Remove the channel with the specified channel number"""
+
+        del self._channels[recv_chan]
+
+
+def _make_connection(loop):
+    """Return a client connection which hasn't been connected yet
+
+       Nothing is sent on the connection, so it doesn't need a
+       transport for channel numbers to be allocated on it.
+
+    """
+
+    return SSHClientConnection(SSHClient, loop, 'localhost', 22,
+                               known_hosts=None, username='bench',
+                               client_keys=[], password=None, kex_algs=(),
+                               encryption_algs=(), mac_algs=(),
+                               compression_algs=(), rekey_bytes=1 << 30,
+                               rekey_seconds=3600, auth_waiter=None)
+
+
+def _run(conn, count, held_open):
+    """Open and close count channels with held_open others kept open"""
+
+    held = deque(conn.add_channel(None) for _ in range(held_open))
+    max_chan = 0
+
+    start = time.perf_counter()
+
+    for _ in range(count):
+        recv_chan = conn.add_channel(None)
+        max_chan = max(max_chan, recv_chan)
+        held.append(recv_chan)
+        conn.remove_channel(held.popleft())
+
+    elapsed = time.perf_counter() - start
+
+    return elapsed * 1e9 / count, max_chan
+
+
+def main():
+    """Run the benchmark and print the results"""
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    held_open = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    print('%d channel opens and closes, %d held open' % (count, held_open))
+
+    loop = asyncio.new_event_loop()
+
+    for name, conn in (('linear probe', _ProbeAllocator()),
+                       ('free list', _make_connection(loop))):
+        per_op, max_chan = _run(conn, count, held_open)
+        print('  %-12s %6.0f ns per open/close, highest channel %d' %
+              (name, per_op, max_chan))
+
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1376 @@
+# Copyright (c) 2015 by Ron Frederick <ronf@timeheart.net>.
+# All rights reserved.
+#
+# This program and the accompanying materials are made available under
+# the terms of the Eclipse Public License v1.0 which accompanies this
+# distribution and is available at:
+#
+#     http://www.eclipse.org/legal/epl-v10.html
+#
+# Contributors:
+#     Ron Frederick - initial implementation, API, and documentation
+
+"""Unit tests for SFTP client file access and transfers"""
+
+import array
+import asyncio
+import glob
+import hashlib
+import io
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from asyncssh import SFTPAttrs, SFTPError, SFTPName, SFTPServer
+from asyncssh import FX_FAILURE, FX_NO_SUCH_FILE, FX_OP_UNSUPPORTED
+
+from asyncssh.packet import SSHPacket, UInt32, UInt64
+from asyncssh.sftp import SFTPServerSession, SFTPSession
+from asyncssh.sftp import _LocalFS, _SFTPAttrCache
+from asyncssh.sftp import _MAX_SFTP_BLOCK_SIZE, _SFTP_BLOCK_SIZE
+from asyncssh.sftp import _SFTP_MAX_READ_LEN, _SFTP_MAX_WRITE_LEN
+
+from .util import ServerTestCase, asynctest, read_file, write_file
+
+
+class _FileServer(SFTPServer):
+    """SFTP server used to test the client
+
+       Missing files are reported as FX_NO_SUCH_FILE, which the client
+       relies on to tell whether a destination exists. Reads and writes
+       are delayed by an amount which varies with their offset, so that
+       pipelined requests complete out of order.
+
+    """
+
+    @staticmethod
+    def _delay(offset):
+        """Return how long to delay a read or write at an offset"""
+
+        return 0.001 * (3 - (offset // 8192) % 4)
+
+    def stat(self, path):
+        try:
+            return super().stat(path)
+        except FileNotFoundError:
+            raise SFTPError(FX_NO_SUCH_FILE, 'No such file')
+
+    def lstat(self, path):
+        try:
+            return super().lstat(path)
+        except FileNotFoundError:
+            raise SFTPError(FX_NO_SUCH_FILE, 'No such file')
+
+    @asyncio.coroutine
+    def read(self, file_obj, offset, size):
+        yield from asyncio.sleep(self._delay(offset))
+        return super().read(file_obj, offset, size)
+
+    @asyncio.coroutine
+    def write(self, file_obj, offset, data):
+        yield from asyncio.sleep(self._delay(offset))
+        return super().write(file_obj, offset, data)
+
+
+class _TestSFTP(ServerTestCase):
+    server_options = {'sftp_factory': _FileServer}
+
+    @asyncio.coroutine
+    def start_sftp(self, **kwargs):
+        """Open a connection and start an SFTP client on it"""
+
+        conn = yield from self.connect()
+        self.addCleanup(conn.close)
+
+        return (yield from conn.start_sftp_client(**kwargs))
+
+
+class TestSFTPFile(_TestSFTP):
+    data = os.urandom(200003)
+
+    @asynctest
+    def test_read_all(self):
+        write_file('src', self.data)
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('src', 'rb')
+
+        result = yield from f.read(block_size=8192, max_requests=8)
+        self.assertEqual(result, self.data)
+        self.assertEqual((yield from f.read()), b'')
+
+        yield from f.close()
+
+    @asynctest
+    def test_read_range(self):
+        write_file('src', self.data)
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('src', 'rb')
+
+        result = yield from f.read(100000, 12345, block_size=8192)
+        self.assertEqual(result, self.data[12345:112345])
+
+        result = yield from f.read(-1, 190000, block_size=8192)
+        self.assertEqual(result, self.data[190000:])
+
+        result = yield from f.read(100, len(self.data))
+        self.assertEqual(result, b'')
+
+        yield from f.close()
+
+    @asynctest
+    def test_read_sequential(self):
+        write_file('src', self.data)
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('src', 'rb')
+
+        first = yield from f.read(150000, block_size=8192)
+        rest = yield from f.read(150000, block_size=8192)
+
+        self.assertEqual(first, self.data[:150000])
+        self.assertEqual(rest, self.data[150000:])
+
+        yield from f.close()
+
+    @asynctest
+    def test_readinto(self):
+        write_file('src', self.data)
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('src', 'rb')
+
+        buf = bytearray(150000)
+        n = yield from f.readinto(buf, block_size=8192, max_requests=8)
+        self.assertEqual(n, 150000)
+        self.assertEqual(buf, self.data[:150000])
+
+        # Reading continues from where the last read ended, and is
+        # short only when EOF is reached
+        n = yield from f.readinto(buf, block_size=8192)
+        self.assertEqual(n, 50003)
+        self.assertEqual(buf[:n], self.data[150000:])
+
+        self.assertEqual((yield from f.readinto(buf)), 0)
+
+        yield from f.close()
+
+    @asynctest
+    def test_readinto_view(self):
+        write_file('src', self.data)
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('src', 'rb')
+
+        words = array.array('H', bytes(20))
+        n = yield from f.readinto(words, 1000)
+        self.assertEqual(n, 20)
+        self.assertEqual(words.tobytes(), self.data[1000:1020])
+
+        buf = bytearray(30)
+        n = yield from f.readinto(memoryview(buf)[10:20], 0)
+        self.assertEqual(n, 10)
+        self.assertEqual(buf, bytes(10) + self.data[:10] + bytes(10))
+
+        with self.assertRaises(TypeError):
+            yield from f.readinto(b'readonly')
+
+        with self.assertRaises(TypeError):
+            yield from f.readinto(io.BytesIO())
+
+        yield from f.close()
+
+    @asynctest
+    def test_read_to_file(self):
+        write_file('src', self.data)
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('src', 'rb')
+
+        with open('dst', 'wb') as dst:
+            dst.write(b'head')
+
+            n = yield from f.read_to(dst, 100000, 5, block_size=8192)
+            self.assertEqual(n, 100000)
+
+            n = yield from f.read_to(dst, block_size=8192)
+            self.assertEqual(n, len(self.data) - 100005)
+
+        self.assertEqual(read_file('dst'), b'head' + self.data[5:])
+
+        yield from f.close()
+
+    @asynctest
+    def test_read_to_buffer_size(self):
+        write_file('src', self.data)
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('src', 'rb')
+
+        buf = bytearray(100)
+        self.assertEqual((yield from f.read_to(buf, 40, 0)), 40)
+        self.assertEqual(buf, self.data[:40] + bytes(60))
+
+        self.assertEqual((yield from f.read_to(buf, 1000, 0)), 100)
+        self.assertEqual(buf, self.data[:100])
+
+        yield from f.close()
+
+        with self.assertRaises(ValueError):
+            yield from f.read_to(buf)
+
+    @asynctest
+    def test_write_all(self):
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('dst', 'wb')
+
+        yield from f.write(self.data, block_size=8192, max_requests=8)
+        yield from f.close()
+
+        self.assertEqual(read_file('dst'), self.data)
+
+    @asynctest
+    def test_write_range(self):
+        write_file('dst', bytes(len(self.data)))
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('dst', 'rb+')
+
+        yield from f.write(self.data[5000:105000], 5000, block_size=8192)
+        yield from f.close()
+
+        expected = bytes(5000) + self.data[5000:105000] + bytes(95003)
+        self.assertEqual(read_file('dst'), expected)
+
+    @asynctest
+    def test_write_sequential(self):
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('dst', 'wb')
+
+        yield from f.write(self.data[:150000], block_size=8192)
+        yield from f.write(self.data[150000:], block_size=8192)
+        yield from f.close()
+
+        self.assertEqual(read_file('dst'), self.data)
+
+
+class TestSFTPLimits(_TestSFTP):
+    @asyncio.coroutine
+    def set_limits(self, sftp, *limits):
+        """Apply a limits reply from the server to a client session"""
+
+        @asyncio.coroutine
+        def make_request(*args):
+            if isinstance(limits[0], Exception):
+                raise limits[0]
+            else:
+                return SSHPacket(b''.join(UInt64(limit) for limit in limits))
+
+        # pylint: disable=protected-access
+        session = sftp._session
+
+        with patch.object(session, '_make_request', make_request):
+            yield from session.request_limits()
+
+        return session
+
+    @asynctest
+    def test_negotiated(self):
+        sftp = yield from self.start_sftp()
+
+        # pylint: disable=protected-access
+        session = sftp._session
+
+        self.assertEqual(session.get_read_size(), _SFTP_MAX_READ_LEN)
+        self.assertEqual(session.get_write_size(), _SFTP_MAX_WRITE_LEN)
+        self.assertEqual(session.get_read_size(1024*1024), _SFTP_MAX_READ_LEN)
+        self.assertEqual(session.get_read_size(4096), 4096)
+        self.assertEqual(session.get_max_open_handles(), 0)
+
+    @asynctest
+    def test_packet_limit(self):
+        sftp = yield from self.start_sftp()
+        session = yield from self.set_limits(sftp, 32768, 0, 100000, 64)
+
+        self.assertEqual(session.get_read_size(), 32768 - 1024)
+        self.assertEqual(session.get_write_size(), 32768 - 1024)
+        self.assertEqual(session.get_max_open_handles(), 64)
+
+    @asynctest
+    def test_read_write_limits(self):
+        sftp = yield from self.start_sftp()
+        session = yield from self.set_limits(sftp, 0, 4096, 1 << 40, 0)
+
+        self.assertEqual(session.get_read_size(), 4096)
+        self.assertEqual(session.get_read_size(1024), 1024)
+        self.assertEqual(session.get_write_size(), _MAX_SFTP_BLOCK_SIZE)
+        self.assertEqual(session.get_write_size(1 << 36), 0xffffffff)
+        self.assertEqual(session.get_block_size(), 4096)
+
+    @asynctest
+    def test_limits_failed(self):
+        sftp = yield from self.start_sftp()
+        session = yield from self.set_limits(
+            sftp, SFTPError(FX_OP_UNSUPPORTED, 'limits not supported'))
+
+        self.assertEqual(session.get_read_size(), _SFTP_MAX_READ_LEN)
+        self.assertEqual(session.get_write_size(), _SFTP_MAX_WRITE_LEN)
+
+    @asynctest
+    def test_limits_not_advertised(self):
+        conn = yield from self.connect()
+        self.addCleanup(conn.close)
+
+        # pylint: disable=protected-access
+        with patch.object(SFTPServerSession, '_extensions',
+                          [ext for ext in SFTPServerSession._extensions
+                           if ext[0] != b'limits@openssh.com']):
+            sftp = yield from conn.start_sftp_client()
+
+        session = sftp._session
+
+        self.assertFalse(session._supports_limits)
+        self.assertEqual(session.get_read_size(), _SFTP_BLOCK_SIZE)
+        self.assertEqual(session.get_read_size(1024*1024), 1024*1024)
+
+    @asynctest
+    def test_server_clamps_read(self):
+        write_file('file', 1024*1024 * b'x')
+
+        sftp = yield from self.start_sftp()
+
+        with (yield from sftp.open('file')) as f:
+            # pylint: disable=protected-access
+            data = yield from sftp._session.read(f._handle, 0, 1024*1024)
+
+        self.assertEqual(len(data), _SFTP_MAX_READ_LEN)
+
+    @asynctest
+    def test_read_blocks(self):
+        data = os.urandom(1024*1024)
+        write_file('file', data)
+
+        sftp = yield from self.start_sftp()
+
+        # pylint: disable=protected-access
+        session = sftp._session
+        read = session.read
+        lengths = []
+
+        def record_read(handle, offset, length):
+            lengths.append(length)
+            return read(handle, offset, length)
+
+        with patch.object(session, 'read', record_read):
+            with (yield from sftp.open('file', 'rb')) as f:
+                self.assertEqual((yield from f.read()), data)
+
+        self.assertEqual(max(lengths), _SFTP_MAX_READ_LEN)
+
+
+class TestSFTPTransfer(_TestSFTP):
+    data = os.urandom(200003)
+
+    def make_tree(self, path):
+        """Create a directory tree to transfer"""
+
+        os.makedirs(os.path.join(path, 'sub'))
+        write_file(os.path.join(path, 'big'), self.data)
+        write_file(os.path.join(path, 'empty'), b'')
+        write_file(os.path.join(path, 'sub', 'small'), b'hello')
+
+    def check_tree(self, path):
+        """Check that a directory tree was transferred correctly"""
+
+        self.assertEqual(read_file(os.path.join(path, 'big')), self.data)
+        self.assertEqual(read_file(os.path.join(path, 'empty')), b'')
+        self.assertEqual(read_file(os.path.join(path, 'sub', 'small')),
+                         b'hello')
+
+    @asynctest
+    def test_transfer_file(self):
+        write_file('src', self.data)
+
+        sftp = yield from self.start_sftp()
+
+        for method in (sftp.get, sftp.put, sftp.copy):
+            for block_size, max_requests in ((None, 1), (8192, 8)):
+                yield from method('src', 'dst', block_size=block_size,
+                                  max_requests=max_requests)
+
+                self.assertEqual(read_file('dst'), self.data)
+                os.remove('dst')
+
+    @asynctest
+    def test_transfer_tree(self):
+        self.make_tree('src')
+
+        sftp = yield from self.start_sftp()
+
+        for method in (sftp.get, sftp.put, sftp.copy):
+            dst = 'dst_' + method.__name__
+
+            yield from method('src', dst, recurse=True, block_size=8192,
+                              max_requests=4)
+
+            self.check_tree(dst)
+
+    @asynctest
+    def test_transfer_parallel(self):
+        os.mkdir('src')
+
+        for i in range(10):
+            write_file(os.path.join('src', 'file%d' % i), self.data[i:])
+
+        sftp = yield from self.start_sftp()
+
+        for method in (sftp.mget, sftp.mput, sftp.mcopy):
+            dst = 'dst_' + method.__name__
+            os.mkdir(dst)
+
+            yield from method('src/file*', dst, block_size=8192,
+                              max_parallel_files=4)
+
+            for i in range(10):
+                self.assertEqual(read_file(os.path.join(dst, 'file%d' % i)),
+                                 self.data[i:])
+
+    @asynctest
+    def test_transfer_parallel_errors(self):
+        os.makedirs(os.path.join('src', 'subdir'))
+        os.mkdir('dst')
+
+        for i in range(4):
+            write_file(os.path.join('src', 'file%d' % i), self.data)
+
+        paths = [os.path.join('src', name)
+                 for name in ('file0', 'file1', 'subdir', 'file2', 'file3')]
+        errors = []
+
+        sftp = yield from self.start_sftp()
+        yield from sftp.get(paths, 'dst', max_parallel_files=4,
+                            error_handler=errors.append)
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(sorted(os.listdir('dst')),
+                         ['file0', 'file1', 'file2', 'file3'])
+
+
+class TestSFTPCopyData(_TestSFTP):
+    def setUp(self):
+        super().setUp()
+
+        self.data = os.urandom(300000)
+        write_file('src', self.data)
+
+        self.reads = 0
+
+    @asyncio.coroutine
+    def start_sftp(self, **kwargs):
+        sftp = yield from super().start_sftp(**kwargs)
+
+        # pylint: disable=protected-access
+        session = sftp._session
+        read = session.read
+
+        def record_read(handle, offset, length):
+            self.reads += 1
+            return read(handle, offset, length)
+
+        patcher = patch.object(session, 'read', record_read)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return sftp
+
+    @asynctest
+    def test_copy_on_server(self):
+        sftp = yield from self.start_sftp()
+
+        yield from sftp.copy('src', 'dst')
+
+        self.assertEqual(read_file('dst'), self.data)
+        self.assertEqual(self.reads, 0)
+
+    @asynctest
+    def test_copy_unsupported(self):
+        sftp = yield from self.start_sftp()
+
+        # pylint: disable=protected-access
+        sftp._session._supports_copy_data = False
+
+        yield from sftp.copy('src', 'dst')
+
+        self.assertEqual(read_file('dst'), self.data)
+        self.assertGreater(self.reads, 0)
+
+    @asynctest
+    def test_copy_rejected(self):
+        sftp = yield from self.start_sftp()
+
+        def copy_data(*args):
+            raise SFTPError(FX_OP_UNSUPPORTED, 'copy-data not supported')
+
+        # pylint: disable=protected-access
+        with patch.object(sftp._session, 'copy_data', copy_data):
+            yield from sftp.copy('src', 'dst')
+
+        self.assertEqual(read_file('dst'), self.data)
+        self.assertGreater(self.reads, 0)
+
+    @asynctest
+    def test_copy_range(self):
+        sftp = yield from self.start_sftp()
+
+        with (yield from sftp.open('src')) as src:
+            with (yield from sftp.open('dst', 'wb')) as dst:
+                # pylint: disable=protected-access
+                yield from sftp._session.copy_data(src._handle, 1000, 5000,
+                                                   dst._handle, 10)
+
+        self.assertEqual(read_file('dst'), 10 * b'\0' + self.data[1000:6000])
+
+    @asynctest
+    def test_copy_same_file(self):
+        sftp = yield from self.start_sftp()
+
+        with (yield from sftp.open('src', 'r+b')) as f:
+            # pylint: disable=protected-access
+            handle = f._handle
+
+            yield from sftp._session.copy_data(handle, 0, 1000,
+                                               handle, 1000)
+
+            for offset, length in ((0, 1001), (999, 2), (1004, 5),
+                                   (500, 0)):
+                with self.assertRaises(SFTPError) as exc:
+                    yield from sftp._session.copy_data(handle, offset,
+                                                       length, handle, 1000)
+
+                self.assertEqual(exc.exception.code, FX_FAILURE)
+
+        self.assertEqual(read_file('src'),
+                         2 * self.data[:1000] + self.data[2000:])
+
+
+class TestSFTPScandir(_TestSFTP):
+    def setUp(self):
+        super().setUp()
+
+        os.mkdir('dir')
+
+        for i in range(250):
+            write_file(os.path.join('dir', 'f%03d' % i), b'')
+
+        self.requests = []
+
+    @asyncio.coroutine
+    def start_sftp(self, **kwargs):
+        sftp = yield from super().start_sftp(**kwargs)
+
+        # pylint: disable=protected-access
+        session = sftp._session
+        readdir, close = session.readdir, session.close
+
+        def record_readdir(handle):
+            self.requests.append('readdir')
+            return readdir(handle)
+
+        def record_close(handle):
+            self.requests.append('close')
+            return close(handle)
+
+        patcher = patch.multiple(session, readdir=record_readdir,
+                                 close=record_close)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return sftp
+
+    @asynctest
+    def test_scandir(self):
+        sftp = yield from self.start_sftp()
+        scanner = sftp.scandir('dir')
+
+        names = yield from scanner.read_batch()
+
+        # The request for the next batch is sent before the first
+        # batch is returned
+        self.assertEqual(self.requests, ['readdir', 'readdir'])
+
+        while True:
+            batch = yield from scanner.read_batch()
+            if not batch:
+                break
+
+            names.extend(batch)
+
+        filenames = [name.filename for name in names]
+        self.assertEqual(sorted(filenames), sorted(os.listdir('dir')))
+        self.assertEqual(self.requests[-1], 'close')
+
+    @asynctest
+    def test_scandir_next(self):
+        sftp = yield from self.start_sftp()
+        scanner = sftp.scandir(b'dir')
+
+        name = yield from scanner.__anext__()
+        self.assertIsInstance(name.filename, bytes)
+
+        yield from scanner.close()
+
+    @asynctest
+    def test_early_close(self):
+        sftp = yield from self.start_sftp()
+        scanner = sftp.scandir('dir')
+
+        self.assertTrue((yield from scanner.read_batch()))
+
+        yield from scanner.close()
+
+        self.assertEqual(self.requests, ['readdir', 'readdir', 'close'])
+        self.assertEqual((yield from scanner.read_batch()), [])
+        self.assertEqual(len(self.requests), 3)
+
+    @asynctest
+    def test_close_unopened(self):
+        sftp = yield from self.start_sftp()
+        scanner = sftp.scandir('dir')
+
+        yield from scanner.close()
+
+        self.assertEqual(self.requests, [])
+
+
+class TestSFTPGlob(_TestSFTP):
+    def setUp(self):
+        super().setUp()
+
+        for host in range(3):
+            for day in range(2):
+                path = os.path.join('logs', 'h%d' % host, 'd%d' % day)
+                os.makedirs(path)
+
+                for i in range(2):
+                    write_file(os.path.join(path, 'f%d.gz' % i), b'')
+
+                write_file(os.path.join(path, 'x.txt'), b'')
+
+            write_file(os.path.join('logs', 'h%d' % host, 'file'), b'')
+
+    @asynctest
+    def test_glob(self):
+        sftp = yield from self.start_sftp()
+
+        for pattern in ('logs/*/*/*.gz', 'logs/h?/d1/*', 'logs/h[02]/file',
+                        'logs/h1/d0/x.txt'):
+            result = yield from sftp.glob(pattern)
+            self.assertEqual(sorted(result), sorted(glob.glob(pattern)))
+
+    @asynctest
+    def test_glob_multiple(self):
+        sftp = yield from self.start_sftp()
+
+        result = yield from sftp.glob([b'logs/h1/d*', 'logs/h?/file'])
+
+        self.assertEqual(sorted(result[:2]),
+                         [b'logs/h1/d0', b'logs/h1/d1'])
+        self.assertEqual(sorted(result[2:]),
+                         ['logs/h0/file', 'logs/h1/file', 'logs/h2/file'])
+
+    @asynctest
+    def test_glob_no_match(self):
+        sftp = yield from self.start_sftp()
+
+        with self.assertRaises(SFTPError):
+            yield from sftp.glob('logs/*/none*')
+
+        errors = []
+        result = yield from sftp.glob(['missing/*', 'logs/h0/file'],
+                                      error_handler=errors.append)
+
+        self.assertEqual(result, ['logs/h0/file'])
+        self.assertEqual(len(errors), 1)
+
+
+    @asynctest
+    def test_glob_local(self):
+        sftp = yield from self.start_sftp()
+        stats = []
+
+        def record_stat(func):
+            def _stat(path, *args, **kwargs):
+                stats.append(os.fsdecode(path))
+                return func(path, *args, **kwargs)
+
+            return _stat
+
+        # Only the names which match are checked to see if they are
+        # directories
+        with patch('os.stat', record_stat(os.stat)):
+            with patch('os.lstat', record_stat(os.lstat)):
+                # pylint: disable=protected-access
+                result = yield from sftp._begin_glob(
+                    sftp._local_fs, 'logs/h[01]/d*/*.gz', None)
+
+        self.assertEqual(sorted(result),
+                         sorted(glob.glob('logs/h[01]/d*/*.gz')))
+        self.assertEqual(sorted(stats),
+                         ['logs', 'logs/h0', 'logs/h0/d0', 'logs/h0/d1',
+                          'logs/h1', 'logs/h1/d0', 'logs/h1/d1'])
+
+    @asynctest
+    def test_glob_open_handles(self):
+        sftp = yield from self.start_sftp()
+
+        # pylint: disable=protected-access
+        session = sftp._session
+        session._max_open_handles = 2
+
+        opendir = session.opendir
+        close = session.close
+        handles = set()
+        counts = []
+
+        @asyncio.coroutine
+        def record_opendir(path):
+            handle = yield from opendir(path)
+            handles.add(handle)
+            counts.append(len(handles))
+            return handle
+
+        def record_close(handle):
+            handles.discard(handle)
+            return close(handle)
+
+        with patch.multiple(session, opendir=record_opendir,
+                            close=record_close):
+            result = yield from sftp.glob('logs/*/*/*.gz')
+
+        self.assertEqual(len(result), 12)
+        self.assertEqual(max(counts), 2)
+
+
+class TestSFTPSync(_TestSFTP):
+    directions = ('get', 'put', 'copy')
+
+    def setUp(self):
+        super().setUp()
+
+        os.makedirs(os.path.join('src', 'a', 'b'))
+
+        for path in ('x', 'a/y', 'a/b/z'):
+            write_file(os.path.join('src', path), 1000 * path.encode())
+
+        os.symlink('x', os.path.join('src', 'link'))
+
+    def check_tree(self, dst):
+        """Check that a destination tree matches the source"""
+
+        for path in ('x', 'a/y', 'a/b/z'):
+            self.assertEqual(read_file(os.path.join(dst, path)),
+                             read_file(os.path.join('src', path)))
+
+        self.assertEqual(os.readlink(os.path.join(dst, 'link')), 'x')
+
+    @asynctest
+    def test_sync(self):
+        sftp = yield from self.start_sftp()
+
+        for direction in self.directions:
+            dst = 'dst_' + direction
+
+            yield from sftp.sync('src', dst, direction=direction)
+            self.check_tree(dst)
+
+            write_file(os.path.join('src', 'a', 'new'), b'new')
+
+            yield from sftp.sync('src', dst, direction=direction,
+                                 max_parallel_files=4)
+            self.check_tree(dst)
+            self.assertEqual(read_file(os.path.join(dst, 'a', 'new')),
+                             b'new')
+
+            os.remove(os.path.join('src', 'a', 'new'))
+
+    @asynctest
+    def test_sync_unchanged(self):
+        sftp = yield from self.start_sftp()
+
+        for direction in self.directions:
+            dst = 'dst_' + direction
+
+            yield from sftp.sync('src', dst, direction=direction)
+            ctime = os.stat(os.path.join(dst, 'x')).st_ctime_ns
+
+            yield from asyncio.sleep(0.01, loop=self.loop)
+            yield from sftp.sync('src', dst, direction=direction)
+
+            self.assertEqual(os.stat(os.path.join(dst, 'x')).st_ctime_ns,
+                             ctime)
+
+    @asynctest
+    def test_sync_same_size_and_time(self):
+        sftp = yield from self.start_sftp()
+
+        for direction in self.directions:
+            dst = 'dst_' + direction
+            dstfile = os.path.join(dst, 'a', 'y')
+
+            yield from sftp.sync('src', dst, direction=direction)
+
+            srcattrs = os.stat(os.path.join('src', 'a', 'y'))
+            write_file(dstfile, 1000 * b'A/Y')
+            os.utime(dstfile, ns=(srcattrs.st_atime_ns, srcattrs.st_mtime_ns))
+
+            # By default, only the size and modification time are checked
+            yield from sftp.sync('src', dst, direction=direction)
+            self.assertEqual(read_file(dstfile), 1000 * b'A/Y')
+
+            yield from sftp.sync('src', dst, direction=direction,
+                                 checksum=True)
+            self.check_tree(dst)
+
+    @asynctest
+    def test_sync_type_changed(self):
+        sftp = yield from self.start_sftp()
+
+        for direction in self.directions:
+            dst = 'dst_' + direction
+
+            yield from sftp.sync('src', dst, direction=direction)
+
+            os.remove(os.path.join(dst, 'x'))
+            os.makedirs(os.path.join(dst, 'x', 'sub'))
+            write_file(os.path.join(dst, 'x', 'sub', 'file'), b'')
+
+            shutil.rmtree(os.path.join(dst, 'a'))
+            write_file(os.path.join(dst, 'a'), b'')
+
+            os.remove(os.path.join(dst, 'link'))
+            os.mkdir(os.path.join(dst, 'link'))
+
+            yield from sftp.sync('src', dst, direction=direction)
+            self.check_tree(dst)
+
+    @asynctest
+    def test_sync_delete(self):
+        sftp = yield from self.start_sftp()
+
+        for direction in self.directions:
+            dst = 'dst_' + direction
+
+            yield from sftp.sync('src', dst, direction=direction)
+
+            os.makedirs(os.path.join(dst, 'extra', 'sub'))
+            write_file(os.path.join(dst, 'extra', 'sub', 'file'), b'')
+            write_file(os.path.join(dst, 'a', 'extra'), b'')
+
+            yield from sftp.sync('src', dst, direction=direction)
+            self.assertTrue(os.path.exists(os.path.join(dst, 'extra')))
+            self.assertTrue(os.path.exists(os.path.join(dst, 'a', 'extra')))
+
+            yield from sftp.sync('src', dst, direction=direction, delete=True)
+            self.check_tree(dst)
+            self.assertEqual(sorted(os.listdir(dst)),
+                             sorted(os.listdir('src')))
+            self.assertEqual(sorted(os.listdir(os.path.join(dst, 'a'))),
+                             ['b', 'y'])
+
+
+_write_offsets = []
+
+
+class _RecordingServer(_FileServer):
+    """SFTP server which records the offsets of writes"""
+
+    def write(self, file_obj, offset, data):
+        _write_offsets.append(offset)
+        return super().write(file_obj, offset, data)
+
+
+class TestSFTPResume(_TestSFTP):
+    server_options = {'sftp_factory': _RecordingServer}
+
+    data = os.urandom(300007)
+
+    def setUp(self):
+        super().setUp()
+
+        write_file('src', self.data)
+
+    @asyncio.coroutine
+    def check_resume(self, sftp, existing):
+        """Resume transfers onto existing data in each direction"""
+
+        for method in (sftp.get, sftp.put, sftp.copy):
+            if existing is not None:
+                write_file('dst', existing)
+
+            yield from method('src', 'dst', resume=True, block_size=8192)
+
+            self.assertEqual(read_file('dst'), self.data)
+            os.remove('dst')
+
+    @asynctest
+    def test_resume_partial(self):
+        sftp = yield from self.start_sftp()
+        yield from self.check_resume(sftp, self.data[:100000])
+
+        del _write_offsets[:]
+        write_file('dst', self.data[:100000])
+
+        yield from sftp.put('src', 'dst', resume=True, block_size=8192)
+
+        self.assertEqual(read_file('dst'), self.data)
+        self.assertEqual(min(_write_offsets), 100000)
+
+    @asynctest
+    def test_resume_changed_tail(self):
+        sftp = yield from self.start_sftp()
+        yield from self.check_resume(sftp,
+                                     self.data[:99990] + 10 * b'\0')
+
+    @asynctest
+    def test_resume_changed_prefix(self):
+        existing = bytearray(self.data[:100000])
+        existing[10:20] = 10 * b'\0'
+
+        sftp = yield from self.start_sftp()
+        yield from self.check_resume(sftp, bytes(existing))
+
+    @asynctest
+    def test_resume_larger(self):
+        sftp = yield from self.start_sftp()
+        yield from self.check_resume(sftp, self.data + b'extra')
+
+    @asynctest
+    def test_resume_complete(self):
+        sftp = yield from self.start_sftp()
+        yield from self.check_resume(sftp, self.data)
+
+    @asynctest
+    def test_resume_missing(self):
+        sftp = yield from self.start_sftp()
+        yield from self.check_resume(sftp, None)
+
+
+class TestSFTPHash(_TestSFTP):
+    data = os.urandom(100000)
+
+    def setUp(self):
+        super().setUp()
+
+        write_file('src', self.data)
+        write_file('empty', b'')
+
+    def block_hashes(self, alg, start, end, block_size):
+        """Return local hashes of blocks of the test data"""
+
+        return [hashlib.new(alg, self.data[i:min(i+block_size, end)]).digest()
+                for i in range(start, end, block_size)]
+
+    @asynctest
+    def test_check_file(self):
+        sftp = yield from self.start_sftp()
+
+        alg, hashes = yield from sftp.check_file('src')
+        self.assertEqual(alg, 'sha256')
+        self.assertEqual(hashes, [hashlib.sha256(self.data).digest()])
+
+        alg, hashes = yield from sftp.check_file('empty', block_size=256)
+        self.assertEqual(hashes, [hashlib.sha256().digest()])
+
+    @asynctest
+    def test_check_file_blocks(self):
+        sftp = yield from self.start_sftp()
+
+        alg, hashes = yield from sftp.check_file('src', ['md5'], 10, 5000,
+                                                 1024)
+
+        self.assertEqual(alg, 'md5')
+        self.assertEqual(hashes, self.block_hashes('md5', 10, 5010, 1024))
+
+    @asynctest
+    def test_check_file_handle(self):
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('src', 'rb')
+
+        alg, hashes = yield from f.check_file(['sha1'], block_size=30000)
+
+        self.assertEqual(alg, 'sha1')
+        self.assertEqual(hashes,
+                         self.block_hashes('sha1', 0, len(self.data), 30000))
+
+        yield from f.close()
+
+    @asynctest
+    def test_check_file_errors(self):
+        sftp = yield from self.start_sftp()
+
+        with self.assertRaises(SFTPError):
+            yield from sftp.check_file('src', ['unknown'])
+
+        with self.assertRaises(SFTPError):
+            yield from sftp.check_file('src', block_size=10)
+
+        with self.assertRaises(SFTPError):
+            yield from sftp.check_file('missing')
+
+
+_stats = []
+
+
+class _CountingServer(_FileServer):
+    """SFTP server which records the paths it is asked for attributes of"""
+
+    def stat(self, path):
+        _stats.append(path)
+        return super().stat(path)
+
+    def lstat(self, path):
+        _stats.append(path)
+        return super().lstat(path)
+
+
+class TestSFTPAttrCache(_TestSFTP):
+    server_options = {'sftp_factory': _CountingServer}
+
+    def setUp(self):
+        super().setUp()
+
+        os.mkdir('dir')
+        write_file(os.path.join('dir', 'file'), b'data')
+
+        del _stats[:]
+
+    @asynctest
+    def test_cached(self):
+        sftp = yield from self.start_sftp(attr_cache_ttl=60)
+
+        self.assertTrue((yield from sftp.isdir('dir')))
+        self.assertTrue((yield from sftp.exists('dir')))
+        self.assertFalse((yield from sftp.isfile('dir')))
+
+        self.assertEqual(_stats, [b'dir'])
+
+    @asynctest
+    def test_not_cached_by_default(self):
+        sftp = yield from self.start_sftp()
+
+        yield from sftp.isdir('dir')
+        yield from sftp.isdir('dir')
+
+        self.assertEqual(_stats, [b'dir', b'dir'])
+
+    @asynctest
+    def test_readdir_seeds_cache(self):
+        sftp = yield from self.start_sftp(attr_cache_ttl=60)
+
+        yield from sftp.readdir('dir')
+
+        self.assertEqual((yield from sftp.getsize('dir/file')), 4)
+        self.assertTrue((yield from sftp.isfile('dir/file')))
+        self.assertEqual(_stats, [])
+
+    @asynctest
+    def test_invalidate_on_write(self):
+        sftp = yield from self.start_sftp(attr_cache_ttl=60)
+
+        self.assertEqual((yield from sftp.getsize('dir/file')), 4)
+
+        with (yield from sftp.open('dir/file', 'ab')) as f:
+            yield from f.write(b'more')
+
+        self.assertEqual((yield from sftp.getsize('dir/file')), 8)
+
+    @asynctest
+    def test_invalidate_on_setstat(self):
+        sftp = yield from self.start_sftp(attr_cache_ttl=60)
+
+        attrs = yield from sftp.stat('dir/file')
+        yield from sftp.chmod('dir/file', 0o600)
+
+        self.assertNotEqual(attrs.permissions & 0o777, 0o600)
+        self.assertEqual((yield from sftp.stat('dir/file')).permissions &
+                         0o777, 0o600)
+
+    @asynctest
+    def test_invalidate_on_rename(self):
+        sftp = yield from self.start_sftp(attr_cache_ttl=60)
+
+        yield from sftp.readdir('dir')
+        yield from sftp.rename('dir', 'moved')
+
+        self.assertFalse((yield from sftp.exists('dir/file')))
+        self.assertTrue((yield from sftp.exists('moved/file')))
+
+    @asynctest
+    def test_invalidate_on_remove(self):
+        sftp = yield from self.start_sftp(attr_cache_ttl=60)
+
+        self.assertTrue((yield from sftp.exists('dir/file')))
+        yield from sftp.remove('dir/file')
+        self.assertFalse((yield from sftp.exists('dir/file')))
+
+
+class TestSFTPAttrCacheExpiry(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+
+        patcher = patch('time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ttl(self):
+        cache = _SFTPAttrCache(10, 100)
+        attrs = SFTPAttrs(size=1)
+
+        cache.add(b'file', True, attrs)
+        self.assertIs(cache.get(b'file', True), attrs)
+        self.assertIsNone(cache.get(b'file', False))
+
+        self.now += 9
+        self.assertIs(cache.get(b'file', True), attrs)
+
+        self.now += 1
+        self.assertIsNone(cache.get(b'file', True))
+
+    def test_lru(self):
+        cache = _SFTPAttrCache(10, 2)
+
+        for path in (b'a', b'b'):
+            cache.add(path, True, SFTPAttrs())
+
+        # Using an entry keeps it from being the next one evicted
+        self.assertIsNotNone(cache.get(b'a', True))
+
+        cache.add(b'c', True, SFTPAttrs())
+
+        self.assertIsNotNone(cache.get(b'a', True))
+        self.assertIsNone(cache.get(b'b', True))
+        self.assertIsNotNone(cache.get(b'c', True))
+
+    def test_invalidate_subtree(self):
+        cache = _SFTPAttrCache(10, 100)
+
+        for path in (b'dir', b'dir/a', b'dir/a/b', b'dir2'):
+            cache.add(path, False, SFTPAttrs())
+
+        cache.invalidate(b'dir/', subtree=True)
+
+        self.assertIsNone(cache.get(b'dir/a', False))
+        self.assertIsNone(cache.get(b'dir/a/b', False))
+        self.assertIsNotNone(cache.get(b'dir', False))
+        self.assertIsNotNone(cache.get(b'dir2', False))
+
+        cache.invalidate(b'dir')
+        self.assertIsNone(cache.get(b'dir', False))
+
+    def test_add_names(self):
+        cache = _SFTPAttrCache(10, 100)
+
+        names = [SFTPName(b'.', attrs=SFTPAttrs(permissions=0o40755)),
+                 SFTPName(b'file', attrs=SFTPAttrs(permissions=0o100644)),
+                 SFTPName(b'link', attrs=SFTPAttrs(permissions=0o120777)),
+                 SFTPName(b'unknown', attrs=SFTPAttrs())]
+
+        cache.add_names(b'dir', names)
+
+        self.assertIsNone(cache.get(b'dir/.', False))
+        self.assertIsNotNone(cache.get(b'dir/file', False))
+        self.assertIsNotNone(cache.get(b'dir/file', True))
+        self.assertIsNotNone(cache.get(b'dir/link', False))
+        self.assertIsNone(cache.get(b'dir/link', True))
+        self.assertIsNone(cache.get(b'dir/unknown', False))
+
+
+class _FramingSession(SFTPSession):
+    """SFTP session which records the packets it receives"""
+
+    def __init__(self):
+        super().__init__()
+        self.packets = []
+
+    def _recv_packet(self, data):
+        self.packets.append(data)
+
+
+def _frame(*payloads):
+    """Build the SFTP packets for a list of payloads"""
+
+    return b''.join(UInt32(len(payload)) + payload for payload in payloads)
+
+
+class TestSFTPFraming(unittest.TestCase):
+    def setUp(self):
+        self.session = _FramingSession()
+
+    def feed(self, *pieces):
+        """Deliver data to the session in the pieces given"""
+
+        for piece in pieces:
+            self.session.data_received(piece, None)
+
+    def assertPackets(self, payloads):
+        """Check the packets received, after all data has arrived"""
+
+        self.assertEqual([bytes(packet) for packet in self.session.packets],
+                         list(payloads))
+
+    def test_whole_packets(self):
+        payloads = [b'\x01abc', b'\x02', b'\x03' + 1000 * b'x']
+
+        self.feed(_frame(*payloads))
+
+        self.assertPackets(payloads)
+
+    def test_split_everywhere(self):
+        payloads = [b'\x01abc', b'\x02defgh', b'\x03']
+        data = _frame(*payloads)
+
+        for split in range(1, len(data)):
+            self.session = _FramingSession()
+            self.feed(data[:split], b'', data[split:])
+
+            self.assertPackets(payloads)
+
+    def test_byte_at_a_time(self):
+        payloads = [b'\x01abc', b'\x02defgh', b'\x03']
+        data = _frame(*payloads)
+
+        self.feed(*(data[i:i+1] for i in range(len(data))))
+
+        self.assertPackets(payloads)
+
+    def test_large_packet(self):
+        payload = b'\x67' + os.urandom(300000)
+        data = _frame(payload, b'\x01next')
+
+        self.feed(*(data[i:i+32768] for i in range(0, len(data), 32768)))
+
+        self.assertPackets([payload, b'\x01next'])
+
+    def test_partial_then_more(self):
+        # A delivery completing one packet can also carry the start of
+        # the next, which must be kept while earlier views stay intact
+        data = _frame(b'\x01first', b'\x02second', b'\x03third')
+
+        self.feed(data[:6], data[6:20], data[20:])
+
+        self.assertPackets([b'\x01first', b'\x02second', b'\x03third'])
+
+        # pylint: disable=protected-access
+        self.assertEqual(self.session._inpbuf, b'')
+
+
+class TestSFTPLocalFile(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self.tempdir = tempfile.mkdtemp()
+        os.chdir(self.tempdir)
+
+        self.loop = asyncio.new_event_loop()
+        self.fs = _LocalFS(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+        os.chdir(self._cwd)
+        shutil.rmtree(self.tempdir)
+
+    def run_coro(self, coro):
+        """Run a coroutine on the test's event loop"""
+
+        return self.loop.run_until_complete(coro)
+
+    def test_append(self):
+        write_file('file', b'start\n')
+
+        with self.run_coro(self.fs.open('file', 'ab')) as f:
+            self.run_coro(f.write(b'middle\n', 0))
+            self.run_coro(f.write(b'end\n', 0))
+
+        self.assertEqual(read_file('file'), b'start\nmiddle\nend\n')
+
+    def test_executor(self):
+        calls = []
+
+        class _RecordingExecutor(ThreadPoolExecutor):
+            """Thread pool which records the calls submitted to it"""
+
+            def submit(self, fn, *args, **kwargs):
+                calls.append(fn)
+                return super().submit(fn, *args, **kwargs)
+
+        self.loop.set_default_executor(_RecordingExecutor(2))
+
+        write_file('file', b'data')
+
+        self.assertTrue(self.run_coro(self.fs.isfile('file')))
+        self.assertEqual(self.run_coro(self.fs.getsize('file')), 4)
+        self.assertEqual(self.run_coro(self.fs.listdir('.')), ['file'])
+
+        with self.run_coro(self.fs.open('file', 'rb')) as f:
+            self.assertEqual(self.run_coro(f.read(4, 0)), b'data')
+
+        self.assertEqual(len(calls), 5)
+
+    def test_parallel_io(self):
+        blocks = [1000 * bytes((i,)) for i in range(50)]
+
+        with self.run_coro(self.fs.open('file', 'wb')) as f:
+            self.run_coro(asyncio.gather(
+                *(f.write(block, i * 1000) for i, block in enumerate(blocks)),
+                loop=self.loop))
+
+        self.assertEqual(read_file('file'), b''.join(blocks))
+
+        with self.run_coro(self.fs.open('file', 'rb')) as f:
+            result = self.run_coro(asyncio.gather(
+                *(f.read(1000, i * 1000) for i in range(50)),
+                loop=self.loop))
+
+        self.assertEqual(result, blocks)
+
+    def test_sequential_io(self):
+        with self.run_coro(self.fs.open('file', 'w')) as f:
+            self.run_coro(f.write('abc'))
+            self.run_coro(f.write('def'))
+            self.assertEqual(self.run_coro(f.tell()), 6)
+
+        with self.run_coro(self.fs.open('file', 'r')) as f:
+            self.assertEqual(self.run_coro(f.read(2)), 'ab')
+            self.run_coro(f.seek(3))
+            self.assertEqual(self.run_coro(f.read()), 'def')
+
+    def test_close_while_writing(self):
+        data = os.urandom(100000)
+
+        f = self.run_coro(self.fs.open('file', 'wb'))
+        write = asyncio.async(f.write(data, 0), loop=self.loop)
+
+        # The file stays open until the outstanding write completes
+        self.run_coro(f.close())
+        self.assertEqual(self.run_coro(write), len(data))
+        self.assertEqual(read_file('file'), data)
+
+        with self.assertRaises(ValueError):
+            self.run_coro(f.write(b'more', 0))
+
+    def test_readdir(self):
+        os.mkdir('dir')
+        write_file(os.path.join('dir', 'file'), b'data')
+        os.symlink('file', os.path.join('dir', 'link'))
+
+        names = self.run_coro(self.fs.readdir(b'dir'))
+        attrs = {name.filename: name.attrs for name in names}
+
+        self.assertEqual(sorted(attrs), [b'file', b'link'])
+        self.assertEqual(attrs[b'file'].size, 4)
+        self.assertTrue(stat.S_ISLNK(attrs[b'link'].permissions))
@@ -0,0 +1,1115 @@
+# Copyright (c) 2015 by Ron Frederick <ronf@timeheart.net>.
+# All rights reserved.
+#
+# This program and the accompanying materials are made available under
+# the terms of the Eclipse Public License v1.0 which accompanies this
+# distribution and is available at:
+#
+#     http://www.eclipse.org/legal/epl-v10.html
+#
+# Contributors:
+#     Ron Frederick - initial implementation, API, and documentation
+
+"""Unit tests for SFTP server request handling"""
+
+import asyncio
+import functools
+import io
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from asyncssh import SFTPError, SFTPServer, SFTPThreadedServer
+from asyncssh import SSHServerChannel
+from asyncssh import FX_EOF, FX_FAILURE, FX_NO_SUCH_FILE
+from asyncssh import FX_OP_UNSUPPORTED
+
+from asyncssh.sftp import SFTPServerSession
+from asyncssh.sftp import _SFTPDirScanner, _SFTPRequestOrder
+from asyncssh.sftp import _SFTPThreadedDirScanner
+from asyncssh.sftp import _supports_pio
+
+from .util import ServerTestCase, asynctest, read_file, write_file
+
+
+class _AsyncServer(SFTPServer):
+    """SFTP server whose methods are all coroutines"""
+
+    @asyncio.coroutine
+    def open(self, path, mode, attrs):
+        yield from asyncio.sleep(0)
+        return super().open(path, mode, attrs)
+
+    @asyncio.coroutine
+    def close(self, file_obj):
+        yield from asyncio.sleep(0)
+        return super().close(file_obj)
+
+    @asyncio.coroutine
+    def read(self, file_obj, offset, size):
+        yield from asyncio.sleep(0)
+        return super().read(file_obj, offset, size)
+
+    @asyncio.coroutine
+    def write(self, file_obj, offset, data):
+        yield from asyncio.sleep(0)
+        return super().write(file_obj, offset, data)
+
+    @asyncio.coroutine
+    def stat(self, path):
+        yield from asyncio.sleep(0)
+
+        try:
+            return super().stat(path)
+        except FileNotFoundError:
+            raise SFTPError(FX_NO_SUCH_FILE, 'No such file')
+
+    @asyncio.coroutine
+    def lstat(self, path):
+        yield from asyncio.sleep(0)
+        return super().lstat(path)
+
+    @asyncio.coroutine
+    def listdir(self, path):
+        yield from asyncio.sleep(0)
+        return super().listdir(path)
+
+    @asyncio.coroutine
+    def mkdir(self, path, attrs):
+        yield from asyncio.sleep(0)
+        return super().mkdir(path, attrs)
+
+
+class _BrokenServer(SFTPServer):
+    """SFTP server whose methods fail in unexpected ways"""
+
+    def stat(self, path):
+        raise ValueError('Bad stat')
+
+    def lstat(self, path):
+        raise KeyError()
+
+    @asyncio.coroutine
+    def open(self, path, mode, attrs):
+        yield from asyncio.sleep(0)
+        raise RuntimeError('Bad open')
+
+    def mkdir(self, path, attrs):
+        raise NotImplementedError
+
+
+_events = []
+_gates = {}
+
+
+class _GatedServer(SFTPServer):
+    """SFTP server which records the order requests are started in
+
+       Tests can hold a request in the server by adding an event for
+       it to ``_gates``, so that they can check which other requests
+       are able to run while it is outstanding.
+
+    """
+
+    @asyncio.coroutine
+    def _start(self, *event):
+        """Record a request being started and wait for its gate"""
+
+        _events.append(event)
+
+        gate = _gates.get(event)
+        if gate:
+            yield from gate.wait()
+
+    @asyncio.coroutine
+    def open(self, path, mode, attrs):
+        yield from self._start('open', path)
+        return super().open(path, mode, attrs)
+
+    @asyncio.coroutine
+    def close(self, file_obj):
+        yield from self._start('close')
+        return super().close(file_obj)
+
+    @asyncio.coroutine
+    def read(self, file_obj, offset, size):
+        yield from self._start('read', offset)
+        return super().read(file_obj, offset, size)
+
+    @asyncio.coroutine
+    def write(self, file_obj, offset, data):
+        yield from self._start('write', offset)
+        return super().write(file_obj, offset, data)
+
+    @asyncio.coroutine
+    def stat(self, path):
+        yield from self._start('stat', path)
+        return super().stat(path)
+
+    @asyncio.coroutine
+    def mkdir(self, path, attrs):
+        yield from self._start('mkdir', path)
+        return super().mkdir(path, attrs)
+
+
+_threads = set()
+
+
+class _ThreadedServer(SFTPThreadedServer):
+    """Threaded SFTP server which records the threads paths are mapped in"""
+
+    def map_path(self, path):
+        _threads.add(threading.current_thread())
+        return super().map_path(path)
+
+    @asyncio.coroutine
+    def stat(self, path):
+        try:
+            return (yield from super().stat(path))
+        except FileNotFoundError:
+            raise SFTPError(FX_NO_SUCH_FILE, 'No such file')
+
+
+class _CountingExecutor(ThreadPoolExecutor):
+    """Thread pool which counts the calls submitted to it"""
+
+    def __init__(self, max_workers):
+        super().__init__(max_workers)
+        self.count = 0
+
+    def submit(self, *args, **kwargs):
+        self.count += 1
+        return super().submit(*args, **kwargs)
+
+
+_executor = _CountingExecutor(2)
+
+
+_blocked = threading.Event()
+_unblock = threading.Event()
+_file_events = []
+
+
+class _BlockingServer(SFTPThreadedServer):
+    """Threaded SFTP server whose calls block until a test releases them
+
+       Reads and opens of paths ending in "block" wait in the thread
+       pool until ``_unblock`` is set, so that tests can disconnect
+       while they're in progress.
+
+    """
+
+    @staticmethod
+    def _block():
+        """Block the calling thread until the test releases it"""
+
+        _blocked.set()
+        _unblock.wait()
+
+    def map_path(self, path):
+        if path.endswith(b'block'):
+            self._block()
+
+        return super().map_path(path)
+
+    @asyncio.coroutine
+    def read(self, file_obj, offset, size):
+        def blocking_read():
+            """Read from the file once the test releases the read"""
+
+            self._block()
+            _file_events.append(('read', file_obj.closed))
+            return SFTPServer.read(self, file_obj, offset, size)
+
+        # pylint: disable=protected-access
+        return (yield from self._run_file(file_obj, blocking_read))
+
+    @asyncio.coroutine
+    def close(self, file_obj):
+        yield from super().close(file_obj)
+        _file_events.append(('close', file_obj.closed))
+
+
+def _filter_names(names):
+    """Hide names ending in zero from a directory listing"""
+
+    return [name for name in names if not name.endswith(b'0')]
+
+
+class _FilteringServer(SFTPServer):
+    """SFTP server which filters the names returned by listdir"""
+
+    def listdir(self, path):
+        return _filter_names(super().listdir(path))
+
+
+class _ThreadedFilteringServer(SFTPThreadedServer):
+    """Threaded SFTP server which filters the names returned by listdir"""
+
+    @asyncio.coroutine
+    def listdir(self, path):
+        return _filter_names((yield from super().listdir(path)))
+
+
+class _GeneratorServer(SFTPServer):
+    """SFTP server whose listdir is a generator"""
+
+    def listdir(self, path):
+        for name in os.listdir(self.map_path(path)):
+            yield name
+
+
+class _VanishingServer(SFTPServer):
+    """SFTP server which lists names and then removes some of them"""
+
+    def listdir(self, path):
+        path = self.map_path(path)
+        names = sorted(os.listdir(path))
+
+        for name in names[:150]:
+            os.remove(os.path.join(path, name))
+
+        return names
+
+
+class _VanishingErrorServer(_VanishingServer):
+    """SFTP server which reports removed files as FX_NO_SUCH_FILE"""
+
+    def lstat(self, path):
+        try:
+            return super().lstat(path)
+        except FileNotFoundError:
+            raise SFTPError(FX_NO_SUCH_FILE, 'No such file')
+
+
+class _TestSFTPServer(ServerTestCase):
+    @asyncio.coroutine
+    def start_sftp(self):
+        """Open a connection and start an SFTP client on it"""
+
+        conn = yield from self.connect()
+        self.addCleanup(conn.close)
+
+        return (yield from conn.start_sftp_client())
+
+    @asyncio.coroutine
+    def check_append(self):
+        """Check that parallel appends all land at the end of a file"""
+
+        write_file('file', b'start\n')
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('file', 'ab')
+
+        lines = [('%d\n' % i).encode() for i in range(20)]
+
+        yield from asyncio.gather(*(f.write(line) for line in lines),
+                                  loop=self.loop)
+        yield from f.close()
+
+        result = read_file('file').splitlines(True)
+        self.assertEqual(result[0], b'start\n')
+        self.assertEqual(sorted(result[1:]), sorted(lines))
+
+
+class TestSFTPAsyncServer(_TestSFTPServer):
+    server_options = {'sftp_factory': _AsyncServer}
+
+    @asynctest
+    def test_transfers(self):
+        data = os.urandom(100003)
+
+        os.mkdir('src')
+        write_file(os.path.join('src', 'file'), data)
+
+        sftp = yield from self.start_sftp()
+
+        yield from sftp.get('src', 'got', recurse=True, block_size=8192)
+        self.assertEqual(read_file(os.path.join('got', 'file')), data)
+
+        yield from sftp.put('src', 'put', recurse=True, block_size=8192)
+        self.assertEqual(read_file(os.path.join('put', 'file')), data)
+
+        self.assertEqual((yield from sftp.listdir('src')), ['file'])
+        self.assertEqual((yield from sftp.getsize('src/file')), len(data))
+
+    @asynctest
+    def test_errors(self):
+        sftp = yield from self.start_sftp()
+
+        with self.assertRaises(SFTPError) as exc:
+            yield from sftp.stat('missing')
+
+        self.assertEqual(exc.exception.code, FX_NO_SUCH_FILE)
+
+    @asynctest
+    def test_append(self):
+        yield from self.check_append()
+
+
+class TestSFTPBrokenServer(_TestSFTPServer):
+    server_options = {'sftp_factory': _BrokenServer}
+
+    @asyncio.coroutine
+    def check_error(self, coro, code, reason):
+        """Check the error returned by a request"""
+
+        with self.assertRaises(SFTPError) as exc:
+            yield from asyncio.wait_for(coro, 5, loop=self.loop)
+
+        self.assertEqual(exc.exception.code, code)
+        self.assertEqual(exc.exception.reason, reason)
+
+    @asynctest
+    def test_unexpected_exceptions(self):
+        sftp = yield from self.start_sftp()
+
+        yield from self.check_error(sftp.stat('file'), FX_FAILURE,
+                                    'Bad stat')
+        yield from self.check_error(sftp.lstat('file'), FX_FAILURE,
+                                    'KeyError')
+        yield from self.check_error(sftp.open('file'), FX_FAILURE,
+                                    'Bad open')
+
+        # The session keeps working after these errors
+        write_file('file', b'')
+        self.assertEqual((yield from sftp.listdir('.')), ['file'])
+
+    @asynctest
+    def test_not_implemented(self):
+        sftp = yield from self.start_sftp()
+
+        yield from self.check_error(sftp.mkdir('dir'), FX_OP_UNSUPPORTED,
+                                    'Operation not supported: mkdir')
+
+
+class TestSFTPThreadedServer(_TestSFTPServer):
+    server_options = {'sftp_factory': _ThreadedServer}
+
+    @asynctest
+    def test_transfers(self):
+        data = os.urandom(300007)
+
+        os.mkdir('src')
+        write_file(os.path.join('src', 'file'), data)
+
+        sftp = yield from self.start_sftp()
+
+        for method in (sftp.get, sftp.put, sftp.copy):
+            dst = 'dst_' + method.__name__
+
+            yield from method('src', dst, recurse=True, block_size=8192,
+                              max_requests=16)
+
+            self.assertEqual(read_file(os.path.join(dst, 'file')), data)
+
+        self.assertEqual(sorted((yield from sftp.listdir('.'))),
+                         ['dst_copy', 'dst_get', 'dst_put', 'src'])
+
+        yield from sftp.rename('dst_get/file', 'dst_get/renamed')
+        yield from sftp.remove('dst_get/renamed')
+        yield from sftp.rmdir('dst_get')
+
+        self.assertFalse(os.path.exists('dst_get'))
+
+    @asynctest
+    def test_parallel_io(self):
+        write_file('file', bytes(100000))
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('file', 'rb+')
+
+        yield from asyncio.gather(*(f.write(1000 * bytes((i,)), i * 1000)
+                                    for i in range(100)), loop=self.loop)
+
+        result = yield from asyncio.gather(*(f.read(1000, i * 1000)
+                                             for i in range(100)),
+                                           loop=self.loop)
+
+        self.assertEqual(result, [1000 * bytes((i,)) for i in range(100)])
+
+        yield from f.close()
+
+    @asynctest
+    def test_threads(self):
+        write_file('file', b'')
+
+        sftp = yield from self.start_sftp()
+
+        _threads.clear()
+        yield from sftp.stat('file')
+
+        self.assertTrue(_threads)
+        self.assertNotIn(threading.current_thread(), _threads)
+
+    @asynctest
+    def test_append(self):
+        yield from self.check_append()
+
+
+class TestSFTPThreadedServerExecutor(_TestSFTPServer):
+    server_options = {
+        'sftp_factory': functools.partial(_ThreadedServer, executor=_executor,
+                                          max_threads=1)}
+
+    @asynctest
+    def test_executor(self):
+        write_file('file', 100000 * b'x')
+
+        sftp = yield from self.start_sftp()
+
+        count = _executor.count
+        yield from sftp.get('file', 'copy', block_size=8192, max_requests=8)
+
+        self.assertEqual(read_file('copy'), 100000 * b'x')
+        self.assertGreater(_executor.count, count)
+
+
+class TestSFTPThreadedServerDisconnect(_TestSFTPServer):
+    server_options = {'sftp_factory': _BlockingServer}
+
+    def setUp(self):
+        super().setUp()
+
+        _blocked.clear()
+        _unblock.clear()
+        del _file_events[:]
+
+    @asyncio.coroutine
+    def disconnect_while_blocked(self, sftp, request):
+        """Exit the SFTP session while a request is blocked in a thread"""
+
+        request = asyncio.async(request, loop=self.loop)
+
+        while not _blocked.is_set():
+            yield from asyncio.sleep(0.01, loop=self.loop)
+
+        sftp.exit()
+
+        # The server has cleaned up the session by the time the
+        # client sees the channel close
+        yield from asyncio.wait([request], loop=self.loop)
+
+        with self.assertRaises(SFTPError):
+            request.result()
+
+        yield from asyncio.sleep(0.1, loop=self.loop)
+
+        _unblock.set()
+
+    @asynctest
+    def test_close_after_read(self):
+        write_file('file', 100 * b'x')
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('file', 'rb')
+
+        yield from self.disconnect_while_blocked(sftp, f.read(10, 0))
+
+        while len(_file_events) < 2:
+            yield from asyncio.sleep(0.01, loop=self.loop)
+
+        self.assertEqual(_file_events, [('read', False), ('close', True)])
+
+    @asynctest
+    def test_cancelled_open(self):
+        closed = []
+        close = SFTPServer.close
+
+        def record_close(server, file_obj):
+            """Record files being closed by the server"""
+
+            closed.append(file_obj)
+            close(server, file_obj)
+
+        sftp = yield from self.start_sftp()
+
+        with patch.object(SFTPServer, 'close', record_close):
+            yield from self.disconnect_while_blocked(sftp,
+                                                     sftp.open('block', 'wb'))
+
+            while not closed:
+                yield from asyncio.sleep(0.01, loop=self.loop)
+
+        self.assertTrue(closed[0].closed)
+
+
+class TestSFTPPositionalIO(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def check_pio(self, mode, buffering, expected):
+        """Check whether positional I/O is used for a file"""
+
+        with open(self.path, mode, buffering) as f:
+            self.assertEqual(_supports_pio(f),
+                             expected and hasattr(os, 'pread'))
+
+    def test_supports_pio(self):
+        self.check_pio('rb', 0, True)
+        self.check_pio('rb+', 0, True)
+        self.check_pio('wb', 0, True)
+        self.check_pio('rb', -1, False)
+        self.check_pio('ab', 0, False)
+        self.check_pio('ab+', 0, False)
+
+    def test_short_writes(self):
+        class _ShortWriteFile(io.BytesIO):
+            """File which accepts at most three bytes per write"""
+
+            def write(self, data):
+                return super().write(data[:3])
+
+        f = _ShortWriteFile()
+
+        self.assertEqual(SFTPServer(None).write(f, 2, b'abcdefgh'), 8)
+        self.assertEqual(f.getvalue(), b'\0\0abcdefgh')
+
+
+class _TestSFTPReaddir(_TestSFTPServer):
+    def setUp(self):
+        super().setUp()
+
+        os.mkdir('dir')
+
+        for i in range(250):
+            write_file(os.path.join('dir', 'file%03d' % i), b'')
+
+    @asyncio.coroutine
+    def read_batches(self, sftp, path):
+        """Read a directory, returning the size of each batch of names"""
+
+        session = sftp._session # pylint: disable=protected-access
+
+        handle = yield from session.opendir(path)
+        sizes = []
+
+        while True:
+            try:
+                names = yield from session.readdir(handle)
+            except SFTPError as exc:
+                self.assertEqual(exc.code, FX_EOF)
+                break
+
+            self.assertTrue(all(name.longname and name.attrs.permissions
+                                for name in names))
+            sizes.append(len(names))
+
+        yield from session.close(handle)
+        return sizes
+
+
+class TestSFTPReaddir(_TestSFTPReaddir):
+    server_options = {'sftp_factory': SFTPServer}
+
+    @asynctest
+    def test_batches(self):
+        sftp = yield from self.start_sftp()
+
+        sizes = yield from self.read_batches(sftp, b'dir')
+
+        self.assertEqual(sum(sizes), 250)
+        self.assertTrue(all(size <= 100 for size in sizes))
+
+    @unittest.skipUnless(hasattr(os, 'scandir'), 'scandir not available')
+    @asynctest
+    def test_scanner_closed(self):
+        closed = []
+        close = _SFTPDirScanner.close
+
+        def record_close(scanner):
+            """Record scanners being closed"""
+
+            closed.append(scanner)
+            close(scanner)
+
+        sftp = yield from self.start_sftp()
+        session = sftp._session # pylint: disable=protected-access
+
+        with patch.object(_SFTPDirScanner, 'close', record_close):
+            handle = yield from session.opendir(b'dir')
+            yield from session.readdir(handle)
+            yield from session.close(handle)
+
+            self.assertEqual(len(closed), 1)
+
+            # Scanners left open are closed when the session ends
+            handle = yield from session.opendir(b'dir')
+            yield from session.readdir(handle)
+
+            sftp.exit()
+
+            while len(closed) < 2:
+                yield from asyncio.sleep(0.01, loop=self.loop)
+
+    @asynctest
+    def test_listdir(self):
+        sftp = yield from self.start_sftp()
+
+        names = yield from sftp.listdir('dir')
+        self.assertEqual(sorted(names), sorted(os.listdir('dir')))
+
+    def test_listdir_names(self):
+        names = SFTPServer(None).listdir(b'dir')
+
+        self.assertIsInstance(names, list)
+        self.assertEqual(sorted(names), sorted(os.listdir(b'dir')))
+
+
+class TestSFTPThreadedReaddir(TestSFTPReaddir):
+    server_options = {'sftp_factory': _ThreadedServer}
+
+
+class TestSFTPFilteredReaddir(_TestSFTPReaddir):
+    server_options = {'sftp_factory': _FilteringServer}
+
+    @asynctest
+    def test_filtered(self):
+        sftp = yield from self.start_sftp()
+
+        sizes = yield from self.read_batches(sftp, b'dir')
+        self.assertEqual(sum(sizes), 225)
+
+        names = yield from sftp.listdir(b'dir')
+        self.assertEqual(sorted(names),
+                         sorted(_filter_names(os.listdir(b'dir'))))
+
+
+class TestSFTPThreadedFilteredReaddir(TestSFTPFilteredReaddir):
+    server_options = {'sftp_factory': _ThreadedFilteringServer}
+
+
+class _BlockingScanner:
+    """Directory scanner whose first name blocks until it is released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.started.is_set():
+            self.started.set()
+            self.release.wait()
+            return b'file'
+
+        raise StopIteration
+
+    def close(self):
+        """Close the scanner"""
+
+        self.closed = True
+
+
+class TestSFTPThreadedDirScanner(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_in_thread(self, func, *args):
+        """Run a call in the event loop's default thread pool"""
+
+        return self.loop.run_in_executor(None, func, *args)
+
+    def test_close_while_reading(self):
+        scanner = _BlockingScanner()
+        threaded = _SFTPThreadedDirScanner(scanner, self.run_in_thread)
+
+        task = asyncio.async(threaded.read_batch(10), loop=self.loop)
+
+        while not scanner.started.is_set():
+            self.loop.run_until_complete(asyncio.sleep(0.01, loop=self.loop))
+
+        threaded.close()
+        self.assertFalse(scanner.closed)
+
+        scanner.release.set()
+
+        self.assertEqual(self.loop.run_until_complete(task), [b'file'])
+        self.assertTrue(scanner.closed)
+
+    def test_close_while_idle(self):
+        scanner = _BlockingScanner()
+        threaded = _SFTPThreadedDirScanner(scanner, self.run_in_thread)
+
+        threaded.close()
+        self.assertTrue(scanner.closed)
+
+        batch = self.loop.run_until_complete(threaded.read_batch(10))
+        self.assertEqual(batch, [])
+
+
+class TestSFTPGeneratorReaddir(_TestSFTPReaddir):
+    server_options = {'sftp_factory': _GeneratorServer}
+
+    @asynctest
+    def test_listdir(self):
+        sftp = yield from self.start_sftp()
+
+        sizes = yield from self.read_batches(sftp, b'dir')
+        self.assertEqual(sum(sizes), 250)
+
+
+class TestSFTPVanishingReaddir(_TestSFTPReaddir):
+    server_options = {'sftp_factory': _VanishingServer}
+
+    @asynctest
+    def test_vanished_entries(self):
+        sftp = yield from self.start_sftp()
+
+        names = yield from sftp.listdir('dir')
+        self.assertEqual(sorted(names), sorted(os.listdir('dir')))
+        self.assertEqual(len(names), 100)
+
+
+class TestSFTPVanishingErrorReaddir(TestSFTPVanishingReaddir):
+    server_options = {'sftp_factory': _VanishingErrorServer}
+
+
+class _TestSFTPGatedServer(_TestSFTPServer):
+    def setUp(self):
+        super().setUp()
+
+        write_file('file', 100000 * b'x')
+
+        _gates.clear()
+        del _events[:]
+
+    def gate(self, *event):
+        """Hold a request in the server until the returned event is set"""
+
+        gate = asyncio.Event(loop=self.loop)
+        _gates[event] = gate
+        return gate
+
+    def send(self, *coros):
+        """Start requests one after another, so they're sent in order"""
+
+        return [asyncio.async(coro, loop=self.loop) for coro in coros]
+
+
+class TestSFTPParallelRequests(_TestSFTPGatedServer):
+    server_options = {'sftp_factory': _GatedServer}
+
+    @asynctest
+    def test_out_of_order(self):
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('file', 'rb')
+
+        del _events[:]
+        gate = self.gate('read', 0)
+
+        first, stat, last = self.send(f.read(10, 0), sftp.stat('file'),
+                                      f.read(10, 50000))
+
+        yield from asyncio.wait([stat, last], loop=self.loop)
+
+        self.assertFalse(first.done())
+        self.assertEqual((yield from last), 10 * b'x')
+        self.assertEqual(_events, [('read', 0), ('stat', b'file'),
+                                   ('read', 50000)])
+
+        gate.set()
+        self.assertEqual((yield from first), 10 * b'x')
+
+        yield from f.close()
+
+    @asynctest
+    def test_overlapping_write(self):
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('file', 'rb+')
+
+        del _events[:]
+        gate = self.gate('write', 0)
+
+        write, overlap, other = self.send(f.write(10 * b'y', 0),
+                                          f.read(10, 5), f.read(10, 1000))
+
+        self.assertEqual((yield from other), 10 * b'x')
+        self.assertFalse(overlap.done())
+        self.assertEqual(_events, [('write', 0), ('read', 1000)])
+
+        gate.set()
+        self.assertEqual((yield from overlap), 5 * b'y' + 5 * b'x')
+        self.assertEqual(_events, [('write', 0), ('read', 1000),
+                                   ('read', 5)])
+
+        yield from write
+        yield from f.close()
+
+    @asynctest
+    def test_close_after_read(self):
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('file', 'rb')
+
+        del _events[:]
+        gate = self.gate('read', 0)
+
+        read, close, stat = self.send(f.read(10, 0), f.close(),
+                                      sftp.stat('file'))
+
+        # Requests are started in the order they arrive, so the close
+        # has been started by the time the later stat completes
+        yield from stat
+
+        self.assertFalse(close.done())
+        self.assertEqual(_events, [('read', 0), ('stat', b'file')])
+
+        gate.set()
+        self.assertEqual((yield from read), 10 * b'x')
+
+        yield from close
+        self.assertEqual(_events, [('read', 0), ('stat', b'file'),
+                                   ('close',)])
+
+    @asynctest
+    def test_path_order(self):
+        sftp = yield from self.start_sftp()
+
+        gate = self.gate('mkdir', b'dir')
+
+        mkdir, isdir, stat = self.send(sftp.mkdir('dir'), sftp.isdir('dir'),
+                                       sftp.stat('file'))
+
+        yield from stat
+
+        self.assertFalse(isdir.done())
+        self.assertEqual(_events, [('mkdir', b'dir'), ('stat', b'file')])
+
+        gate.set()
+        yield from mkdir
+
+        self.assertTrue((yield from isdir))
+
+    @asynctest
+    def test_parent_order(self):
+        sftp = yield from self.start_sftp()
+
+        gate = self.gate('mkdir', b'dir')
+
+        mkdir, open_, stat = self.send(sftp.mkdir('dir'),
+                                       sftp.open('dir/file', 'wb'),
+                                       sftp.stat('file'))
+
+        yield from stat
+
+        self.assertFalse(open_.done())
+        self.assertEqual(_events, [('mkdir', b'dir'), ('stat', b'file')])
+
+        gate.set()
+        yield from mkdir
+
+        f = yield from open_
+        yield from f.close()
+
+    @asynctest
+    def test_unrelated_paths(self):
+        sftp = yield from self.start_sftp()
+
+        gate = self.gate('mkdir', b'dir')
+
+        tasks = self.send(sftp.mkdir('dir'), sftp.mkdir('other'),
+                          sftp.open('new', 'wb'))
+
+        f = yield from tasks[2]
+        yield from f.close()
+        yield from tasks[1]
+
+        self.assertFalse(tasks[0].done())
+        self.assertEqual(_events[:3], [('mkdir', b'dir'),
+                                       ('mkdir', b'other'),
+                                       ('open', b'new')])
+
+        gate.set()
+        yield from tasks[0]
+
+
+class TestSFTPSerialRequests(_TestSFTPGatedServer):
+    server_options = {'sftp_factory': _GatedServer, 'sftp_max_requests': 1}
+
+    @asynctest
+    def test_in_order(self):
+        received = []
+        process_packet = SFTPServerSession._process_packet
+
+        def record_packet(session, pkttype, pktid, packet):
+            """Record requests arriving at the server"""
+
+            received.append(pktid)
+            process_packet(session, pkttype, pktid, packet)
+
+        sftp = yield from self.start_sftp()
+        f = yield from sftp.open('file', 'rb')
+
+        del _events[:]
+        gate = self.gate('read', 0)
+
+        with patch.object(SFTPServerSession, '_process_packet',
+                          record_packet):
+            tasks = self.send(f.read(10, 0), sftp.stat('file'),
+                              f.read(10, 50000))
+
+            while len(received) < 3:
+                yield from asyncio.sleep(0.01, loop=self.loop)
+
+            self.assertEqual(_events, [('read', 0)])
+
+            gate.set()
+            yield from asyncio.wait(tasks, loop=self.loop)
+
+        self.assertEqual(_events, [('read', 0), ('stat', b'file'),
+                                   ('read', 50000)])
+
+        yield from f.close()
+
+
+class TestSFTPRequestBackpressure(_TestSFTPGatedServer):
+    server_options = {'sftp_factory': _GatedServer, 'sftp_max_requests': 2}
+
+    @asynctest
+    def test_pause_reading(self):
+        paused = []
+        pause_reading = SSHServerChannel.pause_reading
+
+        def record_pause(chan):
+            """Record calls to pause reading on the server channel"""
+
+            paused.append(chan)
+            pause_reading(chan)
+
+        sftp = yield from self.start_sftp()
+        gate = self.gate('stat', b'file')
+
+        with patch.object(SSHServerChannel, 'pause_reading', record_pause):
+            tasks = self.send(*(sftp.getsize('file') for _ in range(50)))
+
+            while not paused:
+                yield from asyncio.sleep(0.01, loop=self.loop)
+
+            gate.set()
+            result = yield from asyncio.gather(*tasks, loop=self.loop)
+
+        self.assertEqual(result, 50 * [100000])
+
+
+class TestSFTPRequestOrder(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.order = _SFTPRequestOrder(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def acquire(self, *ranges):
+        """Start acquiring ranges, returning a task for the claim"""
+
+        task = asyncio.async(self.order.acquire(*ranges), loop=self.loop)
+        self.settle()
+        return task
+
+    def settle(self):
+        """Let any tasks which are able to run do so"""
+
+        for _ in range(5):
+            self.loop.run_until_complete(asyncio.sleep(0, loop=self.loop))
+
+    def test_parallel_reads(self):
+        first = self.acquire((b'h', 0, 100, False))
+        second = self.acquire((b'h', 50, 150, False))
+
+        self.assertTrue(first.done())
+        self.assertTrue(second.done())
+
+    def test_disjoint_writes(self):
+        first = self.acquire((b'h', 0, 100, True))
+        second = self.acquire((b'h', 100, 200, True))
+        third = self.acquire((b'g', 0, 100, True))
+
+        self.assertTrue(first.done())
+        self.assertTrue(second.done())
+        self.assertTrue(third.done())
+
+    def test_overlapping_write(self):
+        write = self.acquire((b'h', 0, 100, True))
+        read = self.acquire((b'h', 99, 199, False))
+
+        self.assertTrue(write.done())
+        self.assertFalse(read.done())
+
+        write.result().release()
+        self.settle()
+
+        self.assertTrue(read.done())
+
+    def test_read_before_write(self):
+        read = self.acquire((b'h', 1000, None, False))
+        write = self.acquire((b'h', 0, 2000, True))
+
+        self.assertFalse(write.done())
+
+        with read.result():
+            pass
+
+        self.settle()
+        self.assertTrue(write.done())
+
+    def test_chain(self):
+        first = self.acquire((b'h', 0, None, True))
+        second = self.acquire((b'h', 0, 10, True))
+        read = self.acquire((b'h', 5, 6, False))
+
+        first.result().release()
+        self.settle()
+
+        self.assertTrue(second.done())
+        self.assertFalse(read.done())
+
+        second.result().release()
+        self.settle()
+
+        self.assertTrue(read.done())
+
+    def test_path_ranges(self):
+        # pylint: disable=protected-access
+        ranges = SFTPServerSession._path_ranges(b'a//b/', True)
+
+        self.assertEqual(ranges, [((b'path', b'a/b'), 0, None, True),
+                                  ((b'path', b'a'), 0, None, False),
+                                  ((b'path', b'.'), 0, None, False)])
+
+        ranges = SFTPServerSession._path_ranges(b'/a')
+
+        self.assertEqual(ranges, [((b'path', b'/a'), 0, None, False),
+                                  ((b'path', b'/'), 0, None, False)])
+
+    def test_cancel(self):
+        first = self.acquire((b'h', 0, 10, True))
+        second = self.acquire((b'h', 0, 10, True))
+
+        second.cancel()
+        self.settle()
+
+        read = self.acquire((b'h', 0, 10, False))
+        self.assertFalse(read.done())
+
+        first.result().release()
+        self.settle()
+
+        self.assertTrue(read.done())
+
+        read.result().release()
+
+        # Nothing is left claimed by the cancelled request
+        self.assertTrue(self.acquire((b'h', 0, 10, True)).done())
@@ -0,0 +1,287 @@
+# Copyright (c) 2015 by Ron Frederick <ronf@timeheart.net>.
+# All rights reserved.
+#
+# This program and the accompanying materials are made available under
+# the terms of the Eclipse Public License v1.0 which accompanies this
+# distribution and is available at:
+#
+#     http://www.eclipse.org/legal/epl-v10.html
+#
+# Contributors:
+#     Ron Frederick - initial implementation, API, and documentation
+
+"""Unit tests for reading from SSH session streams"""
+
+import array
+import asyncio
+import os
+import sys
+import unittest
+
+from asyncssh import LimitOverrunError
+
+from .util import ServerTestCase, asynctest
+
+aiter_available = sys.version_info >= (3, 5)
+
+
+_BURST = 100000 * b'x'
+
+
+@asyncio.coroutine
+def _handle_session(stdin, stdout, stderr):
+    """Echo stdin back to the client, or send it a burst of output"""
+
+    try:
+        if stdin.channel.get_command() == 'burst':
+            # Wait for the client to be ready before sending output
+            yield from stdin.read(1)
+            stdout.write(_BURST)
+        else:
+            while True:
+                data = yield from stdin.read(8192)
+                if not data:
+                    break
+
+                stdout.write(data)
+
+        stdout.channel.exit(0)
+    except OSError:
+        # Some tests close the connection without reading all the output
+        pass
+
+
+class TestStream(ServerTestCase):
+    server_options = {'session_factory': _handle_session,
+                      'session_encoding': None}
+
+    @asyncio.coroutine
+    def echo(self, conn, *pieces):
+        """Open a session and send it data, returning its output stream
+
+           Each piece is sent separately, with a pause in between, so
+           that it tends to arrive on its own.
+
+        """
+
+        stdin, stdout, _ = yield from conn.open_session(encoding=None)
+
+        for piece in pieces:
+            stdin.write(piece)
+            yield from stdin.drain()
+            yield from asyncio.sleep(0.05, loop=self.loop)
+
+        stdin.write_eof()
+        return stdout
+
+    @asynctest
+    def test_readinto(self):
+        conn = yield from self.connect()
+        stdout = yield from self.echo(conn, b'abcdef', b'ghij')
+
+        buf = bytearray(4)
+        result = []
+
+        while True:
+            n = yield from stdout.readinto(buf)
+            if not n:
+                break
+
+            result.append(bytes(buf[:n]))
+
+        self.assertEqual(b''.join(result), b'abcdefghij')
+        self.assertTrue(all(len(piece) <= 4 for piece in result))
+
+        conn.close()
+
+    @asynctest
+    def test_readinto_memoryview(self):
+        conn = yield from self.connect()
+        stdout = yield from self.echo(conn, b'abcdefgh')
+
+        buf = bytearray(8)
+        n = yield from stdout.readinto(memoryview(buf)[2:5])
+        self.assertEqual(n, 3)
+        self.assertEqual(buf, b'\0\0abc\0\0\0')
+
+        self.assertEqual((yield from stdout.readexactly(2)), b'de')
+        self.assertEqual((yield from stdout.read()), b'fgh')
+
+        conn.close()
+
+    @asynctest
+    def test_readuntil(self):
+        conn = yield from self.connect()
+        stdout = yield from self.echo(conn, b'ab:', b'cd', b'::ef', b'g')
+
+        self.assertEqual((yield from stdout.readuntil(b':')), b'ab:')
+        self.assertEqual((yield from stdout.readuntil(b'::')), b'cd::')
+
+        with self.assertRaises(asyncio.IncompleteReadError) as exc:
+            yield from stdout.readuntil(b':')
+
+        self.assertEqual(exc.exception.partial, b'efg')
+
+        conn.close()
+
+    @asynctest
+    def test_readuntil_split_separator(self):
+        conn = yield from self.connect()
+        stdout = yield from self.echo(conn, b'abc<', b'-', b'-', b'>def')
+
+        self.assertEqual((yield from stdout.readuntil(b'<-->')), b'abc<-->')
+        self.assertEqual((yield from stdout.read()), b'def')
+
+        conn.close()
+
+    @asynctest
+    def test_readuntil_empty_separator(self):
+        conn = yield from self.connect()
+        stdout = yield from self.echo(conn)
+
+        with self.assertRaises(ValueError):
+            yield from stdout.readuntil(b'')
+
+        conn.close()
+
+    @asynctest
+    def test_readuntil_limit(self):
+        conn = yield from self.connect()
+        stdout = yield from self.echo(conn, b'abcdef', b'ghij\n')
+
+        with self.assertRaises(LimitOverrunError):
+            yield from stdout.readuntil(b'\n', limit=4)
+
+        self.assertEqual((yield from stdout.readuntil(b'\n', limit=10)),
+                         b'abcdefghij\n')
+
+        conn.close()
+
+    @asynctest
+    def test_readline_unlimited(self):
+        line = 3000000 * b'x' + b'\n'
+
+        conn = yield from self.connect()
+        stdout = yield from self.echo(conn, line, b'last')
+
+        self.assertEqual((yield from stdout.readline()), line)
+        self.assertEqual((yield from stdout.readline()), b'last')
+        self.assertEqual((yield from stdout.readline()), b'')
+
+        conn.close()
+
+    @asynctest
+    def test_write_buffers(self):
+        data = os.urandom(100000)
+        words = array.array('H', range(20000))
+        longs = memoryview(words.tobytes()).cast('I')
+
+        conn = yield from self.connect()
+        stdin, stdout, _ = yield from conn.open_session(encoding=None)
+
+        # Buffers larger than a packet are split across packets, and
+        # buffers of any format are sent as their bytes
+        stdin.write_buffers([b'abc', memoryview(data)[1:-1], words, longs,
+                             memoryview(b'abcdef')[::2], b'', bytearray(b'z')])
+        stdin.write_eof()
+
+        self.assertEqual((yield from stdout.read()),
+                         b'abc' + data[1:-1] + 2 * words.tobytes() +
+                         b'acez')
+
+        conn.close()
+
+    @asynctest
+    def test_write_buffers_copied(self):
+        # More than the channel window, so later writes are queued
+        fill = 3 * 1024 * 1024 * b'.'
+
+        conn = yield from self.connect()
+        stdin, stdout, _ = yield from conn.open_session(encoding=None)
+
+        buf = bytearray(b'before')
+        lines = [bytearray(b'one'), memoryview(bytearray(b'two'))]
+
+        stdin.write(fill)
+        stdin.write_buffers([buf])
+        stdin.writelines(lines)
+
+        # Writable buffers can be changed once the write returns
+        buf[:] = b'after!'
+        lines[0][:] = b'XXX'
+        lines[1][:] = b'YYY'
+
+        stdin.write_eof()
+
+        self.assertEqual((yield from stdout.read()),
+                         fill + b'beforeonetwo')
+
+        conn.close()
+
+    @asyncio.coroutine
+    def read_iter(self, iterator):
+        """Collect the results of an async iterator into a list"""
+
+        result = []
+
+        while True:
+            try:
+                result.append((yield from iterator.__anext__()))
+            except StopAsyncIteration: # pylint: disable=undefined-variable
+                return result
+
+    @unittest.skipUnless(aiter_available, 'Async iteration not supported')
+    @asynctest
+    def test_aiter_lines(self):
+        conn = yield from self.connect()
+        stdout = yield from self.echo(conn, b'one\ntw', b'o\n', b'three')
+
+        lines = yield from self.read_iter(stdout.__aiter__())
+        self.assertEqual(lines, [b'one\n', b'two\n', b'three'])
+
+        conn.close()
+
+    @unittest.skipUnless(aiter_available, 'Async iteration not supported')
+    @asynctest
+    def test_iter_chunked(self):
+        conn = yield from self.connect()
+        stdout = yield from self.echo(conn, b'abcdefghij', b'klm')
+
+        chunks = yield from self.read_iter(stdout.iter_chunked(4))
+        self.assertEqual(b''.join(chunks), b'abcdefghijklm')
+        self.assertTrue(all(1 <= len(chunk) <= 4 for chunk in chunks))
+
+        conn.close()
+
+    @asynctest
+    def test_iter_chunked_size(self):
+        conn = yield from self.connect()
+        stdout = yield from self.echo(conn)
+
+        with self.assertRaises(ValueError):
+            stdout.iter_chunked(0)
+
+        conn.close()
+
+    @asynctest
+    def test_close_while_paused(self):
+        conn = yield from self.connect()
+        stdin, stdout, _ = yield from conn.open_session('burst',
+                                                        encoding=None)
+
+        chan = stdout.channel
+        chan.pause_reading()
+        stdin.write(b'!')
+
+        # pylint: disable=protected-access
+        while chan._recv_state != 'close_pending':
+            yield from asyncio.sleep(0.01, loop=self.loop)
+
+        chan.resume_reading()
+
+        self.assertEqual((yield from stdout.read()), _BURST)
+
+        yield from chan.wait_closed()
+        self.assertEqual(chan.get_exit_status(), 0)
+
+        conn.close()
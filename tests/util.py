@@ -0,0 +1,123 @@
+# Copyright (c) 2015 by Ron Frederick <ronf@timeheart.net>.
+# All rights reserved.
+#
+# This program and the accompanying materials are made available under
+# the terms of the Eclipse Public License v1.0 which accompanies this
+# distribution and is available at:
+#
+#     http://www.eclipse.org/legal/epl-v10.html
+#
+# Contributors:
+#     Ron Frederick - initial implementation, API, and documentation
+
+"""Utilities for unit tests which run an SSH client and server
+
+   Note: These tests assume that the openssl command is available on
+         the system and in the user's path.
+
+"""
+
+import asyncio
+import functools
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import asyncssh
+
+
+def run(cmd):
+    """Run a shell command, raising an exception if it fails"""
+
+    subprocess.check_output(cmd, shell=True, stderr=subprocess.STDOUT)
+
+
+def read_file(path):
+    """Read the data in a local file"""
+
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def write_file(path, data):
+    """Write data to a local file"""
+
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def asynctest(func):
+    """Run a test method as a coroutine on the test case's event loop"""
+
+    @functools.wraps(func)
+    def async_wrapper(self, *args, **kwargs):
+        coro = asyncio.coroutine(func)(self, *args, **kwargs)
+        return self.loop.run_until_complete(asyncio.wait_for(coro, 30,
+                                                             loop=self.loop))
+
+    return async_wrapper
+
+
+class _Server(asyncssh.SSHServer):
+    """SSH server which accepts clients without authentication"""
+
+    def begin_auth(self, username):
+        return False
+
+
+class ServerTestCase(unittest.TestCase):
+    """Base class for unit tests which connect to a local SSH server
+
+       Subclasses can set ``server_options`` to a dictionary of extra
+       arguments to pass to :func:`asyncssh.create_server`. The server
+       is started once for each subclass, and each test gets its own
+       scratch directory, which is also the current directory while
+       the test runs.
+
+    """
+
+    server_options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls._keydir = tempfile.mkdtemp()
+        host_key = os.path.join(cls._keydir, 'host')
+        run('openssl genrsa -out %s 2048' % host_key)
+
+        cls.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(cls.loop)
+
+        cls.server = cls.loop.run_until_complete(
+            asyncssh.create_server(_Server, '127.0.0.1', 0, loop=cls.loop,
+                                   server_host_keys=[host_key],
+                                   **cls.server_options))
+
+        cls.port = cls.server.sockets[0].getsockname()[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.close()
+        cls.loop.run_until_complete(cls.server.wait_closed())
+        cls.loop.close()
+        asyncio.set_event_loop(None)
+
+        shutil.rmtree(cls._keydir)
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self.tempdir = tempfile.mkdtemp()
+        os.chdir(self.tempdir)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        shutil.rmtree(self.tempdir)
+
+    @asyncio.coroutine
+    def connect(self, **kwargs):
+        """Open a client connection to the test server"""
+
+        return (yield from asyncssh.connect('127.0.0.1', self.port,
+                                            loop=self.loop, known_hosts=None,
+                                            client_keys=[], **kwargs))